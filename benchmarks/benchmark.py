@@ -0,0 +1,373 @@
+"""headless benchmark of the library pipeline of BangerPlayer
+
+generates synthetic libraries of tagged MP3, FLAC and OGG files, then measures the stages the interface goes
+through: counting and listing a folder, fetching the metadata (cold and from the cache), filling the musics
+list, sorting it, indexing and searching the library, making the cover thumbnails, and switching between musics in
+the player, with the MP3 files only since the others have no real audio. the results are printed as JSON, so the
+runs of two versions can be compared.
+
+the memory of each stage is its peak resident memory, measured from the start of the stage: on Linux the peak is
+reset before each stage through /proc/self/clear_refs, elsewhere the resident memory is sampled during the stage.
+the peak of the Python allocations, traced with tracemalloc, is reported apart. tracing slows the stages down,
+--no-memory gives the timings without it.
+
+usage: python benchmarks/benchmark.py [--sizes 100,1000,10000,50000] [--formats mp3,flac,ogg] [--output results.json]
+"""
+from pathlib import Path
+import argparse
+import platform
+import tempfile
+import shutil
+import struct
+import base64
+import tracemalloc
+import threading
+import ctypes
+import json
+import time
+import sys
+import os
+
+# keep the app data of the benchmark away from the real one, platformdirs reads these before the app is imported
+dataDir = Path(tempfile.mkdtemp(prefix="bangerplayer-benchmark-"))
+for variable in ("XDG_DATA_HOME", "APPDATA", "LOCALAPPDATA"):
+    os.environ[variable] = str(dataDir)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "project"))
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+App = QtWidgets.QApplication(sys.argv[:1])
+
+from constants import *
+appDataDir.mkdir(parents=True, exist_ok=True)
+thumbnailsDir.mkdir(parents=True, exist_ok=True)
+
+from scanner import countMusics, listMusics
+from cache import MetadataCache
+from workers import MetadataScan, MetadataSignals, MetadataWorker
+from widgets import MusicListModel
+from library import buildLibraryIndex
+from covers import CoverStore, clearThumbnails
+from engine import getVlcInstance, PlayerEngine
+import logging
+
+log = logging.getLogger("benchmark")
+
+def waitFor(condition, timeout:float=600):
+    """run the Qt event loop until a condition is true"""
+    end = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > end:
+            raise TimeoutError("the benchmark stage didn't finish in time")
+        App.processEvents(QtCore.QEventLoop.AllEvents, 50)
+
+def currentRssKb() -> int:
+    """return the resident memory of the process in KB, or None if unknown on this platform"""
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    if os.name == "nt":
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [(name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize // 1024
+    return None
+
+def resetPeakRss() -> bool:
+    """reset the peak resident memory of the process kept by Linux, return False if it can't be done"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peakRssKb() -> int:
+    """return the peak resident memory in KB since it was last reset, read from /proc/self/status"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return None
+
+class RssSampler(threading.Thread):
+    """sample the resident memory during a stage, where the kernel peak can't be reset"""
+    def __init__(self, interval:float=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = currentRssKb()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, currentRssKb())
+
+    def stop(self) -> int:
+        self.stopped.set()
+        self.join()
+        return max(self.peak, currentRssKb())
+
+class Stages():
+    """measure the wall time, the peak resident memory and the peak Python allocations of named stages"""
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name:str, function, *args):
+        sampler = None
+        kernelPeak = resetPeakRss()  # the peak of this stage only, not of the previous ones
+        if not kernelPeak and currentRssKb() is not None:
+            sampler = RssSampler()
+            sampler.start()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = function(*args)
+        self.results[name] = {"seconds": round(time.perf_counter() - start, 6)}
+        self.results[name]["peakRssKb"] = peakRssKb() if kernelPeak else (sampler.stop() if sampler else None)
+        if tracemalloc.is_tracing():
+            self.results[name]["peakAllocatedKb"] = (tracemalloc.get_traced_memory()[1] - before) // 1024
+        log.info("%s: %.3f s", name, self.results[name]["seconds"])
+        return result
+
+# synthetic files
+
+def coverImage(index:int, size:int) -> bytes:
+    """return a JPEG image of a flat color"""
+    image = QtGui.QImage(size, size, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor.fromHsv((index * 37) % 360, 200, 200))
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer, "JPG")
+    return bytes(buffer.data())
+
+def synchsafe(value:int) -> bytes:
+    return bytes(((value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f))
+
+def makeMp3(title:str, author:str, cover:bytes, seconds:int) -> bytes:
+    """return an MP3 file with an ID3v2.3 tag and silent 128 kbps frames"""
+    def frame(frameId:bytes, data:bytes) -> bytes:
+        return frameId + struct.pack(">I", len(data)) + b"\x00\x00" + data
+    frames = frame(b"TIT2", b"\x03" + title.encode("utf-8")) + frame(b"TPE1", b"\x03" + author.encode("utf-8"))
+    if cover:
+        frames += frame(b"APIC", b"\x00image/jpeg\x00\x03\x00" + cover)
+    tag = b"ID3\x03\x00\x00" + synchsafe(len(frames)) + frames
+    audioFrame = b"\xff\xfb\x90\x64" + bytes(413)  # MPEG-1 layer III, 128 kbps, 44.1 kHz, 417 bytes
+    return tag + audioFrame * int(seconds * 44100 / 1152)
+
+def vorbisComment(title:str, author:str, cover:bytes) -> bytes:
+    """return a vorbis comment block, the cover is a base64 FLAC picture block"""
+    comments = [f"TITLE={title}".encode("utf-8"), f"ARTIST={author}".encode("utf-8")]
+    if cover:
+        comments.append(b"METADATA_BLOCK_PICTURE=" + base64.b64encode(flacPicture(cover)))
+    vendor = b"BangerPlayer benchmark"
+    data = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(comments))
+    for comment in comments:
+        data += struct.pack("<I", len(comment)) + comment
+    return data
+
+def flacPicture(cover:bytes) -> bytes:
+    mimetype = b"image/jpeg"
+    return struct.pack(">II", 3, len(mimetype)) + mimetype + struct.pack(">IIIIII", 0, 0, 0, 0, 0, len(cover)) + cover
+
+def makeFlac(title:str, author:str, cover:bytes, seconds:int) -> bytes:
+    """return a FLAC file with its metadata blocks only, without audio frames so it can't be played"""
+    sampleRate, channels, bitsPerSample, samples = 44100, 2, 16, seconds * 44100
+    streamInfo = struct.pack(">HH", 4096, 4096) + b"\x00\x00\x00" * 2
+    streamInfo += ((sampleRate << 44) | ((channels - 1) << 41) | ((bitsPerSample - 1) << 36) | samples).to_bytes(8, "big") + bytes(16)
+    blocks = [(0, streamInfo), (4, vorbisComment(title, author, None))]
+    if cover:
+        blocks.append((6, flacPicture(cover)))
+    data = b"fLaC"
+    for i, (blockType, block) in enumerate(blocks):
+        last = 0x80 if i == len(blocks) - 1 else 0
+        data += bytes((last | blockType,)) + len(block).to_bytes(3, "big") + block
+    return data
+
+oggCrcTable = []
+for byte in range(256):
+    crc = byte << 24
+    for _ in range(8):
+        crc = ((crc << 1) ^ 0x04c11db7) if crc & 0x80000000 else crc << 1
+    oggCrcTable.append(crc & 0xffffffff)
+
+def oggPage(packet:bytes, sequence:int, granule:int, headerType:int) -> bytes:
+    """return an ogg page holding one whole packet"""
+    segments = [255] * (len(packet) // 255) + [len(packet) % 255]
+    if len(segments) > 255:
+        raise ValueError("packet too big for a single page")
+    header = b"OggS\x00" + bytes((headerType,)) + struct.pack("<qIII", granule, 1, sequence, 0) + bytes((len(segments),)) + bytes(segments)
+    page = bytearray(header + packet)
+    crc = 0
+    for byte in page:
+        crc = ((crc << 8) & 0xffffffff) ^ oggCrcTable[((crc >> 24) ^ byte) & 0xff]
+    page[22:26] = struct.pack("<I", crc)
+    return bytes(page)
+
+def makeOgg(title:str, author:str, cover:bytes, seconds:int) -> bytes:
+    """return an ogg vorbis file with its header packets and a last page marking the duration
+
+    the setup header is a placeholder, so the file is only good for reading the tags and the duration"""
+    identification = b"\x01vorbis" + struct.pack("<IBIiiiB", 0, 2, 44100, 0, 128000, 0, 0xb8) + b"\x01"
+    comment = b"\x03vorbis" + vorbisComment(title, author, cover) + b"\x01"
+    if len(comment) > 255 * 255:  # a big cover doesn't fit in one page, keep the tags only
+        comment = b"\x03vorbis" + vorbisComment(title, author, None) + b"\x01"
+    setup = b"\x05vorbis" + bytes(32)
+    return (oggPage(identification, 0, 0, 0x02) + oggPage(comment, 1, 0, 0) + oggPage(setup, 2, 0, 0)
+            + oggPage(bytes(64), 3, seconds * 44100, 0x04))
+
+fileMakers = {"mp3": makeMp3, "flac": makeFlac, "ogg": makeOgg}
+
+def generateLibrary(folder:Path, size:int, formats:list, withCovers:bool, coverSize:int):
+    """write a flat folder of synthetic tagged musics, a cover for one music out of three"""
+    folder.mkdir(parents=True)
+    covers = [coverImage(i, coverSize) for i in range(8)] if withCovers else []
+    for i in range(size):
+        extension = formats[i % len(formats)]
+        cover = covers[i % len(covers)] if withCovers and i % 3 == 0 else None
+        data = fileMakers[extension](f"Title {i}", f"Artist {i % 97}", cover, 30 + i % 300)
+        (folder / f"music{i:06}.{extension}").write_bytes(data)
+
+# stages
+
+def fetchMetadata(musics:list, metadataCache:MetadataCache):
+    """fetch the metadata of some musics with the worker threads, like the interface"""
+    pool = QtCore.QThreadPool()
+    signals = MetadataSignals()
+    results = {}
+    signals.loaded.connect(lambda scan, music, metadata: results.__setitem__(music, metadata))
+    scan = MetadataScan(None, len(musics))
+    for music in musics:
+        pool.start(MetadataWorker(scan, music, signals, metadataCache))
+    waitFor(lambda: len(results) == len(musics))
+    pool.waitForDone()
+    return results
+
+def fillModel(musics:list, results:dict) -> MusicListModel:
+    model = MusicListModel()
+    model.setMusics(musics)
+    for music in musics:
+        model.setMetadata(music, results[music])
+    return model
+
+def sortAll(model:MusicListModel):
+    for sortMode in ("+title", "-title", "+author", "-author", "+time", "-time"):
+        model.sortRecords(sortMode)
+
+def searchAll(index) -> int:
+    found = 0
+    for query in ("t", "title 1", "artist 4", "music00", "title 12 artist"):
+        found += len(index.search(query))
+    return found
+
+def makeThumbnails(musics:list, results:dict) -> int:
+    """read the covers and make their thumbnails, like the musics list showing all the rows"""
+    clearThumbnails()  # the covers of the previous runs are the same images
+    coverStore = CoverStore()
+    for music in musics:
+        if results[music].hasCover:
+            coverStore.pixmap(None, music)  # the cover was never read, like after a cold metadata fetch
+    waitFor(lambda: not coverStore.pending)
+    coverStore.clear()
+    return len(list(thumbnailsDir.glob("*.png")))
+
+def switchMusics(musics:list, count:int) -> int:
+    """load musics one after the other in the player and wait until each one plays, return the number that failed"""
+    engine = PlayerEngine()
+    loaded = []
+    failed = []
+    engine.musicLoaded.connect(loaded.append)
+    engine.loadFailed.connect(lambda music, reason: (failed.append(music), loaded.append(music)))
+    for music in musics[:count]:
+        before = len(loaded)
+        engine.load(music)
+        waitFor(lambda: len(loaded) > before, timeout=musicLoadTimeout / 1000 + 5)
+    engine.release()
+    if failed:
+        log.warning("%d musics of the player stage failed to load, its time includes the failures", len(failed))
+    return len(failed)
+
+def vlcAvailable() -> bool:
+    try:
+        getVlcInstance()
+        return True
+    except Exception as e:
+        log.warning("vlc isn't available, the player stage is skipped: %s", e)
+        return False
+
+def benchmark(root:Path, size:int, formats:list, withCovers:bool, coverSize:int, withVlc:bool) -> dict:
+    """generate one library and measure every stage on it"""
+    stages = Stages()
+    folder = root / f"{size}-{'covers' if withCovers else 'nocovers'}"
+    stages.run("generate", generateLibrary, folder, size, formats, withCovers, coverSize)
+    metadataCache = MetadataCache(root / f"{folder.name}.db")
+
+    stages.run("countFolder", countMusics, folder)
+    musics = list(stages.run("listFolder", listMusics, folder))
+    results = stages.run("fetchMetadataCold", fetchMetadata, musics, metadataCache)
+    stages.run("fetchMetadataCached", fetchMetadata, musics, metadataCache)
+    model = stages.run("fillModel", fillModel, musics, results)
+    stages.run("sortAllModes", sortAll, model)
+    index = stages.run("indexLibrary", buildLibraryIndex, [folder], False, metadataCache)
+    stages.run("search", searchAll, index)
+    stages.run("makeThumbnails", makeThumbnails, musics, results)
+    # only the MP3 files have real audio frames, the FLAC and Ogg files hold their headers only and can't be played
+    playable = [music for music in musics if music.suffix == ".mp3"]
+    if withVlc and playable:
+        failed = stages.run("switchMusics", switchMusics, playable, min(20, len(playable)))
+        stages.results["switchMusics"]["failed"] = failed
+    elif withVlc:
+        log.warning("the player stage needs MP3 files, it is skipped")
+    metadataCache.close()
+
+    return {"size": size, "formats": formats, "covers": withCovers,
+            "totalSeconds": round(sum(stage["seconds"] for name, stage in stages.results.items() if name != "generate"), 6),
+            "stages": stages.results}
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the library pipeline of BangerPlayer on synthetic libraries")
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma separated numbers of musics, like 100,1000,10000,50000")
+    parser.add_argument("--formats", default="mp3,flac,ogg", help="comma separated formats among mp3, flac and ogg")
+    parser.add_argument("--covers", choices=("both", "with", "without"), default="both", help="generate the libraries with covers, without, or both")
+    parser.add_argument("--cover-size", type=int, default=300, help="size in pixels of the generated covers")
+    parser.add_argument("--no-player", action="store_true", help="skip the player stage")
+    parser.add_argument("--no-memory", action="store_true", help="don't trace the Python allocations of the stages, which slows them down")
+    parser.add_argument("--output", help="write the JSON results to this file instead of the standard output")
+    parser.add_argument("--verbose", action="store_true", help="log the stages while they run")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(name)s - %(levelname)s - %(message)s")
+
+    formats = args.formats.split(",")
+    for extension in formats:
+        if extension not in fileMakers:
+            parser.error(f"unsupported format {extension}")
+    coverModes = {"both": (False, True), "with": (True,), "without": (False,)}[args.covers]
+    withVlc = not args.no_player and vlcAvailable()
+    if not args.no_memory:
+        tracemalloc.start()
+
+    root = dataDir / "libraries"
+    runs = []
+    try:
+        for size in map(int, args.sizes.split(",")):
+            for withCovers in coverModes:
+                runs.append(benchmark(root, size, formats, withCovers, args.cover_size, withVlc))
+    finally:
+        shutil.rmtree(dataDir, ignore_errors=True)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(), "qt": QtCore.QT_VERSION_STR,
+              "vlc": withVlc, "memoryTraced": not args.no_memory, "cpus": os.cpu_count(), "runs": runs}
+    output = json.dumps(report, indent=4)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
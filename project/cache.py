@@ -0,0 +1,131 @@
+from constants import *
+from metadata import MusicMetadata
+from covers import removeThumbnail, clearThumbnails
+from pathlib import Path
+import threading
+import sqlite3
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+class MetadataCache():
+    """a persistent index of the music metadata, entries are keyed by path, modification time and size"""
+    schemaVersion = 4  # bump when the table layout or the way the tags are read changes, the cache is then rebuilt from scratch
+
+    def __init__(self, dbPath:Path=metadataCacheFile):
+        self.dbPath = dbPath
+        self.lock = threading.Lock()  # the connection is shared with the worker threads
+        self.connection = sqlite3.connect(str(dbPath), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.schemaVersion:
+            log.info("metadata cache schema changed from %s to %s, rebuilding it", version, self.schemaVersion)
+            self.connection.execute("DROP TABLE IF EXISTS musics")
+            self.connection.execute("DROP TABLE IF EXISTS folders")
+            self.connection.execute(f"PRAGMA user_version={self.schemaVersion}")
+            clearThumbnails()  # none of them is referenced anymore
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS musics (
+                                        path TEXT PRIMARY KEY,
+                                        mtime INTEGER NOT NULL,
+                                        size INTEGER NOT NULL,
+                                        title TEXT NOT NULL,
+                                        author TEXT,
+                                        time INTEGER NOT NULL,
+                                        coverKey TEXT,
+                                        hasCover INTEGER NOT NULL)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS coverKeys ON musics (coverKey)")  # to find the unreferenced covers
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS folders (
+                                        path TEXT PRIMARY KEY,
+                                        mtime INTEGER NOT NULL,
+                                        count INTEGER NOT NULL)""")
+        self.connection.commit()
+        log.debug("opened the metadata cache at %s", dbPath)
+
+    def get(self, musicPath:Path, stat:os.stat_result) -> MusicMetadata:
+        """return the cached metadata of a music if the file didn't change since it was cached, else None"""
+        with self.lock:
+            row = self.connection.execute("SELECT mtime, size, title, author, time, coverKey, hasCover FROM musics WHERE path = ?", (str(musicPath),)).fetchone()
+        if row is None or row[0] != stat.st_mtime_ns or row[1] != stat.st_size:
+            return None
+        return MusicMetadata(row[2], row[3], row[4], row[5], bool(row[6]))
+
+    def getFolder(self, folderPath:Path, recursive:bool=False) -> dict:
+        """return the cached entries of the musics of a folder as path -> ((modification time, size), metadata), they may be outdated"""
+        prefix = os.path.join(str(folderPath), "")
+        with self.lock:
+            rows = self.connection.execute("SELECT path, mtime, size, title, author, time, coverKey, hasCover FROM musics WHERE path >= ? AND path < ?",
+                                           (prefix, prefix + chr(0x10ffff))).fetchall()  # a range on the primary key, so the index is used
+        entries = {}
+        for row in rows:
+            musicPath = Path(row[0])
+            if recursive or musicPath.parent == folderPath:
+                entries[musicPath] = ((row[1], row[2]), MusicMetadata(row[3], row[4], row[5], row[6], bool(row[7])))
+        return entries
+
+    def getAll(self) -> dict:
+        """return every cached entry as path -> ((modification time, size), metadata), the caller checks if they are outdated"""
+        with self.lock:
+            rows = self.connection.execute("SELECT path, mtime, size, title, author, time, coverKey, hasCover FROM musics").fetchall()
+        return {row[0]: ((row[1], row[2]), MusicMetadata(row[3], row[4], row[5], row[6], bool(row[7]))) for row in rows}
+
+    def put(self, musicPath:Path, stat:os.stat_result, metadata:MusicMetadata):
+        """store the metadata of a music along with the file state it was read from"""
+        with self.lock:
+            previous = self.connection.execute("SELECT coverKey FROM musics WHERE path = ?", (str(musicPath),)).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO musics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (str(musicPath), stat.st_mtime_ns, stat.st_size, metadata.title, metadata.author, metadata.time,
+                                     metadata.coverKey, metadata.hasCover))
+            orphaned = self.orphanedCover(previous, metadata.coverKey)
+            self.connection.commit()
+        if orphaned:
+            removeThumbnail(orphaned)  # the file changed, and no other music has its old cover
+
+    def setCoverKey(self, musicPath:Path, coverKey:str):
+        """store the key of the cover of a music once it is read"""
+        with self.lock:
+            previous = self.connection.execute("SELECT coverKey FROM musics WHERE path = ?", (str(musicPath),)).fetchone()
+            self.connection.execute("UPDATE musics SET coverKey = ?, hasCover = 1 WHERE path = ?", (coverKey, str(musicPath)))
+            orphaned = self.orphanedCover(previous, coverKey)
+            self.connection.commit()
+        if orphaned:
+            removeThumbnail(orphaned)
+
+    def orphanedCover(self, previous:tuple, coverKey:str) -> str:
+        """return the previous cover key of a music if it changed and no music references it anymore, the lock must be held"""
+        if not previous or not previous[0] or previous[0] == coverKey:
+            return None
+        if self.connection.execute("SELECT 1 FROM musics WHERE coverKey = ? LIMIT 1", (previous[0],)).fetchone():
+            return None  # shared with another music
+        return previous[0]
+
+    def invalidate(self, musicPath:Path):
+        """remove the entry of a music, so it is read again from the file next time"""
+        with self.lock:
+            previous = self.connection.execute("SELECT coverKey FROM musics WHERE path = ?", (str(musicPath),)).fetchone()
+            self.connection.execute("DELETE FROM musics WHERE path = ?", (str(musicPath),))
+            orphaned = self.orphanedCover(previous, None)
+            self.connection.commit()
+        if orphaned:
+            removeThumbnail(orphaned)
+
+    def getFolderCount(self, folderPath:Path, stat:os.stat_result) -> int:
+        """return the cached number of musics of a folder if its content didn't change since, else None"""
+        with self.lock:
+            row = self.connection.execute("SELECT mtime, count FROM folders WHERE path = ?", (str(folderPath),)).fetchone()
+        if row is None or row[0] != stat.st_mtime_ns:
+            return None
+        return row[1]
+
+    def putFolderCount(self, folderPath:Path, stat:os.stat_result, count:int):
+        """store the number of musics of a folder along with the folder modification time"""
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)", (str(folderPath), stat.st_mtime_ns, count))
+            self.connection.commit()
+
+    def close(self):
+        """close the connection to the database"""
+        with self.lock:
+            self.connection.close()
+        log.debug("closed the metadata cache")
@@ -0,0 +1,165 @@
+from constants import *
+from PyQt5 import QtCore
+from pathlib import Path
+import logging
+import json
+import os
+
+log = logging.getLogger(__name__)
+
+def defaultConfig() -> dict:
+    """return the config of a first launch"""
+    return {
+        "folders": [str(Path.home() / "Music")] if (Path.home() / "Music").exists() else [],
+        "last_folder": None,
+        "loop": "down",
+        "shuffle": False,
+        "sort": "+title",
+        "autoplay": True,
+        "recursive": False
+    }
+
+# key -> check of its value, the keys missing from the config take their default value when it has one
+configSchema = {
+    "folders": lambda value: isinstance(value, list) and all(isinstance(folder, str) for folder in value),
+    "last_folder": lambda value: value is None or isinstance(value, str),
+    "loop": lambda value: value in ("none", "down", "one", "all"),
+    "shuffle": lambda value: isinstance(value, bool),
+    "sort": lambda value: value in ("+title", "-title", "+author", "-author", "+time", "-time"),
+    "autoplay": lambda value: isinstance(value, bool),
+    "recursive": lambda value: isinstance(value, bool),
+    "instrumentation": lambda value: isinstance(value, bool),
+    "progress_refresh": lambda value: type(value) is int and value > 0,
+    "log_level": lambda value: isinstance(value, str) and value.upper() in logLevels,
+}
+
+def validateConfig(config:dict) -> dict:
+    """replace the invalid or missing values of a config with their default"""
+    defaults = defaultConfig()
+    for key, check in configSchema.items():
+        if key not in config:
+            if key in defaults:
+                config[key] = defaults[key]
+        elif not check(config[key]):
+            log.warning("invalid value %r for %s in the config, using the default one", config[key], key)
+            if key in defaults:
+                config[key] = defaults[key]
+            else:
+                del config[key]
+    return config
+
+def readConfig(path:Path) -> dict:
+    """read a config file, raise an error if it can't be used"""
+    with open(path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("the config isn't a JSON object")
+    return validateConfig(config)
+
+def writeConfig(path:Path, text:str):
+    """write a config file through a temporary file, so it is never left half written"""
+    tempPath = path.with_name(f".{path.name}.{os.getpid()}.tmp")  # same folder so the rename is atomic
+    try:
+        with open(tempPath, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempPath, path)
+    except BaseException:
+        tempPath.unlink(missing_ok=True)
+        raise
+
+class ConfigWriteJob(QtCore.QRunnable):
+    """write a serialized config and its backup outside of the GUI thread"""
+    def __init__(self, text:str, path:Path, backupPath:Path):
+        super().__init__()
+        self.text = text
+        self.path = path
+        self.backupPath = backupPath
+
+    def run(self):
+        try:
+            writeConfig(self.path, self.text)
+            writeConfig(self.backupPath, self.text)  # the backup is only written once the config was
+            log.debug("saved the config file")
+        except OSError as e:
+            log.error("failed to save the config file: %s", e)
+
+class ConfigStore(QtCore.QObject):
+    """the config of the app, the changes are batched and written in the background"""
+    def __init__(self, path:Path=configFile, backupPath:Path=configBackupFile, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.backupPath = backupPath
+        self.data = defaultConfig()
+        self.dirty = False  # changed since the last write was started
+        self.saveTimer = QtCore.QTimer(self)  # restarted on each change, so a burst of changes is written once
+        self.saveTimer.setSingleShot(True)
+        self.saveTimer.setInterval(configSaveDelay)
+        self.saveTimer.timeout.connect(self.write)
+        self.pool = QtCore.QThreadPool()  # a single thread so the writes happen in order
+        self.pool.setMaxThreadCount(1)
+
+    def __getitem__(self, key:str):
+        return self.data[key]
+
+    def __setitem__(self, key:str, value):
+        self.data[key] = value
+
+    def __contains__(self, key:str) -> bool:
+        return key in self.data
+
+    def get(self, key:str, default=None):
+        return self.data.get(key, default)
+
+    def load(self):
+        """load the config file, or its backup if it is broken, or the default config"""
+        if not self.path.exists() and not self.backupPath.exists():
+            log.info("no config file found, creating initial config")
+            self.data = defaultConfig()
+            self.save()
+            return
+        for path in (self.path, self.backupPath):
+            try:
+                self.data = readConfig(path)
+            except (OSError, ValueError) as e:  # JSON errors are value errors
+                log.error("failed to load the config file %s: %s", path, e)
+                if path == self.path and path.exists():
+                    self.setAside()
+                continue
+            if path != self.path:
+                log.warning("loaded the last working config instead")
+                self.save()  # repair the config file
+            log.debug("loaded the config file")
+            return
+        log.warning("no working config found, using the default config")
+        self.data = defaultConfig()
+        self.save()
+
+    def setAside(self):
+        """keep a broken config file next to it before it is overwritten, so the user can still repair it"""
+        corruptPath = self.path.with_name(f"{self.path.name}.corrupt")
+        try:
+            os.replace(self.path, corruptPath)
+            log.warning("moved the broken config file to %s", corruptPath)
+        except OSError as e:
+            log.error("failed to move the broken config file to %s: %s", corruptPath, e)
+
+    def save(self):
+        """schedule a write of the config"""
+        self.dirty = True
+        self.saveTimer.start()
+
+    def write(self):
+        """start writing the current config in the background"""
+        if not self.dirty:
+            return
+        self.dirty = False
+        text = json.dumps(self.data, indent=4)  # serialized here, so the config can keep changing during the write
+        self.pool.start(ConfigWriteJob(text, self.path, self.backupPath))
+
+    def flush(self):
+        """write the pending changes and wait until they are on the disk, when closing"""
+        self.saveTimer.stop()
+        self.write()
+        self.pool.waitForDone()
@@ -14,8 +14,31 @@ colorMode = "dark" if darkdetect.isDark() else "light"  # color mode of the inte
 assetsDir = localPath / "assets" 
 themeAssetsDir = assetsDir / colorMode  # path to the theme sensitive assets
 configFile = appDataDir / "config.json"  # path to the config file
+configBackupFile = appDataDir / "config.json.bak"  # last config that was written successfully, used if the config file is broken
+metadataCacheFile = appDataDir / "metadata.db"  # path to the persistent metadata cache
+thumbnailsDir = appDataDir / "thumbnails"  # path to the cover thumbnails folder, named by the hash of the cover
+queueFile = appDataDir / "queue.json"  # path to the play queue saved between the sessions
+metricsFile = appDataDir / "logs" / "metrics.json"  # path to the timings dumped on exit when instrumenting
 
 supportedAudioFormats = [".mp3", ".wav", ".flac", ".ogg", ".m4a"]  # supported audio formats
+coverThumbnailSize = 100  # size in pixels of the cover thumbnails shown in the musics list
+progressRefreshInterval = 250  # default time in ms between two refreshes of the music progress, can be set in the config
+musicLoadTimeout = 5000  # time in ms after which a music that didn't start playing is considered broken
+thumbnailMemoryCacheSize = 300  # maximum number of decoded cover thumbnails kept in memory
+coverMemoryCacheSize = 4  # maximum number of full resolution covers kept in memory for the player
+iconPixmapCacheSize = 64  # maximum number of rendered SVG images kept in memory, one per image and size
+stallThreshold = 50  # time in ms the interface must be blocked for to be reported as a stall when instrumenting
+scanThreads = 8  # number of threads listing the subfolders in parallel during a recursive scan
+playHistorySize = 500  # maximum number of played musics remembered for the previous button
+previousRestartTime = 3  # time in seconds after which the previous button restarts the music instead
+searchDelay = 150  # time in ms the search waits for the typing to pause
+searchResultLimit = 1000  # maximum number of search results shown, the first ones in the sort order
+configSaveDelay = 500  # time in ms the config changes are batched for before being written
+logFile = appDataDir / "logs" / "latest.log"  # path to the log file of the current session
+logMaxSize = 5 * 1024 * 1024  # size in bytes after which the log file is rotated
+logBackupCount = 5  # number of rotated log files kept, the previous sessions included
+logLevels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]  # levels that can be set from the config or with --log-level
+defaultLogLevel = "INFO"  # level used when none is set
 
 class Fonts():
     """a class containing useful fonts"""
@@ -0,0 +1,174 @@
+from constants import *
+from metadata import readCover
+from PyQt5 import QtCore, QtGui
+from collections import OrderedDict
+from pathlib import Path
+import threading
+import hashlib
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+def coverDigest(imageData:bytes) -> str:
+    """return the key under which a cover image is stored, a hash of its content so the musics sharing a cover share it"""
+    return hashlib.sha1(imageData).hexdigest()
+
+def thumbnailPath(key:str) -> Path:
+    """return the path of the thumbnail file stored under a key"""
+    return thumbnailsDir / f"{key}.png"
+
+def makeThumbnail(imageData:bytes, size:int=coverThumbnailSize) -> QtGui.QImage:
+    """downscale an image to fit a square thumbnail, or return None if the image can't be decoded"""
+    image = QtGui.QImage.fromData(imageData)
+    if image.isNull():
+        return None
+    return image.scaled(size, size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+
+def saveThumbnail(key:str, image:QtGui.QImage) -> bool:
+    """save a thumbnail on disk under a key, return False if it failed"""
+    path = thumbnailPath(key)
+    tempPath = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")  # unique per thread
+    if not image.save(str(tempPath), "PNG"):
+        return False
+    os.replace(tempPath, path)  # atomic, readers never see a partial file
+    return True
+
+def storeThumbnail(imageData:bytes) -> str:
+    """save the thumbnail of a cover image on disk unless it is already stored, and return its key
+
+    return None if the image can't be decoded"""
+    key = coverDigest(imageData)
+    if thumbnailPath(key).exists():
+        return key  # another music has the same cover
+    image = makeThumbnail(imageData)
+    if image is None:
+        return None
+    if not saveThumbnail(key, image):
+        log.error("failed to save the thumbnail %s", key)
+        return None
+    return key
+
+def removeThumbnail(key:str):
+    """delete a thumbnail file which isn't referenced anymore"""
+    try:
+        thumbnailPath(key).unlink(missing_ok=True)
+    except OSError as e:
+        log.warning("failed to remove the thumbnail %s: %s", key, e)
+
+def clearThumbnails():
+    """delete every thumbnail file, when no music references them anymore"""
+    for path in thumbnailsDir.glob("*.png"):
+        removeThumbnail(path.stem)
+
+class ThumbnailSignals(QtCore.QObject):
+    """signals used by the thumbnail loaders to send the decoded images to the GUI thread"""
+    loaded = QtCore.pyqtSignal(str, object, str, QtGui.QImage)  # requested key, music path, key of the cover, decoded thumbnail (null if it failed)
+
+class ThumbnailLoader(QtCore.QRunnable):
+    """a job that decodes a thumbnail file in a worker thread
+
+    when the key of the cover isn't known yet or its file is missing, the cover is read from the music to find its
+    key, and its thumbnail is made unless another music with the same cover already stored it"""
+    def __init__(self, key:str, musicPath:Path, signals:ThumbnailSignals):
+        super().__init__()
+        self.key = key  # None if the cover of the music was never read
+        self.musicPath = musicPath
+        self.signals = signals
+
+    def run(self):
+        key = self.key
+        path = thumbnailPath(key) if key is not None else None
+        image = QtGui.QImage(str(path)) if path is not None and path.exists() else QtGui.QImage()
+        if image.isNull() and self.musicPath is not None:
+            imageData = readCover(self.musicPath)
+            if imageData:
+                key = coverDigest(imageData)
+                path = thumbnailPath(key)
+                image = QtGui.QImage(str(path)) if path.exists() else QtGui.QImage()
+                if image.isNull():
+                    image = makeThumbnail(imageData) or QtGui.QImage()
+                    if not image.isNull() and not saveThumbnail(key, image):
+                        log.error("failed to save the thumbnail of %s", self.musicPath)
+        self.signals.loaded.emit(self.key or "", self.musicPath, key or "", image)
+
+class CoverStore(QtCore.QObject):
+    """the covers of the musics, stored once per image content on disk and in memory
+
+    the musics reference their cover by the hash of its content, so the tracks of an album share one thumbnail file
+    and one decoded pixmap of each size. the thumbnails are decoded only when they are displayed, in bounded LRUs"""
+    thumbnailReady = QtCore.pyqtSignal(str)  # emitted with the key of a thumbnail once it is decoded
+    coverResolved = QtCore.pyqtSignal(Path, str)  # music path, key of its cover, when it changed or wasn't known
+
+    def __init__(self, capacity:int=thumbnailMemoryCacheSize, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self.pixmaps = OrderedDict()  # key -> thumbnail pixmap, the most recently used at the end
+        self.covers = OrderedDict()  # key -> full resolution pixmap shown in the player
+        self.pending = set()  # keys or music paths being decoded
+        self.missing = set()  # keys or music paths whose thumbnail couldn't be decoded or made, not retried
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = ThumbnailSignals()
+        self.signals.loaded.connect(self.thumbnailLoaded)
+
+    def pixmap(self, key:str, musicPath:Path=None) -> QtGui.QPixmap:
+        """return the thumbnail of a cover, or None and start decoding it if it isn't in memory yet
+
+        the key is None when the cover of the music was never read, it is then found by reading the cover"""
+        pixmap = self.pixmaps.get(key) if key is not None else None
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return pixmap
+        request = key if key is not None else musicPath
+        if request is not None and request not in self.pending and request not in self.missing:
+            self.pending.add(request)
+            self.pool.start(ThumbnailLoader(key, musicPath, self.signals))
+        return None
+
+    def thumbnailLoaded(self, requestedKey:str, musicPath:Path, key:str, image:QtGui.QImage):
+        """store a decoded thumbnail and evict the least recently used ones"""
+        request = requestedKey or musicPath
+        self.pending.discard(request)
+        if key and key != requestedKey and musicPath is not None:
+            self.coverResolved.emit(musicPath, key)
+        if image.isNull():
+            log.warning("failed to decode the thumbnail %s", requestedKey or musicPath)
+            self.missing.add(request)
+            return
+        self.pixmaps[key] = QtGui.QPixmap.fromImage(image)
+        while len(self.pixmaps) > self.capacity:
+            self.pixmaps.popitem(last=False)
+        self.thumbnailReady.emit(key)
+
+    def cover(self, musicPath:Path, key:str=None) -> QtGui.QPixmap:
+        """return the full resolution cover of a music for the player, decoded once for all the musics sharing it"""
+        pixmap = self.covers.get(key) if key is not None else None
+        if pixmap is not None:
+            self.covers.move_to_end(key)
+            return pixmap
+        imageData = readCover(musicPath)
+        if not imageData:
+            return None
+        digest = coverDigest(imageData)
+        if digest != key:
+            self.coverResolved.emit(musicPath, digest)
+        pixmap = self.covers.get(digest)
+        if pixmap is None:
+            image = QtGui.QImage.fromData(imageData)
+            if image.isNull():
+                return None
+            pixmap = QtGui.QPixmap.fromImage(image)
+            self.covers[digest] = pixmap
+            while len(self.covers) > coverMemoryCacheSize:
+                self.covers.popitem(last=False)
+        self.covers.move_to_end(digest)
+        return pixmap
+
+    def clear(self):
+        """drop the pending jobs and the decoded covers"""
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.pending.clear()
+        self.pixmaps.clear()
+        self.covers.clear()
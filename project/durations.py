@@ -0,0 +1,196 @@
+from pathlib import Path
+from fileheaders import flacStart, flacStreamInfo, mp4Atoms, skipId3
+import logging
+import struct
+
+log = logging.getLogger(__name__)
+
+# bitrates in kbps by [MPEG 1 or 2/2.5][layer I, II or III][index]
+mp3Bitrates = [
+    [[0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+     [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+     [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]],
+    [[0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+     [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+     [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]]
+]
+mp3SampleRates = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}  # by version bits
+headerReadSize = 64 * 1024  # bytes read to find the first frame or page, the other reads are a few bytes
+
+def parseMp3Header(data:bytes, i:int) -> tuple:
+    """return (version bits, layer, bitrate in kbps, sample rate, frame length, samples per frame, mono) for a frame header, or None"""
+    if data[i] != 0xff or data[i+1] & 0xe0 != 0xe0:
+        return None
+    versionBits = (data[i+1] >> 3) & 3
+    layer = 4 - ((data[i+1] >> 1) & 3)
+    bitrateIndex = data[i+2] >> 4
+    sampleRateIndex = (data[i+2] >> 2) & 3
+    if versionBits == 1 or layer == 4 or bitrateIndex in (0, 15) or sampleRateIndex == 3:
+        return None  # reserved values, or a free bitrate which can't be measured from the header
+    bitrate = mp3Bitrates[0 if versionBits == 3 else 1][layer - 1][bitrateIndex]
+    sampleRate = mp3SampleRates[versionBits][sampleRateIndex]
+    padding = (data[i+2] >> 1) & 1
+    mono = (data[i+3] >> 6) == 3
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // sampleRate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or versionBits == 3 else 576
+        length = samples // 8 * bitrate * 1000 // sampleRate + padding
+    return versionBits, layer, bitrate, sampleRate, length, samples, mono
+
+def mp3Duration(f, fileSize:int) -> float:
+    """read the frame count of the Xing/Info or VBRI header of the first frame, or estimate it from a constant bitrate"""
+    start = skipId3(f)
+    f.seek(start)
+    data = f.read(headerReadSize)
+    i = data.find(b"\xff")
+    while i != -1 and i < len(data) - 4:
+        header = parseMp3Header(data, i)
+        if header is None:
+            i = data.find(b"\xff", i + 1)
+            continue
+        versionBits, layer, bitrate, sampleRate, length, samples, mono = header
+        if i + length + 4 <= len(data) and parseMp3Header(data, i + length) is None:
+            i = data.find(b"\xff", i + 1)
+            continue  # a false sync in the data, a real frame is followed by another one
+        break
+    else:
+        return None
+    frame = data[i:i + length + 200]
+
+    # Xing/Info header of the VBR and LAME encoded files, after the side information
+    xing = 4 + ((17 if mono else 32) if versionBits == 3 else (9 if mono else 17))
+    if frame[xing:xing + 4] in (b"Xing", b"Info") and len(frame) >= xing + 16:
+        flags = struct.unpack(">I", frame[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack(">I", frame[xing + 8:xing + 12])[0]
+            total = frames * samples
+            lame = xing + 8 + (4 if flags & 1 else 0) + (4 if flags & 2 else 0) + (100 if flags & 4 else 0) + (4 if flags & 8 else 0)
+            if frame[lame:lame + 4] == b"LAME" and len(frame) >= lame + 24:  # remove the encoder delay and padding
+                delay, padding = frame[lame + 21] << 4 | frame[lame + 22] >> 4, (frame[lame + 22] & 0x0f) << 8 | frame[lame + 23]
+                total = max(0, total - delay - padding)
+            return total / sampleRate
+
+    # VBRI header of the Fraunhofer encoded files, at a fixed place
+    if frame[36:40] == b"VBRI" and len(frame) >= 54:
+        frames = struct.unpack(">I", frame[50:54])[0]
+        return frames * samples / sampleRate
+
+    # constant bitrate, the size of the audio data gives the duration
+    end = fileSize
+    f.seek(max(0, fileSize - 128))
+    if f.read(3) == b"TAG":
+        end -= 128  # ID3v1 tag
+    return max(0, end - start - i) * 8 / (bitrate * 1000)
+
+def flacDuration(f, fileSize:int) -> float:
+    """read the sample count of the STREAMINFO block, always the first one"""
+    if flacStart(f) is None:
+        return None
+    data = f.read(4 + 34)
+    if len(data) < 38 or data[0] & 0x7f != 0:
+        return None
+    sampleRate, totalSamples = flacStreamInfo(data[4:])
+    if not sampleRate or not totalSamples:
+        return None  # unknown in a streamed file
+    return totalSamples / sampleRate
+
+def oggDuration(f, fileSize:int) -> float:
+    """read the sample rate in the first page and the granule position of the last page of the first stream"""
+    f.seek(0)
+    data = f.read(headerReadSize)
+    if data[:4] != b"OggS" or len(data) < 28:
+        return None
+    serial = data[14:18]
+    segments = data[26]
+    packet = data[27 + segments:]
+    preSkip = 0
+    if packet[:7] == b"\x01vorbis" and len(packet) >= 16:
+        sampleRate = struct.unpack("<I", packet[12:16])[0]
+    elif packet[:8] == b"OpusHead" and len(packet) >= 12:
+        sampleRate = 48000  # the granule positions of opus are always at 48 kHz
+        preSkip = struct.unpack("<H", packet[10:12])[0]
+    elif packet[:5] == b"\x7fFLAC" and len(packet) >= 13 + 4 + 18:
+        sampleRate = flacStreamInfo(packet[13 + 4:])[0]
+    else:
+        return None
+    if not sampleRate:
+        return None
+
+    # the last page is searched from the end, growing the read until one is found
+    size = 8 * 1024
+    while True:
+        f.seek(max(0, fileSize - size))
+        data = f.read(size)
+        i = data.rfind(b"OggS")
+        while i != -1:
+            if len(data) >= i + 18 and data[i + 14:i + 18] == serial:
+                granule = struct.unpack("<q", data[i + 6:i + 14])[0]
+                if granule >= 0:  # -1 when no packet ends in the page
+                    return max(0, granule - preSkip) / sampleRate
+            i = data.rfind(b"OggS", 0, i)
+        if size >= fileSize or size >= 1024 * 1024:
+            return None
+        size *= 8
+
+def wavDuration(f, fileSize:int) -> float:
+    """read the byte rate of the fmt chunk and the size of the data chunk"""
+    f.seek(0)
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    byteRate = None
+    offset = 12
+    while offset + 8 <= fileSize:
+        f.seek(offset)
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunkId, chunkSize = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunkId == b"fmt ":
+            fmt = f.read(12)
+            if len(fmt) == 12:
+                byteRate = struct.unpack("<I", fmt[8:12])[0]
+        elif chunkId == b"data":
+            if not byteRate:
+                return None
+            dataSize = min(chunkSize, fileSize - offset - 8)  # the size is wrong in some streamed or truncated files
+            return dataSize / byteRate
+        offset += 8 + chunkSize + (chunkSize & 1)  # the chunks are padded to an even size
+    return None
+
+def m4aDuration(f, fileSize:int) -> float:
+    """read the time scale and duration of the mvhd atom of the moov atom, which can be after the audio data"""
+    for atomType, dataOffset, dataEnd in mp4Atoms(f, 0, fileSize):
+        if atomType != b"moov":
+            continue
+        for childType, childOffset, childEnd in mp4Atoms(f, dataOffset, dataEnd):
+            if childType != b"mvhd":
+                continue
+            f.seek(childOffset)
+            data = f.read(32)
+            if len(data) >= 32 and data[0] == 1:
+                timeScale, duration = struct.unpack(">IQ", data[20:32])
+            elif len(data) >= 20:
+                timeScale, duration = struct.unpack(">II", data[12:20])
+            else:
+                return None
+            return duration / timeScale if timeScale else None
+        return None
+    return None
+
+durationReaders = {".mp3": mp3Duration, ".flac": flacDuration, ".ogg": oggDuration, ".wav": wavDuration, ".m4a": m4aDuration}
+
+def probeDuration(musicPath:Path) -> float:
+    """return the duration in seconds of a music from the headers of its file, or None if it can't be found this way"""
+    reader = durationReaders.get(musicPath.suffix.lower())
+    if reader is None:
+        return None
+    try:
+        with open(musicPath, "rb") as f:
+            fileSize = f.seek(0, 2)
+            return reader(f, fileSize)
+    except (OSError, struct.error, IndexError, ZeroDivisionError) as e:
+        log.debug("failed to probe the duration of %s: %s", musicPath, e)
+        return None
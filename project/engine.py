@@ -0,0 +1,238 @@
+from constants import *
+from PyQt5 import QtCore
+from pathlib import Path
+import threading
+import logging
+
+log = logging.getLogger(__name__)
+
+vlcInstance = None  # the vlc instance shared by the whole app, created on first use
+vlcInstanceLock = threading.Lock()
+
+def getVlcInstance() -> "vlc.Instance":
+    """return the shared vlc instance, importing vlc and creating it if needed"""
+    global vlcInstance
+    with vlcInstanceLock:
+        if vlcInstance is None:
+            import vlc  # slow to load, so only imported once a music is read
+            vlcInstance = vlc.Instance("--no-video", "--quiet")
+            log.debug("created the vlc instance")
+        return vlcInstance
+
+class PlayerEngine(QtCore.QObject):
+    """a single long-lived vlc player which swaps the played media and prepares the next one in advance, created on first use"""
+    musicLoaded = QtCore.pyqtSignal(Path)  # emitted when a music is ready to be played
+    loadFailed = QtCore.pyqtSignal(Path, str)  # emitted with the reason when a music can't be played
+    musicEnded = QtCore.pyqtSignal(Path)  # emitted when the current music reached its end
+    # forward the vlc events from the vlc thread to the GUI thread, with the generation of the load they belong to
+    vlcPlaying = QtCore.pyqtSignal(int)
+    vlcError = QtCore.pyqtSignal(int)
+    vlcEndReached = QtCore.pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.instance = None
+        self.player = None  # created with the first music loaded, so vlc isn't needed at startup
+        self.events = None
+        self.currentMusic = None  # music set in the player
+        self.generation = 0  # incremented each time the media changes, so the late events of a previous media are ignored
+        self.loaded = False  # whether the current music finished loading
+        self.playRequested = False  # whether the music should play once loaded
+        self.pendingTime = None  # time in ms to seek to once the music is loaded
+        self.lastTime = 0  # last time in ms reported by vlc, updated from the vlc thread
+        self.preloadedMusic = None  # music prepared in advance
+        self.preloadedMedia = None
+        self.unavailable = None  # why the vlc player can't be created, like libvlc missing, so it isn't retried
+
+        self.loadTimer = QtCore.QTimer(self)  # gives up loading a music that never starts
+        self.loadTimer.setSingleShot(True)
+        self.loadTimer.setInterval(musicLoadTimeout)
+        self.loadTimer.timeout.connect(lambda: self.fail(f"it didn't start after {musicLoadTimeout/1000:g}s"))
+
+        self.vlcPlaying.connect(self.playerStarted)
+        self.vlcError.connect(self.playerFailed)
+        self.vlcEndReached.connect(self.playerEnded)
+        log.debug("created the player engine")
+
+    def createPlayer(self) -> bool:
+        """create the vlc player and listen to its events, return False if vlc isn't available"""
+        if self.unavailable is not None:
+            return False
+        try:
+            import vlc
+            self.instance = getVlcInstance()
+        except Exception as e:  # the vlc module raises NameError or OSError when libvlc can't be loaded
+            self.unavailable = f"vlc isn't available: {e}"
+            log.error("failed to create the vlc player: %s", e)
+            return False
+        self.player = self.instance.media_player_new()
+        # the event manager must stay referenced as long as the callbacks are attached
+        self.events = self.player.event_manager()
+        # the generation is read in the vlc thread when the event happens, an event queued before the media changed
+        # reaches the GUI thread with the previous generation
+        self.events.event_attach(vlc.EventType.MediaPlayerPlaying, lambda event: self.vlcPlaying.emit(self.generation))
+        self.events.event_attach(vlc.EventType.MediaPlayerEncounteredError, lambda event: self.vlcError.emit(self.generation))
+        self.events.event_attach(vlc.EventType.MediaPlayerEndReached, lambda event: self.vlcEndReached.emit(self.generation))
+        self.events.event_attach(vlc.EventType.MediaPlayerTimeChanged, self.vlcTimeChanged)  # not forwarded, only read when the interface refreshes
+        log.debug("created the vlc player")
+        return True
+
+    def load(self, music:Path):
+        """swap the played media for a music, start playing it muted until it is ready"""
+        if self.player is None and not self.createPlayer():
+            QtCore.QTimer.singleShot(0, lambda: self.loadFailed.emit(music, self.unavailable))  # reported like the vlc errors
+            return
+        self.loadTimer.stop()
+        self.player.stop()  # synchronous, the previous media sends no more events afterwards
+        self.generation += 1
+        if music == self.preloadedMusic:
+            media = self.preloadedMedia  # already parsed in advance
+            self.preloadedMusic = None
+            self.preloadedMedia = None
+        else:
+            media = self.instance.media_new(str(music))
+        self.player.set_media(media)
+        media.release()  # the player holds its own reference
+        self.currentMusic = music
+        self.loaded = False
+        self.playRequested = False
+        self.pendingTime = None
+        self.lastTime = 0
+        self.player.audio_set_volume(0)
+        self.player.play()
+        self.loadTimer.start()
+        log.debug("loading the music %s", music)
+
+    def preload(self, music:Path):
+        """parse a music in the background so switching to it is near instant"""
+        if music == self.preloadedMusic or music == self.currentMusic:
+            return
+        self.clearPreload()
+        if music is None:
+            return
+        if self.player is None and not self.createPlayer():
+            return
+        import vlc
+        self.preloadedMusic = music
+        self.preloadedMedia = self.instance.media_new(str(music))
+        self.preloadedMedia.parse_with_options(vlc.MediaParseFlag.local, -1)  # asynchronous
+        log.debug("preloading the music %s", music)
+
+    def clearPreload(self):
+        """release the music prepared in advance"""
+        if self.preloadedMedia:
+            self.preloadedMedia.release()
+        self.preloadedMusic = None
+        self.preloadedMedia = None
+
+    def playerStarted(self, generation:int):
+        """finish loading the music once the player actually started playing it"""
+        if generation != self.generation:
+            log.debug("ignored a playing event of a previous media")
+            return
+        if self.currentMusic is None or self.loaded:
+            return  # the music was unloaded, or it is simply resumed
+        self.loadTimer.stop()
+        self.loaded = True
+        if not self.playRequested:
+            self.player.pause()
+            self.player.set_time(0)
+            self.lastTime = 0
+        self.player.audio_set_volume(100)
+        if self.pendingTime is not None:
+            self.player.set_time(self.pendingTime)
+            self.lastTime = self.pendingTime
+            self.pendingTime = None
+        log.debug("loaded the music %s", self.currentMusic)
+        self.musicLoaded.emit(self.currentMusic)
+
+    def vlcTimeChanged(self, event:"vlc.Event"):
+        """remember the time reported by vlc, called in the vlc thread"""
+        self.lastTime = event.u.new_time
+
+    def playerFailed(self, generation:int):
+        """unload the current music if vlc couldn't play it"""
+        if generation == self.generation:
+            self.fail("vlc couldn't play the file")
+
+    def playerEnded(self, generation:int):
+        """notify the end of the current music"""
+        if generation != self.generation or self.currentMusic is None or not self.loaded:
+            return
+        self.playRequested = False
+        log.debug("reached the end of the music %s", self.currentMusic)
+        self.musicEnded.emit(self.currentMusic)
+
+    def fail(self, reason:str):
+        """unload a music that can't be played"""
+        music = self.currentMusic
+        if music is None:
+            return
+        self.unload()
+        log.error("failed to load the music %s: %s", music, reason)
+        self.loadFailed.emit(music, reason)
+
+    def unload(self):
+        """stop and forget the current music"""
+        self.loadTimer.stop()
+        if self.player is not None:
+            self.player.stop()
+        self.generation += 1
+        self.currentMusic = None
+        self.loaded = False
+        self.playRequested = False
+        self.pendingTime = None
+
+    def play(self):
+        """play the current music, or as soon as it is loaded"""
+        self.playRequested = True
+        if self.loaded:
+            self.player.play()
+
+    def pause(self):
+        """pause the current music, or keep it paused once loaded"""
+        self.playRequested = False
+        if self.loaded:
+            self.player.pause()
+
+    def seek(self, time:int):
+        """jump to a time in ms, or do it once the music is loaded"""
+        if self.currentMusic is None:
+            return
+        if self.loaded:
+            self.player.set_time(time)
+            self.lastTime = time
+        else:
+            self.pendingTime = time
+
+    def time(self) -> int:
+        """return the current time of the music in ms"""
+        if not self.loaded:
+            return self.pendingTime or 0
+        return self.player.get_time()
+
+    def position(self) -> int:
+        """return the last time in ms reported by vlc, without querying the player"""
+        return self.lastTime if self.loaded else (self.pendingTime or 0)
+
+    def length(self) -> int:
+        """return the length of the current music in ms, or 0 if unknown"""
+        return max(0, self.player.get_length()) if self.loaded else 0
+
+    def state(self) -> "vlc.State":
+        """return the state of the vlc player, or None if it wasn't created yet"""
+        return self.player.get_state() if self.player is not None else None
+
+    def release(self):
+        """release the vlc player, the engine can't be used afterwards"""
+        self.unload()
+        self.clearPreload()
+        if self.player is None:
+            return
+        import vlc
+        self.events.event_detach(vlc.EventType.MediaPlayerPlaying)
+        self.events.event_detach(vlc.EventType.MediaPlayerEncounteredError)
+        self.events.event_detach(vlc.EventType.MediaPlayerEndReached)
+        self.events.event_detach(vlc.EventType.MediaPlayerTimeChanged)
+        self.player.release()
+        log.debug("released the player engine")
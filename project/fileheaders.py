@@ -0,0 +1,50 @@
+import struct
+
+# the parsing of the file headers shared by the tags and the durations, they only read the few bytes they need
+
+def syncsafe(data:bytes) -> int:
+    """return an ID3v2 size, stored on 7 bits per byte"""
+    return (data[0] & 0x7f) << 21 | (data[1] & 0x7f) << 14 | (data[2] & 0x7f) << 7 | (data[3] & 0x7f)
+
+def skipId3(f) -> int:
+    """return the offset after the ID3v2 tag at the start of a file, with its footer, or 0 if there is none"""
+    f.seek(0)
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    return 10 + syncsafe(header[6:10]) + (10 if header[5] & 0x10 else 0)
+
+def flacStart(f) -> int:
+    """return the offset of the fLaC marker, after an ID3v2 tag some tools add, or None if it isn't a FLAC file"""
+    start = skipId3(f)
+    f.seek(start)
+    return start if f.read(4) == b"fLaC" else None
+
+def flacStreamInfo(data:bytes) -> tuple:
+    """return (sample rate, total samples) from a STREAMINFO block"""
+    sampleRate = data[10] << 12 | data[11] << 4 | data[12] >> 4
+    totalSamples = (data[13] & 0x0f) << 32 | struct.unpack(">I", data[14:18])[0]
+    return sampleRate, totalSamples
+
+def mp4Atoms(f, start:int, end:int):
+    """yield the (type, data offset, data end) of the atoms between two offsets, reading only their headers"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, atomType = struct.unpack(">I", header[:4])[0], header[4:]
+        dataOffset = offset + 8
+        if size == 1:  # 64 bits size
+            extended = f.read(8)
+            if len(extended) < 8:
+                return
+            size = struct.unpack(">Q", extended)[0]
+            dataOffset += 8
+        elif size == 0:  # up to the end of the file
+            size = end - offset
+        if size < dataOffset - offset:
+            return
+        yield atomType, dataOffset, min(offset + size, end)
+        offset += size
@@ -0,0 +1,57 @@
+from constants import *
+from PyQt5 import QtCore, QtGui, QtSvg
+from collections import OrderedDict
+import logging
+
+log = logging.getLogger(__name__)
+
+class IconRegistry():
+    """the icons and SVG images of the theme, each file is loaded once and rasterized once per size
+
+    the assets are named by their path in the theme folder, like "icons/loop/down.svg". the rasterized pixmaps are
+    kept per (asset, size, device pixel ratio), so repainting an image is only drawing a pixmap"""
+    def __init__(self, capacity:int=iconPixmapCacheSize):
+        self.capacity = capacity
+        self.icons = {}  # asset -> QIcon, which caches its own renders per size
+        self.renderers = {}  # asset -> QSvgRenderer
+        self.pixmaps = OrderedDict()  # (asset, width, height, device pixel ratio) -> pixmap, the most recently used at the end
+
+    def icon(self, asset:str) -> QtGui.QIcon:
+        """return the icon of an asset, loaded the first time it is used"""
+        icon = self.icons.get(asset)
+        if icon is None:
+            icon = QtGui.QIcon(str(themeAssetsDir / asset))
+            self.icons[asset] = icon
+            log.debug("loaded the icon %s", asset)
+        return icon
+
+    def renderer(self, asset:str) -> QtSvg.QSvgRenderer:
+        """return the SVG renderer of an asset, parsed the first time it is used"""
+        renderer = self.renderers.get(asset)
+        if renderer is None:
+            renderer = QtSvg.QSvgRenderer(str(themeAssetsDir / asset))
+            if not renderer.isValid():
+                log.error("failed to load the image %s", asset)
+            self.renderers[asset] = renderer
+        return renderer
+
+    def pixmap(self, asset:str, size:QtCore.QSize, devicePixelRatio:float=1.0) -> QtGui.QPixmap:
+        """return an SVG asset rendered at a size in logical pixels, rendered only the first time"""
+        key = (asset, size.width(), size.height(), devicePixelRatio)
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return pixmap
+        pixmap = QtGui.QPixmap(round(size.width() * devicePixelRatio), round(size.height() * devicePixelRatio))
+        pixmap.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(pixmap)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        self.renderer(asset).render(painter)
+        painter.end()
+        pixmap.setDevicePixelRatio(devicePixelRatio)
+        self.pixmaps[key] = pixmap
+        while len(self.pixmaps) > self.capacity:
+            self.pixmaps.popitem(last=False)
+        return pixmap
+
+icons = IconRegistry()
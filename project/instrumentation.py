@@ -0,0 +1,127 @@
+from constants import *
+from PyQt5 import QtCore
+from collections import deque
+from functools import wraps
+from pathlib import Path
+import threading
+import logging
+import time
+import json
+
+log = logging.getLogger(__name__)
+
+class Histogram():
+    """the durations of one operation, the percentiles are computed on the most recent ones"""
+    def __init__(self, size:int=2048):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration:float):
+        self.samples.append(duration)
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def summary(self) -> dict:
+        """return the count, mean, p50, p95 and max of the durations in ms"""
+        samples = sorted(self.samples)
+        def percentile(p:float) -> float:
+            return samples[min(len(samples) - 1, int(p * len(samples)))] if samples else 0.0
+        return {"count": self.count, "mean": round(self.total / self.count, 3) if self.count else 0.0,
+                "p50": round(percentile(0.50), 3), "p95": round(percentile(0.95), 3), "max": round(self.max, 3)}
+
+class Metrics():
+    """the durations of the hot paths of the app, only collected when enabled with --instrument or the config"""
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()  # some operations are measured in the worker threads
+        self.histograms = {}  # operation name -> histogram
+
+    def record(self, name:str, duration:float):
+        """add a duration in ms to the histogram of an operation"""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(duration)
+
+    def measure(self, name:str) -> "Measure":
+        """return a context manager measuring the duration of its block"""
+        return Measure(self, name)
+
+    def timed(self, name:str):
+        """decorate a function to measure each of its calls"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, (time.perf_counter() - start) * 1000)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        """return the summary of every histogram"""
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def dump(self, path:Path=metricsFile):
+        """write the summaries as JSON"""
+        if not self.enabled:
+            return
+        try:
+            with open(path, "w") as f:
+                json.dump(self.snapshot(), f, indent=4)
+            log.info("dumped the metrics to %s", path)
+        except OSError as e:
+            log.error("failed to dump the metrics to %s: %s", path, e)
+
+class Measure():
+    """a context manager adding the duration of its block to the metrics"""
+    def __init__(self, metrics:Metrics, name:str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        if self.metrics.enabled:
+            self.metrics.record(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+metrics = Metrics()  # shared by the whole app
+
+class StallDetector(QtCore.QObject):
+    """detect when the GUI thread is blocked, with a timer that should fire at a steady pace"""
+    def __init__(self, interval:int=20, parent=None):
+        super().__init__(parent)
+        self.interval = interval
+        self.last = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.check)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def check(self):
+        """record how late the timer fired, if it was blocked for long"""
+        now = time.perf_counter()
+        late = (now - self.last) * 1000 - self.interval
+        self.last = now
+        if late > stallThreshold:
+            metrics.record("eventLoopStall", late)
+            log.warning("the interface was blocked for %.0f ms", late)
@@ -1,14 +1,22 @@
 from constants import *
 from widgets import *
+from metadata import MusicMetadata
+from cache import MetadataCache
+from workers import MetadataScan, MetadataSignals, MetadataWorker, FolderCountSignals, FolderCountWorker, FolderScanSignals, FolderScanWorker, LibraryIndexSignals, LibraryIndexWorker
+from library import LibraryIndex
+from startup import startupProfile
+from instrumentation import metrics, StallDetector
+from engine import PlayerEngine
+from watcher import LibraryWatcher
+from tagwriter import TagWriteQueue
+from playqueue import PlayQueue
+from config import ConfigStore
+from logpipeline import logPipeline
+from icons import icons
 import PyQt5.QtWidgets as qtw
 from PyQt5 import QtCore, QtGui
 from pathlib import Path
-import random as rd
 import logging
-import eyed3
-import glob
-import json
-import vlc
 
 log = logging.getLogger(__name__)
 
@@ -18,7 +26,7 @@ class Window(qtw.QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Banger Player")
-        self.setWindowIcon(QtGui.QIcon(str(themeAssetsDir / "logo" / "logo.svg")))
+        self.setWindowIcon(icons.icon("logo/logo.svg"))
         log.debug("window instance created")
     
     def startInterface(self):
@@ -28,10 +36,14 @@ class Window(qtw.QMainWindow):
         self.buildFoldersPanel()
         self.buildMusicsPanel()
         self.buildPlayerPanel()
+        startupProfile.mark("built the interface")
         self.setupInterface()
+        startupProfile.mark("set up the interface")
         log.info("interface loaded, now showing the window")
         self.showMaximized()
         self.show()
+        startupProfile.mark("showed the window")
+        QtCore.QTimer.singleShot(0, self.loadLibrary)  # the window appears before the folders are loaded
     
     def buildMainInterface(self):
         """build the main interface"""
@@ -92,6 +104,15 @@ class Window(qtw.QMainWindow):
         self.addFolderButton.setStyleSheet("padding: 10px;")
         self.foldersPanelLayout.addWidget(self.addFolderButton)
 
+        # recursive scan button
+        self.recursiveButton = qtw.QPushButton("Include Subfolders")
+        self.recursiveButton.setSizePolicy(qtw.QSizePolicy.Expanding, qtw.QSizePolicy.Fixed)
+        self.recursiveButton.setFont(Fonts.subtitleFont)
+        self.recursiveButton.setCheckable(True)
+        self.recursiveButton.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
+        self.recursiveButton.setStyleSheet("padding: 5px;")
+        self.foldersPanelLayout.addWidget(self.recursiveButton)
+
         # separator line
         self.foldersPanelLayout.addWidget(Separator(QtCore.Qt.Horizontal))
 
@@ -108,6 +129,13 @@ class Window(qtw.QMainWindow):
     
     def buildMusicsPanel(self):
         """build the musics panel"""
+        # search box
+        self.searchBox = qtw.QLineEdit()
+        self.searchBox.setPlaceholderText("Search in all the folders")
+        self.searchBox.setFont(Fonts.textFont)
+        self.searchBox.setClearButtonEnabled(True)
+        self.musicsPanelLayout.addWidget(self.searchBox)
+
         # folder name label
         self.folderNameLabel = qtw.QLabel("[FOLDER NAME]")
         self.folderNameLabel.setFont(Fonts.smallTitleFont)
@@ -126,14 +154,10 @@ class Window(qtw.QMainWindow):
         self.musicsPanelLayout.addWidget(Separator(QtCore.Qt.Horizontal))
 
         # musics scollable list
-        self.musicsList = qtw.QScrollArea()
-        self.musicsList.setWidgetResizable(True)
-        self.musicsList.setFrameShape(qtw.QFrame.NoFrame)
-        self.musicsListWidget = qtw.QWidget()
-        self.musicsListLayout = qtw.QVBoxLayout()
-        self.musicsListLayout.setAlignment(QtCore.Qt.AlignTop)
-        self.musicsListWidget.setLayout(self.musicsListLayout)
-        self.musicsList.setWidget(self.musicsListWidget)
+        self.coverStore = CoverStore()
+        self.musicsModel = MusicListModel()
+        self.musicsList = MusicListView(self.coverStore)
+        self.musicsList.setModel(self.musicsModel)
         self.musicsPanelLayout.addWidget(self.musicsList)
 
         # separator line
@@ -150,7 +174,7 @@ class Window(qtw.QMainWindow):
         # play pause button
         self.globalPlayButton = qtw.QPushButton()
         self.globalPlayButton.setFixedSize(40, 40)
-        self.globalPlayButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "play.svg")))
+        self.globalPlayButton.setIcon(icons.icon("icons/play.svg"))
         self.globalPlayButton.setIconSize(QtCore.QSize(30, 30))
         self.globalPlayButton.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
         self.controlButtonsLayout.addWidget(self.globalPlayButton)
@@ -167,7 +191,7 @@ class Window(qtw.QMainWindow):
         self.shuffleButton = qtw.QPushButton()
         self.shuffleButton.setFixedSize(40, 40)
         self.shuffleButton.setCheckable(True)
-        self.shuffleButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "shuffle.svg")))
+        self.shuffleButton.setIcon(icons.icon("icons/shuffle.svg"))
         self.shuffleButton.setIconSize(QtCore.QSize(30, 30))
         self.shuffleButton.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
         self.controlButtonsLayout.addWidget(self.shuffleButton)
@@ -178,7 +202,7 @@ class Window(qtw.QMainWindow):
         self.autoplayButton = qtw.QPushButton()
         self.autoplayButton.setFixedSize(40, 40)
         self.autoplayButton.setCheckable(True)
-        self.autoplayButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "autoplay.svg")))
+        self.autoplayButton.setIcon(icons.icon("icons/autoplay.svg"))
         self.autoplayButton.setIconSize(QtCore.QSize(30, 30))
         self.autoplayButton.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
         self.controlButtonsLayout.addWidget(self.autoplayButton)
@@ -202,7 +226,7 @@ class Window(qtw.QMainWindow):
         self.coverLayout.setAlignment(QtCore.Qt.AlignCenter)
         self.playerPanelLayout.addWidget(self.coverWidget)
 
-        self.musicCover = SquareVectorLabel(themeAssetsDir / "icons" / "cover.svg")
+        self.musicCover = SquareVectorLabel("icons/cover.svg")
         self.musicCover.setMaximumSize(300, 300)
         self.musicCover.setMinimumSize(100, 100)
         self.musicCover.setSizePolicy(qtw.QSizePolicy.Expanding, qtw.QSizePolicy.Expanding)
@@ -236,12 +260,31 @@ class Window(qtw.QMainWindow):
         self.musicPlayButtonWidget.setSizePolicy(qtw.QSizePolicy.Fixed, qtw.QSizePolicy.Fixed)
         self.progressLayout.addWidget(self.musicPlayButtonWidget)
 
+        self.musicControlsLayout = qtw.QHBoxLayout()
+        self.musicPlayButtonLayout.addLayout(self.musicControlsLayout)
+
+        self.previousMusicButton = qtw.QPushButton()
+        self.previousMusicButton.setFixedSize(40, 40)
+        self.previousMusicButton.setIcon(icons.icon("icons/previous.svg"))
+        self.previousMusicButton.setIconSize(QtCore.QSize(24, 24))
+        self.previousMusicButton.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
+        self.previousMusicButton.setToolTip("Previous")
+        self.musicControlsLayout.addWidget(self.previousMusicButton)
+
         self.musicPlayButton = qtw.QPushButton()
         self.musicPlayButton.setFixedSize(40, 40)
-        self.musicPlayButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "play.svg")))
+        self.musicPlayButton.setIcon(icons.icon("icons/play.svg"))
         self.musicPlayButton.setIconSize(QtCore.QSize(30, 30))
         self.musicPlayButton.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
-        self.musicPlayButtonLayout.addWidget(self.musicPlayButton)
+        self.musicControlsLayout.addWidget(self.musicPlayButton)
+
+        self.nextMusicButton = qtw.QPushButton()
+        self.nextMusicButton.setFixedSize(40, 40)
+        self.nextMusicButton.setIcon(icons.icon("icons/next.svg"))
+        self.nextMusicButton.setIconSize(QtCore.QSize(24, 24))
+        self.nextMusicButton.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
+        self.nextMusicButton.setToolTip("Next")
+        self.musicControlsLayout.addWidget(self.nextMusicButton)
         self.musicPlayButtonLayout.addSpacing(45)
 
         # music progress bar
@@ -277,6 +320,15 @@ class Window(qtw.QMainWindow):
         self.musicTotalTimeLabel.setFont(Fonts.bigTextFont)
         self.musicTimeLayout.addWidget(self.musicTotalTimeLabel)
 
+        # error message shown when the music can't be played
+        self.musicErrorLabel = qtw.QLabel()
+        self.musicErrorLabel.setFont(Fonts.textFont)
+        self.musicErrorLabel.setAlignment(QtCore.Qt.AlignCenter)
+        self.musicErrorLabel.setWordWrap(True)
+        self.musicErrorLabel.setStyleSheet("color: red;")
+        self.musicErrorLabel.hide()
+        self.playerPanelLayout.addWidget(self.musicErrorLabel)
+
         # separator for the buttons below
         self.playerPanelLayout.addWidget(Separator(QtCore.Qt.Horizontal))
 
@@ -307,116 +359,181 @@ class Window(qtw.QMainWindow):
 
     def setupInterface(self):
         """setup the main interface"""
-        if not configFile.exists():
-            # if first launch
-            log.info("no config file found, creating initial config")
-            self.config = {
-                "folders": [str(Path.home() / "Music")] if (Path.home() / "Music").exists() else [],
-                "last_folder": None,
-                "loop": "down",
-                "shuffle": False,
-                "sort": "+title",
-                "autoplay": True
-            }
-            self.saveConfig()
-        self.config = json.load(open(configFile))
-        log.debug("loaded the config file")
+        self.config = ConfigStore()  # written in the background, a short while after the changes
+        self.config.load()
+        logPipeline.setLevel(self.config.get("log_level"))  # ignored if set on the command line
         
         # show only necesary panels
-        self.musicsPanel.hide()
         self.playerPanel.hide()
-        log.debug("hided the musics and player panels")
+        log.debug("hided the player panel")
 
         # set the buttons
-        self.loopButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "loop" / f"{self.config['loop']}.svg")))
+        self.loopButton.setIcon(icons.icon(f"icons/loop/{self.config['loop']}.svg"))
         if self.config["loop"] == False:
             self.loopButton.setChecked(False)
         else:
             self.loopButton.setChecked(True)
         self.shuffleButton.setChecked(self.config["shuffle"])
         self.autoplayButton.setChecked(self.config["autoplay"])
-        sortIconPath = themeAssetsDir / "icons" / "sort" / ("up" if self.config["sort"][0] == "+" else "down") / f"{self.config['sort'][1:]}.svg"
-        self.sortButton.setIcon(QtGui.QIcon(str(sortIconPath)))
+        self.recursiveButton.setChecked(self.config.get("recursive", False))
+        sortIcon = "icons/sort/" + ("up" if self.config["sort"][0] == "+" else "down") + f"/{self.config['sort'][1:]}.svg"
+        self.sortButton.setIcon(icons.icon(sortIcon))
         log.debug("set the buttons")
 
         # useful variables
         self.folderWidgets = []
-        self.musicWidgets = []
 
         self.currentFolder = None
         self.currentMusic = None
         self.musicPlaying = False
-        self.musicObject = None
-        self.progressTimer = QtCore.QTimer()
+        self.player = PlayerEngine()
+        self.predictedMusic = None  # music to play after the current one, prepared in advance
+        self.progressTimer = QtCore.QTimer()  # refreshes the progress while playing, the end is notified by the player
+        self.progressTimer.setInterval(self.config.get("progress_refresh", progressRefreshInterval))
         self.progressTimer.timeout.connect(self.updateMusicProgress)
         self.loopMode = self.config["loop"]
         self.shuffleMode = self.config["shuffle"]
         self.autoplayMode = self.config["autoplay"]
         self.sortMode = self.config["sort"]
+        self.recursiveMode = self.config.get("recursive", False)  # also list the musics of the nested folders
         self.musicCurrentTime = 0
         self.musicTotalTime = 0
-        self.alreadyPlayed = []
+        self.playQueue = PlayQueue()  # shuffled order and musics queued by the user, kept between the sessions
+        self.playQueue.load()
+        self.metadataCache = MetadataCache()
+        self.metadataPool = QtCore.QThreadPool()  # worker threads fetching the metadata of the musics
+        self.metadataSignals = MetadataSignals()
+        self.metadataScan = None  # metadata scan of the current folder
+        self.folderCountPool = QtCore.QThreadPool()  # counts the musics of the folders, apart so it doesn't wait for the metadata
+        self.folderCountPool.setMaxThreadCount(2)
+        self.folderCountSignals = FolderCountSignals()
+        self.folderScanPool = QtCore.QThreadPool()  # lists the musics of the current folder
+        self.folderScanSignals = FolderScanSignals()
+        self.sortTimer = QtCore.QTimer()  # batches the sorts while the metadata is coming in
+        self.sortTimer.setSingleShot(True)
+        self.sortTimer.setInterval(100)
+        self.libraryWatcher = LibraryWatcher()  # applies the changes made to the folders outside of the app
+        metrics.enabled = metrics.enabled or self.config.get("instrumentation", False)
+        self.stallDetector = StallDetector()  # reports when the interface is blocked, only when instrumenting
+        self.debugOverlay = DebugOverlay(self)  # live timings, toggled with F12 when instrumenting
+        if metrics.enabled:
+            self.stallDetector.start()
+            log.info("instrumentation enabled")
+        self.libraryIndex = LibraryIndex()  # the musics of all the folders, for the search
+        self.libraryIndexBuild = 0  # number of the last index build, the results of the previous ones are ignored
+        self.libraryIndexSignals = LibraryIndexSignals()
+        self.libraryScan = None  # metadata scan of the indexed musics missing from the cache
+        self.libraryScanPool = QtCore.QThreadPool()  # reads them apart, so the current folder doesn't wait for the whole library
+        self.libraryScanPool.setMaxThreadCount(2)
+        self.searchQuery = ""  # the musics list shows the search results instead of the current folder when set
+        self.searchHits = 0  # number of musics matching the search, some of them may not be shown
+        self.searchTimer = QtCore.QTimer()  # waits for the typing to pause before searching
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(searchDelay)
+        self.tagWriter = TagWriteQueue()  # saves the tag edits in the background
         log.debug("set the variables")
 
         # connect signals
         self.addFolderButton.clicked.connect(self.addFolder)
+        self.recursiveButton.clicked.connect(self.recursiveState)
         self.globalPlayButton.clicked.connect(self.globalPlay)
         self.loopButton.clicked.connect(self.loopState)
         self.shuffleButton.clicked.connect(self.shuffleState)
         self.autoplayButton.clicked.connect(self.autoplayState)
         self.sortButton.clicked.connect(self.sortState)
         self.musicPlayButton.clicked.connect(self.musicPlay)
+        self.previousMusicButton.clicked.connect(self.previousMusic)
+        self.nextMusicButton.clicked.connect(self.skipMusic)
         self.musicProgressBar.clickedValue.connect(self.musicSliderPressed)
         self.setTitleButton.clicked.connect(self.setTitle)
         self.setAuthorButton.clicked.connect(self.setAuthor)
         self.setCoverButton.clicked.connect(self.setCover)
+        self.musicsList.wasSelected.connect(self.selectMusic)
+        self.musicsList.playNextRequested.connect(self.playNext)
+        self.musicsList.addToQueueRequested.connect(self.addToQueue)
+        self.player.musicLoaded.connect(self.musicStarted)
+        self.player.loadFailed.connect(self.musicLoadFailed)
+        self.player.musicEnded.connect(self.musicFinished)
+        self.metadataSignals.loaded.connect(self.musicMetadataLoaded)
+        self.folderCountSignals.counted.connect(self.folderCounted)
+        self.folderScanSignals.found.connect(self.musicsFound)
+        self.folderScanSignals.finished.connect(self.folderScanned)
+        self.libraryIndexSignals.built.connect(self.libraryIndexBuilt)
+        self.searchBox.textChanged.connect(lambda: self.searchTimer.start())
+        self.searchTimer.timeout.connect(lambda: self.searchMusics(self.searchBox.text()))
+        self.sortTimer.timeout.connect(self.sortMusics)
+        self.libraryWatcher.folderChanged.connect(self.folderContentChanged)
+        self.musicsList.selectionModel().selectionChanged.connect(self.updateEditButtons)
+        self.tagWriter.signals.written.connect(self.musicTagsWritten)
+        self.tagWriter.progress.connect(self.tagWriteProgress)
+        self.tagWriter.finished.connect(self.tagWriteFinished)
+        self.coverStore.coverResolved.connect(self.coverResolved)
         log.debug("connected signals")
+        log.info("interface setup done")
 
-        # load the folders
+    def loadLibrary(self):
+        """load the folders and reselect the last one, once the window is shown"""
         self.loadFolders()
+        self.showLibrary()
+        self.rebuildLibraryIndex()
 
-        # reselect the last folder
+        # reselect the last folder, its musics are shown from the cache while it is listed
         if self.config["last_folder"]:
             for widget in self.folderWidgets:
                 if widget.folderPath == Path(self.config["last_folder"]):
                     widget.setSelected(True)
                     break
-        log.info("interface setup done")
+        startupProfile.mark("loaded the folders")
     
     def saveConfig(self):
-        """save the config to the config file"""
-        with open(configFile, "w") as f:
-            json.dump(self.config, f, indent=4)
-        log.debug("saved the config file")
+        """schedule a save of the config"""
+        self.config.save()
     
     def loadFolders(self):
-        """load the folders from the config file into the interface"""
-        # remove the previous folders
-        for widget in self.folderWidgets:
-            widget.deleteLater()
-        
-        # load the folders
+        """sync the folder widgets with the config, only the new folders get a widget and are counted"""
+        previousWidgets = {widget.folderPath: widget for widget in self.folderWidgets}
         self.folderWidgets = []
-        for folder in self.config["folders"]:
-            self.folderWidgets.append(FolderWidget(Path(folder)))
-            self.folderWidgets[-1].wasSelected.connect(self.selectFolder)
-            self.folderWidgets[-1].wasRemoved.connect(self.removeFolder)
-            self.foldersListLayout.addWidget(self.folderWidgets[-1])
+        for folder in map(Path, self.config["folders"]):
+            widget = previousWidgets.pop(folder, None)
+            if widget is None:
+                widget = FolderWidget(folder)
+                widget.wasSelected.connect(self.selectFolder)
+                widget.wasRemoved.connect(self.removeFolder)
+                self.folderCountPool.start(FolderCountWorker(folder, self.folderCountSignals, self.metadataCache, self.recursiveMode))
+            self.folderWidgets.append(widget)
+            self.foldersListLayout.addWidget(widget)  # moves the kept widgets in the config order
+
+        # remove the widgets of the removed folders
+        for widget in previousWidgets.values():
+            widget.deleteLater()
+        self.libraryWatcher.setFolders(self.config["folders"])
         log.debug("loaded the folders")
+
+    def folderCounted(self, folder:Path, count:int):
+        """show the number of musics of a folder once counted"""
+        for widget in self.folderWidgets:
+            if widget.folderPath == folder and widget.nbElements is None:  # the watcher or the listing may have been faster
+                widget.setMusicCount(count)
     
     def selectFolder(self, folder:Path):
         """select a folder and show its musics"""
         if self.currentFolder == folder:
             return  # do nothing if the folder is already selected
-        # unselect the previous folder
+        # unselect the previous folder, the other rows aren't restyled
         for widget in self.folderWidgets:
-            if widget.folderPath != folder:
+            if widget.isSelected and widget.folderPath != folder:
                 widget.setSelected(False)
         self.currentFolder = folder
-        self.alreadyPlayed = []
+        self.playQueue.setSource(folder)
         self.currentMusic = None
         self.unloadMusic()
         self.musicPlaying = False
+        if self.searchQuery:  # leave the search results for the folder
+            self.searchQuery = ""
+            self.searchTimer.stop()
+            self.searchBox.blockSignals(True)
+            self.searchBox.clear()
+            self.searchBox.blockSignals(False)
         # update the interface with the new folder
         self.musicsPanel.show()
         self.playerPanel.hide()
@@ -433,69 +550,267 @@ class Window(qtw.QMainWindow):
                     self.config["folders"].pop(i)
             self.saveConfig()
             if self.currentFolder == folder:
+                self.cancelMetadataScan()
                 self.currentFolder = None
-                self.alreadyPlayed = []
+                self.playQueue.setSource(None)
                 self.currentMusic = None
                 self.unloadMusic()
                 self.musicPlaying = False
-                self.musicsPanel.hide()
                 self.playerPanel.hide()
                 self.config["last_folder"] = None
+                if not self.searchQuery:
+                    self.showLibrary()
             self.loadFolders()
-            # reselect the folder after the update
-            if self.currentFolder:
-                for widget in self.folderWidgets:
-                    if widget.folderPath == Path(self.currentFolder):
-                        widget.setSelected(True)
-                        break
-            log.info(f"removed the folder {folder}")
+            self.rebuildLibraryIndex()
+            log.info("removed the folder %s", folder)
     
+    @metrics.timed("loadMusics")
     def loadMusics(self):
-        """list and load the musics from the selected folder"""
-        # remove the previous musics
-        for widget in self.musicWidgets:
-            widget.deleteLater()
-        self.musicWidgets = []
-
-        # list the musics
-        musics = []
-        for dir in glob.glob(str(self.currentFolder/"*")):
-            if Path(dir).is_file() and Path(dir).suffix in supportedAudioFormats:
-                musics.append(Path(dir))
-        log.debug(f"listed the musics for the folder {self.currentFolder}")
-
-        # update the folder name and number of elements
+        """list the musics from the selected folder in the background, they are added to the list as they are found"""
+        # stop listing and fetching the metadata of the previous folder
+        self.cancelMetadataScan()
+        self.libraryWatcher.setCurrentFolder(self.currentFolder, self.recursiveMode)
+
+        # show the musics cached from the previous sessions right away, the listing then corrects the list
+        cached = self.metadataCache.getFolder(self.currentFolder, self.recursiveMode)
+        records = []
+        for music, (state, metadata) in cached.items():
+            records.append(MusicRecord(music))
+            records[-1].setMetadata(metadata)
         self.folderNameLabel.setText(self.currentFolder.name)
-        self.folderElementsLabel.setText(f"{len(musics)} Musics")
+        self.folderElementsLabel.setText(f"{len(records)} Musics" if records else "… Musics")
+        self.musicsModel.setRecords(records)
+        self.playQueue.addMusics([record.musicPath for record in records])
+        self.sortMusics()
+        self.musicsList.scrollToTop()
+
+        # the listing and the metadata fetching share the same scan, so both are cancelled together
+        self.metadataScan = MetadataScan(self.currentFolder, 0)
+        self.metadataScan.knownStates = {music: state for music, (state, metadata) in cached.items()}
+        self.folderScanPool.start(FolderScanWorker(self.metadataScan, self.folderScanSignals, self.recursiveMode))
+        log.debug("started listing the musics for the folder %s", self.currentFolder)
+
+    def musicsFound(self, scan:MetadataScan, folder:Path, musicStates:dict):
+        """add the musics found in a folder to the list and fetch their metadata"""
+        self.libraryIndex.addMusics(list(musicStates))
+        if scan is not self.metadataScan:
+            return  # result of a cancelled scan
+        self.libraryWatcher.setSnapshot(folder, musicStates)
+        if not musicStates:
+            return  # a folder without musics, only listed to be watched
+        scan.listed.update(musicStates)
+        musics = list(musicStates)
+        self.musicsModel.addMusics(musics)
+        self.playQueue.addMusics(musics)
+        self.folderElementsLabel.setText(f"{len(self.musicsModel.records)} Musics")
+        if self.currentMusic in musicStates:  # still playing, like after clearing a search
+            self.musicsList.selectMusic(self.currentMusic)
+        if not self.sortTimer.isActive():
+            self.sortTimer.start()
+        self.fetchMetadata([music for music, state in musicStates.items() if scan.knownStates.get(music) != state])  # the others are up to date
+
+    def folderScanned(self, scan:MetadataScan, folders:list):
+        """finish listing the current folder and watch its subfolders"""
+        if scan is not self.metadataScan:
+            return
+        deleted = [record.musicPath for record in self.musicsModel.records if record.musicPath not in scan.listed]
+        self.musicsModel.removeMusics(deleted)  # still in the cache but not on the disk anymore
+        self.playQueue.keepMusics(scan.listed)  # like the search results added by a previous version
+        count = len(self.musicsModel.records)
+        self.folderElementsLabel.setText(f"{count} Musics")
+        for widget in self.folderWidgets:
+            if widget.folderPath == self.currentFolder:
+                widget.setMusicCount(count)
+        if self.recursiveMode:
+            self.libraryWatcher.setSubfolders([folder for folder in folders if folder != self.currentFolder])
+        startupProfile.mark("listed the last folder")
+        log.debug("listed the %d musics of %d folders for the folder %s", count, len(folders), self.currentFolder)
+
+    def showLibrary(self):
+        """show an empty list with the number of indexed musics while no folder is selected"""
+        self.cancelMetadataScan()
+        self.libraryWatcher.setCurrentFolder(None)
+        self.musicsModel.setMusics([])
+        self.folderNameLabel.setText("Library")
+        self.folderElementsLabel.setText(f"{len(self.libraryIndex)} Musics")
+
+    def rebuildLibraryIndex(self):
+        """index the musics of all the folders in the background"""
+        self.libraryIndexBuild += 1
+        self.folderScanPool.start(LibraryIndexWorker(self.libraryIndexBuild, list(self.config["folders"]), self.libraryIndexSignals, self.metadataCache, self.recursiveMode))
+
+    def libraryIndexBuilt(self, build:int, index:LibraryIndex):
+        """use the new library index, and search again with it"""
+        if build != self.libraryIndexBuild:
+            return  # the folders changed since this build started
+        self.libraryIndex = index
+        startupProfile.mark("indexed the library")
+        self.fillLibraryIndex()
+        if self.searchQuery:
+            self.searchMusics(self.searchQuery, refresh=True)
+        elif self.currentFolder is None:
+            self.folderElementsLabel.setText(f"{len(self.libraryIndex)} Musics")
+
+    def fillLibraryIndex(self):
+        """read the metadata of the indexed musics missing from the cache, like the ones of the folders never opened"""
+        if self.libraryScan:
+            self.libraryScan.cancel()
+            self.libraryScanPool.clear()
+            self.libraryScan = None
+        missing = [record.musicPath for record in self.libraryIndex.records.values() if not record.metadataLoaded]
+        self.indexMetadata(missing)
+
+    def indexMetadata(self, musics:list):
+        """read the metadata of some musics in the background only to index them"""
+        if not musics:
+            return
+        if self.libraryScan is None:
+            self.libraryScan = MetadataScan(None, 0)  # not the scan of a folder
+        self.libraryScan.total += len(musics)
+        for music in musics:
+            self.libraryScanPool.start(MetadataWorker(self.libraryScan, music, self.metadataSignals, self.metadataCache))
+        log.info("reading the metadata of %d musics for the library index", len(musics))
+
+    def libraryMetadataLoaded(self, scan:MetadataScan, music:Path, metadata:MusicMetadata):
+        """index the metadata of a music read in the background, and search again once all of them are indexed"""
+        self.libraryIndex.setMetadata(music, metadata)
+        scan.done += 1
+        if self.searchQuery:
+            self.updateSearchLabel()
+        if scan.done < scan.total:
+            return
+        self.libraryScan = None
+        log.info("indexed the metadata of %d musics", scan.total)
+        if self.searchQuery:
+            self.searchMusics(self.searchQuery, refresh=True)  # their titles and authors may match now
+
+    def updateSearchLabel(self):
+        """show the number of search results, and that some musics can't be found by title yet"""
+        text = f"{searchResultLimit} of {self.searchHits} Musics" if self.searchHits > searchResultLimit else f"{self.searchHits} Musics"
+        if self.libraryScan:
+            text += f", indexing {self.libraryScan.done}/{self.libraryScan.total}"
+        self.folderElementsLabel.setText(text)
+
+    @metrics.timed("searchMusics")
+    def searchMusics(self, query:str, refresh:bool=False):
+        """show the musics of all the folders matching the query, or the current folder back when it is cleared"""
+        query = query.strip()
+        if query == self.searchQuery and not refresh:
+            return
+        self.searchQuery = query
+        if not query:
+            self.playQueue.endSearch()
+            if self.currentFolder:
+                self.loadMusics()
+            else:
+                self.showLibrary()
+            return
 
-        # load the music widgets
+        # the hits are sorted once and only the first ones are shown, so a search costs about the same in any library
+        self.cancelMetadataScan()
+        records = self.libraryIndex.search(query)
+        sortMusicRecords(records, self.sortMode)
+        self.musicsModel.setRecords(records[:searchResultLimit])
+        self.playQueue.setSearchResults([record.musicPath for record in self.musicsModel.records])  # the folder's permutation is kept
+        self.musicsList.scrollToTop()
+        self.folderNameLabel.setText("Search Results")
+        self.searchHits = len(records)
+        self.updateSearchLabel()
+        if self.player.loaded and not self.shuffleMode:
+            self.predictNextMusic()  # the next music in the list may have changed
+        log.debug("found %d musics for the search %r", len(records), query)
+
+    @metrics.timed("fetchMetadata")
+    def fetchMetadata(self, musics:list):
+        """fetch the metadata of some musics of the current folder in the worker threads"""
+        if self.metadataScan is None:
+            self.metadataScan = MetadataScan(self.currentFolder, 0)
+        self.metadataScan.total += len(musics)
         for music in musics:
-            self.musicWidgets.append(MusicWidget(music))
-            self.musicWidgets[-1].wasSelected.connect(self.selectMusic)
-        
-        # sort the musics by the selected mode
-        reverse = True if self.sortMode[0] == "-" else False
-        self.musicWidgets.sort(key=lambda x: x.title.lower().strip(), reverse=(reverse if self.sortMode[1:] == "title" else False))  # always do a first sort by title
-        if self.sortMode[1:] == "author":
-            self.musicWidgets.sort(key=lambda x: x.author.lower().strip() if x.author else (chr(0) if reverse else chr(0x10ffff)), reverse=reverse)
-        elif self.sortMode[1:] == "time":
-            self.musicWidgets.sort(key=lambda x: x.time, reverse=reverse)
-        log.debug(f"sorted the musics for the folder {self.currentFolder}")
-
-        # add the music widgets to the interface
-        for widget in self.musicWidgets:
-            self.musicsListLayout.addWidget(widget)
-        log.debug(f"loaded the musics for the folder {self.currentFolder}")
-    
+            self.metadataPool.start(MetadataWorker(self.metadataScan, music, self.metadataSignals, self.metadataCache))
+        log.debug("started fetching the metadata of %d musics", len(musics))
+
+    def folderContentChanged(self, folder:Path, added:list, removed:list, modified:list, count:int):
+        """apply the changes made to a folder outside of the app, without reloading the unchanged musics"""
+        for music in removed:
+            self.metadataCache.invalidate(music)
+        self.libraryIndex.removeMusics(removed)
+        self.libraryIndex.addMusics(added)
+        if self.metadataScan:
+            self.metadataScan.listed.update(added)  # so they aren't dropped at the end of the listing
+        if self.searchQuery or (folder != self.currentFolder and folder not in self.libraryWatcher.subfolders):
+            self.indexMetadata(added + modified)  # not read for the musics list
+        if self.searchQuery:
+            return  # the list shows the search results, the folder is listed again when the search is cleared
+        if folder != self.currentFolder and folder not in self.libraryWatcher.subfolders:
+            for widget in self.folderWidgets:
+                if widget.folderPath != folder:
+                    continue
+                if self.recursiveMode:  # the count of the folder itself doesn't include its subfolders
+                    widget.setMusicCount(None)
+                    self.folderCountPool.start(FolderCountWorker(folder, self.folderCountSignals, self.metadataCache, True))
+                else:
+                    widget.setMusicCount(count)
+            return
+
+        if self.currentMusic in removed:
+            self.currentMusic = None
+            self.unloadMusic()
+            self.playerPanel.hide()
+        self.musicsModel.removeMusics(removed)
+        self.musicsModel.addMusics(added)
+        self.playQueue.addMusics(added)
+        self.sortMusics()
+        count = len(self.musicsModel.records)  # the changed folder may be a subfolder of the current one
+        self.folderElementsLabel.setText(f"{count} Musics")
+        for widget in self.folderWidgets:
+            if widget.folderPath == self.currentFolder:
+                widget.setMusicCount(count)
+        self.fetchMetadata(added + modified)  # the modified ones are read again since their cache entry is outdated
+        log.info("updated the musics of %s: %d added, %d removed, %d modified", folder, len(added), len(removed), len(modified))
+
+    def cancelMetadataScan(self):
+        """cancel the metadata scan in progress, if any"""
+        if self.metadataScan:
+            self.metadataScan.cancel()
+            self.metadataPool.clear()  # drop the jobs that didn't start yet
+            log.debug("cancelled the metadata scan of %s at %d/%d", self.metadataScan.folderPath, self.metadataScan.done, self.metadataScan.total)
+            self.metadataScan = None
+        self.sortTimer.stop()
+
+    def musicMetadataLoaded(self, scan:MetadataScan, music:Path, metadata:MusicMetadata):
+        """update the row of a music when its metadata was fetched"""
+        if scan is self.libraryScan:
+            self.libraryMetadataLoaded(scan, music, metadata)
+            return
+        if scan.folderPath is None:
+            return  # result of a library scan replaced since, the music may not be indexed anymore
+        self.libraryIndex.setMetadata(music, metadata)
+        if scan is not self.metadataScan:
+            return  # result of a cancelled scan
+        scan.done += 1
+        self.musicsModel.setMetadata(music, metadata)
+        if music == self.currentMusic:
+            self.updatePlayerInfos(self.musicsModel.record(music))
+        if not self.sortTimer.isActive():
+            self.sortTimer.start()
+        if scan.done == scan.total:
+            log.debug("fetched the metadata of the %d musics of %s", scan.total, scan.folderPath)
+
+    @metrics.timed("sortMusics")
+    def sortMusics(self):
+        """sort the musics list by the selected mode"""
+        self.musicsModel.sortRecords(self.sortMode)
+        if self.player.loaded and not self.shuffleMode:
+            self.predictNextMusic()  # the next music in the list may have changed
+        log.debug("sorted the musics for the folder %s", self.currentFolder)
+
     def selectMusic(self, music:Path, auto:bool=False):
         """select a music and show its details and player panel"""
         if self.currentMusic == music:
             return  # do nothing if the music is already selected
-        # unselect the previous music
-        for widget in self.musicWidgets:
-            if widget.musicPath != music:
-                widget.setSelected(False)
         self.currentMusic = music
+        self.playQueue.setCurrent(music)
         self.unloadMusic()
         self.musicPlaying = False
         # update the interface with the new music
@@ -503,51 +818,93 @@ class Window(qtw.QMainWindow):
         self.updateMusicPlayer(music)
         if self.autoplayMode and not auto:
             self.musicPlay()
-        log.debug(f"selected the music {music}")
+        log.debug("selected the music %s", music)
     
+    @metrics.timed("updateMusicPlayer")
     def updateMusicPlayer(self, music:Path):
-        """update the player panel with the selected music"""
-        # get the metadata from the music widget
-        for widget in self.musicWidgets:
-            if widget.musicPath == music:
-                title = widget.title
-                artist = widget.author
-                cover = widget.coverImage
-                if cover:
-                    cover = cover.image_data
-                break
-        media = vlc.Media(str(music))
-        media.parse()
-        duration = int(media.get_duration() / 1000)
-
-        # load the music
-        self.musicObject = vlc.MediaPlayer(str(music))
-        # start playing briefly to load the media
-        self.musicObject.audio_set_volume(0)
-        self.musicObject.play()
-        while not self.musicObject.get_state() == vlc.State.Playing:
-            pass
-        self.musicObject.pause()
-        self.musicObject.set_time(0)
-        self.musicObject.audio_set_volume(100)
-        log.debug(f"loaded the music")
+        """update the player panel with the selected music and start loading it"""
+        record = self.musicsModel.record(music)
+        duration = record.time if record else 0  # refined with the real length once the music is loaded
+        self.player.load(music)  # musicStarted is called when it's ready
         
         # update the interface
-        self.musicTitle.setText(title)
-        if artist:
-            self.musicArtist.setText(artist)
-        else:
-            self.musicArtist.setText("")
-        if cover:
-            self.musicCover.setPixmap(QtGui.QPixmap.fromImage(QtGui.QImage.fromData(cover)))
-        else:
-            self.musicCover.setVector(themeAssetsDir / "icons" / "cover.svg")
+        self.musicErrorLabel.hide()
+        if record:
+            self.updatePlayerInfos(record)
         self.musicProgressBar.setRange(0, duration)
         self.musicProgressBar.setValue(0)
+        self.musicCurrentTime = 0
         self.musicCurrentTimeLabel.setText("0:00")
         self.musicTotalTimeLabel.setText(f"{duration//60}:{duration%60:02}")
-        log.debug(f"updated the player panel for the music {music}")
-    
+        log.debug("updated the player panel for the music %s", music)
+
+    def musicStarted(self, music:Path):
+        """update the interface once the player loaded the music and prepare the next one"""
+        # the real length may differ from the one in the metadata
+        duration = int(self.player.length() / 1000)
+        if duration > 0:
+            self.musicProgressBar.setRange(0, duration)
+            self.musicTotalTimeLabel.setText(f"{duration//60}:{duration%60:02}")
+        self.predictNextMusic()
+
+    def musicLoadFailed(self, music:Path, reason:str):
+        """show why the music couldn't be played"""
+        if self.musicPlaying:
+            self.musicPlay()
+        self.musicErrorLabel.setText(f"Couldn't play this music: {reason}")
+        self.musicErrorLabel.show()
+
+    def seekMusic(self, time:int):
+        """jump to a time in ms, or do it once the music is loaded"""
+        self.player.seek(time)
+
+    def isListed(self, music:Path) -> bool:
+        """return whether a music is in the musics list, so it can be played"""
+        return music in self.musicsModel.rowByPath
+
+    def nextMusic(self, skip:bool=False) -> Path:
+        """return the music to play after the current one according to the queue, loop and shuffle modes, or None to stop"""
+        loopMode = self.loopMode
+        if skip and loopMode in ("none", "one"):
+            loopMode = "down"  # the next button always goes to another music
+        if loopMode == "one":
+            return self.currentMusic
+        queued = self.playQueue.queued(self.isListed)  # the musics queued by the user come first
+        if queued is not None:
+            return queued
+        if loopMode not in ("down", "all") or self.currentMusic is None:
+            return None
+        records = self.musicsModel.records
+        if self.shuffleMode:  # the next music of the shuffled order, down stops once everything was played
+            return self.playQueue.shuffled(self.isListed, loopMode == "all")
+        # the next music, all restarts at the beginning when reached the end
+        i = self.musicsModel.rowByPath.get(self.currentMusic)
+        if i is None:
+            return None
+        if i == len(records) - 1:
+            return records[0].musicPath if loopMode == "all" else None
+        return records[i+1].musicPath
+
+    def predictNextMusic(self):
+        """choose the music that will play after the current one and let the player prepare it"""
+        self.predictedMusic = (self.currentMusic, self.nextMusic())  # a random choice must stay the same until the end
+        self.player.preload(self.predictedMusic[1])
+
+    def updatePlayerInfos(self, record:MusicRecord, withCover:bool=True):
+        """show the title, author and cover of a music in the player panel"""
+        self.musicTitle.setText(record.title)
+        if record.author:
+            self.musicArtist.setText(record.author)
+        else:
+            self.musicArtist.setText("")
+        if not withCover:
+            return
+        cover = self.coverStore.cover(record.musicPath, record.coverKey) if record.hasCover else None  # shared by the musics with the same cover
+        if cover:
+            self.musicCover.setPixmap(cover)
+        else:
+            self.musicCover.setVector("icons/cover.svg")
+
     def addFolder(self):
         """add a folder to the folders list"""
         # open a dialog to select a folder
@@ -558,13 +915,26 @@ class Window(qtw.QMainWindow):
         self.config["folders"].append(folder)
         self.saveConfig()
         self.loadFolders()
-        # reselect the folder after the update
-        if self.currentFolder:
-            for widget in self.folderWidgets:
-                if widget.folderPath == Path(self.currentFolder):
-                    widget.setSelected(True)
-                    break
-        log.info(f"added the folder {folder}")
+        self.rebuildLibraryIndex()
+        log.info("added the folder %s", folder)
+
+    def recursiveState(self):
+        """include or not the musics of the subfolders, then count and list the folders again"""
+        self.recursiveMode = self.recursiveButton.isChecked()
+        self.config["recursive"] = self.recursiveMode
+        self.saveConfig()
+        for widget in self.folderWidgets:
+            widget.setMusicCount(None)
+            self.folderCountPool.start(FolderCountWorker(widget.folderPath, self.folderCountSignals, self.metadataCache, self.recursiveMode))
+        if self.currentFolder and not self.searchQuery:
+            self.playQueue.clear()
+            self.currentMusic = None
+            self.unloadMusic()
+            self.musicPlaying = False
+            self.playerPanel.hide()
+            self.loadMusics()
+        self.rebuildLibraryIndex()
+        log.info("set the recursive scan to %s", self.recursiveMode)
 
     def loopState(self):
         """change the loop state"""
@@ -576,10 +946,12 @@ class Window(qtw.QMainWindow):
             self.loopMode = "all"  # play everything on repeat, or play a random music on repeat if shuffle is on
         else:
             self.loopMode = "none"  # play until the end of the music then stop
-        self.loopButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "loop" / f"{self.loopMode}.svg")))
+        self.loopButton.setIcon(icons.icon(f"icons/loop/{self.loopMode}.svg"))
         self.loopButton.setChecked(self.loopMode != "none")
         self.config["loop"] = self.loopMode
         self.saveConfig()
+        if self.player.loaded:
+            self.predictNextMusic()
 
     def shuffleState(self):
         """change the shuffle state"""
@@ -593,6 +965,8 @@ class Window(qtw.QMainWindow):
             self.shuffleButton.setChecked(True)
             self.config["shuffle"] = True
             self.saveConfig()
+        if self.player.loaded:
+            self.predictNextMusic()
     
     def autoplayState(self):
         """change the autoplay state"""
@@ -620,26 +994,31 @@ class Window(qtw.QMainWindow):
                 self.sortMode = "+title"
         self.config["sort"] = self.sortMode
         self.saveConfig()
-        sortIconPath = themeAssetsDir / "icons" / "sort" / ("up" if self.sortMode[0] == "+" else "down") / f"{self.sortMode[1:]}.svg"
-        self.sortButton.setIcon(QtGui.QIcon(str(sortIconPath)))
-        self.loadMusics()
-        log.info(f"changed the sort mode to {self.sortMode}")
+        sortIcon = "icons/sort/" + ("up" if self.sortMode[0] == "+" else "down") + f"/{self.sortMode[1:]}.svg"
+        self.sortButton.setIcon(icons.icon(sortIcon))
+        if self.searchQuery:
+            self.searchMusics(self.searchQuery, refresh=True)  # the first results in the new order may not be shown yet
+        else:
+            self.sortMusics()  # reorder the loaded musics, nothing is read again
+        log.info("changed the sort mode to %s", self.sortMode)
 
     def musicPlay(self):
         """play or pause the music"""
         if self.musicPlaying:
             self.musicPlaying = False
-            self.musicPlayButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "play.svg")))
-            self.globalPlayButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "play.svg")))
-            self.musicObject.pause()
+            self.musicPlayButton.setIcon(icons.icon("icons/play.svg"))
+            self.globalPlayButton.setIcon(icons.icon("icons/play.svg"))
+            self.player.pause()
             self.progressTimer.stop()
             log.info("paused the music")
         else:
+            if self.player.currentMusic is None:
+                return  # the music failed to load
             self.musicPlaying = True
-            self.musicPlayButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "pause.svg")))
-            self.globalPlayButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "pause.svg")))
-            self.musicObject.play()
-            self.progressTimer.start(10)
+            self.musicPlayButton.setIcon(icons.icon("icons/pause.svg"))
+            self.globalPlayButton.setIcon(icons.icon("icons/pause.svg"))
+            self.player.play()
+            self.progressTimer.start()
             log.info("played the music")
     
     def globalPlay(self):
@@ -647,22 +1026,66 @@ class Window(qtw.QMainWindow):
         if self.playerPanel.isVisible():  # act as the basic play/pause button if the player panel is visible
             self.musicPlay()
         else:  # play the first or a random music if the player panel is hidden
-            if self.shuffleMode:
-                music = rd.choice(self.musicWidgets)
-            else:
-                music = self.musicWidgets[0]
-            self.selectMusic(music.musicPath, auto=True)
-            music.setSelected(True)
-            self.musicPlay()
+            if not self.musicsModel.records:
+                return  # nothing to play in this folder
+            music = self.playQueue.queued(self.isListed)
+            if music is None and self.shuffleMode:
+                music = self.playQueue.shuffled(self.isListed, True)
+            if music is None:
+                music = self.musicsModel.records[0].musicPath
+            self.playMusic(music)
+
+    def playMusic(self, music:Path):
+        """select a music of the list and start playing it"""
+        self.selectMusic(music, auto=True)
+        self.musicsList.selectMusic(music)
+        self.musicPlay()
+
+    def previousMusic(self):
+        """go back to the previously played music, or to the beginning of the music when it played for a while"""
+        music = None
+        if self.musicCurrentTime < previousRestartTime:
+            music = self.playQueue.previous(self.isListed)
+        if music is None:
+            self.musicSliderPressed(0)
+        elif self.musicPlaying or self.autoplayMode:
+            self.playMusic(music)
+        else:
+            self.selectMusic(music, auto=True)
+            self.musicsList.selectMusic(music)
+
+    def skipMusic(self):
+        """go to the next music without waiting for the end of the current one"""
+        music = self.nextMusic(skip=True)
+        if music is None:
+            return  # nothing left to play
+        if self.musicPlaying or self.autoplayMode:
+            self.playMusic(music)
+        else:
+            self.selectMusic(music, auto=True)
+            self.musicsList.selectMusic(music)
+
+    def playNext(self, musics:list):
+        """queue some musics to play right after the current one"""
+        self.playQueue.playNext(musics)
+        self.statusBar().showMessage(f"{len(musics)} musics will play next" if len(musics) > 1 else "The music will play next", 3000)
+        if self.player.loaded:
+            self.predictNextMusic()
+
+    def addToQueue(self, musics:list):
+        """queue some musics to play after the ones already queued"""
+        self.playQueue.addToQueue(musics)
+        self.statusBar().showMessage(f"Added {len(musics)} musics to the queue" if len(musics) > 1 else "Added the music to the queue", 3000)
+        if self.player.loaded:
+            self.predictNextMusic()
     
     def unloadMusic(self):
         """unload the music from the player"""
         # stop playing if needed
         if self.musicPlaying:
             self.musicPlay()
-        if self.musicObject:
-            self.musicObject.release()
-            self.musicObject = None
+        self.player.unload()
+        self.predictedMusic = None
 
     def musicSliderPressed(self, value:float):
         """change the music time"""
@@ -672,57 +1095,41 @@ class Window(qtw.QMainWindow):
         self.musicCurrentTimeLabel.setText(f"{value//60}:{value%60:02}")
         
         # change the music time
-        if self.musicObject:
-            self.musicObject.set_time(value * 1000)
-        log.info(f"changed the music time to {value}")
+        self.seekMusic(value * 1000)
+        log.debug("changed the music time to %s", value)
     
+    @metrics.timed("updateMusicProgress")
     def updateMusicProgress(self):
-        """update the music progress bar and handles the end of the music"""
-        # update the progress bar
-        if self.musicObject:
-            currentTime = int(self.musicObject.get_time() / 1000)
-            self.musicProgressBar.setValue(currentTime)
-            self.musicCurrentTimeLabel.setText(f"{currentTime//60}:{currentTime%60:02}")
-        
-        # handle the end of the music
-        if self.musicObject.get_state() == vlc.State.Ended:
-            self.musicPlay()  # stop the music
-
-            if self.loopMode == "none":  # simply stop the music
-                self.updateMusicPlayer(self.currentMusic)
-            
-            elif self.loopMode == "one":  # restart the music
-                self.updateMusicPlayer(self.currentMusic)
-                self.musicPlay()
-            
-            elif self.loopMode == "down" or self.loopMode == "all":  # play the next music or a random one, all restarts at the beginning when reached the end
-                if self.shuffleMode:  # play a random music
-                    self.alreadyPlayed.append(self.currentMusic)
-                    candidates = [music for music in self.musicWidgets if ((music.musicPath not in self.alreadyPlayed) or (self.loopMode == "all")) and music.musicPath != self.currentMusic]  # if down, choose candidates, else take the whole list without the current music
-                    if not candidates:  # stop there is there's no more music to play
-                        self.updateMusicPlayer(self.currentMusic)
-                        self.alreadyPlayed = []
-                    else:
-                        music = rd.choice(candidates)
-                        self.selectMusic(music.musicPath, auto=True)
-                        music.setSelected(True)
-                        self.musicPlay()
-
-                else:  # play the next music
-                    for i in range(len(self.musicWidgets)):
-                        if self.musicWidgets[i].musicPath == self.currentMusic:
-                            if i == len(self.musicWidgets) - 1:
-                                if self.loopMode == "all":  # restart if reached the end
-                                    self.selectMusic(self.musicWidgets[0].musicPath, auto=True)
-                                    self.musicWidgets[0].setSelected(True)
-                                    self.musicPlay()
-                                else:
-                                    self.updateMusicPlayer(self.musicWidgets[i].musicPath)  # stop if reached the end
-                            else:
-                                self.selectMusic(self.musicWidgets[i+1].musicPath, auto=True)
-                                self.musicWidgets[i+1].setSelected(True)
-                                self.musicPlay()
-                            break
+        """update the music progress bar and time label when the displayed second changes"""
+        if not self.player.loaded:
+            return  # the player is still loading the music
+        currentTime = int(self.player.position() / 1000)
+        if currentTime == self.musicCurrentTime:
+            return  # nothing visible changed
+        self.musicCurrentTime = currentTime
+        self.musicProgressBar.setValue(currentTime)
+        self.musicCurrentTimeLabel.setText(f"{currentTime//60}:{currentTime%60:02}")
+
+    def musicFinished(self, music:Path):
+        """handle the end of the music according to the loop and shuffle modes"""
+        if music != self.currentMusic:
+            return
+        self.musicPlay()  # stop the music
+        if self.predictedMusic and self.predictedMusic[0] == self.currentMusic and (self.predictedMusic[1] is None or self.predictedMusic[1] in self.musicsModel.rowByPath):
+            music = self.predictedMusic[1]  # already prepared by the player
+        else:
+            music = self.nextMusic()
+        self.predictedMusic = None
+
+        if music is None:  # simply stop the music
+            self.updateMusicPlayer(self.currentMusic)
+            if self.shuffleMode:
+                self.playQueue.restart()  # the next round plays everything again
+        elif music == self.currentMusic:  # restart the music
+            self.updateMusicPlayer(self.currentMusic)
+            self.musicPlay()
+        else:  # play the next music
+            self.playMusic(music)
 
     def setTitle(self):
         """set the music title"""
@@ -730,35 +1137,13 @@ class Window(qtw.QMainWindow):
         title, ok = qtw.QInputDialog.getText(self, "Set Title", "Enter the new title:")
         if not ok or not title:
             return
-        musicPath = self.currentMusic
-
-        # change the metadata
-        audioFile = eyed3.load(self.currentMusic)
-        if audioFile.tag is None:
-            audioFile.initTag()
-        audioFile.tag.title = title
-        audioFile.tag.save()
-        # save some infos on the music
-        wasPlaying = self.musicPlaying
-        if self.musicPlaying:
-            self.musicPlay()
-            time = self.musicObject.get_time()
-        # reload the musics
-        self.loadMusics()
-        self.updateMusicPlayer(musicPath)
-        # reenable the music
-        if wasPlaying:
-            self.musicPlay()
-            self.musicObject.set_time(time)
-        # reselect the music after the update
-        for widget in self.musicWidgets:
-            if widget.musicPath == musicPath:
-                widget.setSelected(True)
-                break
-        log.info(f"changed the title of the music to {title}")
+
+        # change the metadata in the background, titles are per music so the selection isn't used
+        self.tagWriter.enqueue([self.currentMusic], {"title": title})
+        log.info("changing the title of the music to %s", title)
 
     def setAuthor(self):
-        """set the music author"""
+        """set the author of the selected musics"""
         # ask for the new author
         author, ok = qtw.QInputDialog.getText(self, "Set Author", "Enter the new author:")
         if not ok or not author:
@@ -768,35 +1153,14 @@ class Window(qtw.QMainWindow):
             return
         if not ok or not author:
             return
-        musicPath = self.currentMusic
-
-        # change the metadata
-        audioFile = eyed3.load(self.currentMusic)
-        if audioFile.tag is None:
-            audioFile.initTag()
-        audioFile.tag.artist = author
-        audioFile.tag.save()
-         # save some infos on the music
-        wasPlaying = self.musicPlaying
-        if self.musicPlaying:
-            self.musicPlay()
-            time = self.musicObject.get_time()
-        # reload the musics
-        self.loadMusics()
-        self.updateMusicPlayer(musicPath)
-        # reenable the music
-        if wasPlaying:
-            self.musicPlay()
-            self.musicObject.set_time(time)
-        # reselect the music after the update
-        for widget in self.musicWidgets:
-            if widget.musicPath == musicPath:
-                widget.setSelected(True)
-                break
-        log.info(f"changed the author of the music to {author}")
+        musics = self.editedMusics()
+
+        # change the metadata in the background
+        self.tagWriter.enqueue(musics, {"author": author})
+        log.info("changing the author of %d musics to %s", len(musics), author)
 
     def setCover(self):
-        """set the music cover"""
+        """set the cover of the selected musics"""
         # open a dialog to select an image
         cover, _ = qtw.QFileDialog.getOpenFileName(self, "Select Cover", str(Path.home()), "Images (*.png *.jpg *.jpeg *.gif *.webp *.tiff)")
         if not cover:
@@ -805,38 +1169,106 @@ class Window(qtw.QMainWindow):
         if not cover.exists():
             qtw.QMessageBox.critical(self, "Error", "The selected file doesn't exist")
             return
-        musicPath = self.currentMusic
+        musics = self.editedMusics()
 
-        # change the metadata
-        audioFile = eyed3.load(self.currentMusic)
-        if audioFile.tag is None:
-            audioFile.initTag()
+        # change the metadata in the background
         mimetype = f"image/{'jpeg' if cover.suffix[1:] == 'jpg' else cover.suffix[1:]}"
-        audioFile.tag.images.set(eyed3.id3.frames.ImageFrame.FRONT_COVER, open(cover, "rb").read(), mimetype)
-        audioFile.tag.save()
-         # save some infos on the music
-        wasPlaying = self.musicPlaying
-        if self.musicPlaying:
-            self.musicPlay()
-            time = self.musicObject.get_time()
-        # reload the musics
-        self.loadMusics()
-        self.updateMusicPlayer(musicPath)
-        # reenable the music
-        if wasPlaying:
-            self.musicPlay()
-            self.musicObject.set_time(time)
-        # reselect the music after the update
-        for widget in self.musicWidgets:
-            if widget.musicPath == musicPath:
-                widget.setSelected(True)
-                break
+        imageData = open(cover, "rb").read()
+        self.tagWriter.enqueue(musics, {"cover": (imageData, mimetype)})
+        log.info("changing the cover of %d musics to %s", len(musics), cover)
+
+    def editedMusics(self) -> list:
+        """return the musics affected by the author and cover edits, the selection or else the current music"""
+        return self.musicsList.selectedMusics() or [self.currentMusic]
+
+    def updateEditButtons(self):
+        """show on the edit buttons how many musics they will change"""
+        count = len(self.musicsList.selectedMusics())
+        suffix = f" ({count} musics)" if count > 1 else ""
+        self.setAuthorButton.setText(f"Set Author{suffix}")
+        self.setCoverButton.setText(f"Set Cover{suffix}")
+
+    def musicTagsWritten(self, musicPath:Path, values:dict, stat:object):
+        """apply the tags saved in the background to the cache and the list"""
+        self.libraryWatcher.updateSnapshot(musicPath, stat)  # our own write isn't an external change
+        self.updateMusicRecord(musicPath, stat, values)
+
+    def tagWriteProgress(self, done:int, total:int):
+        """show the progress of the tag writes"""
+        if done < total:
+            self.statusBar().showMessage(f"Saving the tags... {done}/{total}")
+
+    def tagWriteFinished(self, written:int, errors:list):
+        """report the result of the tag writes"""
+        if not errors:
+            self.statusBar().showMessage(f"Saved the tags of {written} musics", 5000)
+            return
+        musicPath, error = errors[0]
+        self.statusBar().showMessage(f"Saved the tags of {written} musics, {len(errors)} failed ({musicPath.name}: {error})")
+
+    def updateMusicRecord(self, musicPath:Path, stat:object, values:dict):
+        """update the cache entry and the row of one music after editing its tags, without touching the playback"""
+        record = self.musicsModel.record(musicPath) or self.libraryIndex.records.get(musicPath)
+        if record is None:
+            return  # unknown, the cache entry is outdated by the new modification time anyway
+        if not record.metadataLoaded:  # nothing to start from, read the whole metadata
+            self.metadataCache.invalidate(musicPath)
+            if musicPath in self.musicsModel.rowByPath:
+                self.fetchMetadata([musicPath])
+            return
+
+        metadata = MusicMetadata(values.get("title", record.title), values.get("author", record.author), record.time,
+                                 values.get("coverKey", record.coverKey), record.hasCover or "coverKey" in values)
+        self.metadataCache.put(musicPath, stat, metadata)
+        self.musicsModel.setMetadata(musicPath, metadata)
+        self.libraryIndex.setMetadata(musicPath, metadata)
+        if not self.sortTimer.isActive():  # batch edits update many rows in a row
+            self.sortTimer.start()
+        if musicPath == self.currentMusic:
+            self.updatePlayerInfos(record, withCover="coverKey" in values)
+        log.debug("updated the record of the music %s", musicPath)
+
+    def coverResolved(self, musicPath:Path, coverKey:str):
+        """remember the key of a cover once it is read, so the musics sharing it share its thumbnail"""
+        for record in (self.musicsModel.record(musicPath), self.libraryIndex.records.get(musicPath)):
+            if record is not None:
+                record.coverKey = coverKey
+        self.metadataCache.setCoverKey(musicPath, coverKey)
     
+    def closeEvent(self, event:QtGui.QCloseEvent):
+        """release the resources before closing the window"""
+        self.unloadMusic()
+        self.player.release()
+        self.cancelMetadataScan()
+        if self.libraryScan:
+            self.libraryScan.cancel()
+            self.libraryScanPool.clear()
+        self.folderScanPool.waitForDone()
+        self.libraryScanPool.waitForDone()
+        self.metadataPool.waitForDone()
+        self.folderCountPool.waitForDone()
+        self.libraryWatcher.waitForDone()
+        if self.tagWriter.isBusy():
+            log.info("waiting for the tag writes to finish")
+        self.tagWriter.waitForDone()  # an interrupted write would only leave a temporary file, but the edit would be lost
+        self.coverStore.clear()
+        self.metadataCache.close()
+        self.config.flush()
+        self.playQueue.save()
+        self.stallDetector.stop()
+        metrics.dump()
+        log.info("closing the window")
+        super().closeEvent(event)
+
     def keyPressEvent(self, event:QtGui.QKeyEvent):
         """handle the key press events"""
         # handle the space key to play/pause the music
         if event.key() == QtCore.Qt.Key_Space and self.playerPanel.isVisible():
             self.musicPlay()
             event.accept()
+        # handle the F12 key to show the timings
+        elif event.key() == QtCore.Qt.Key_F12 and metrics.enabled:
+            self.debugOverlay.toggle()
+            event.accept()
         else:
             super().keyPressEvent(event)
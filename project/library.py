@@ -0,0 +1,182 @@
+from constants import *
+from metadata import MusicMetadata
+from widgets import MusicRecord
+from scanner import walkMusics
+from instrumentation import metrics
+from operator import itemgetter
+from bisect import bisect_left
+from pathlib import Path
+import unicodedata
+import logging
+import re
+
+log = logging.getLogger(__name__)
+
+def normalizeText(text:str) -> str:
+    """lowercase a text and strip its accents, so the search ignores them"""
+    return "".join(char for char in unicodedata.normalize("NFKD", text.casefold()) if not unicodedata.combining(char))
+
+def tokenize(text:str) -> list:
+    """split a text into normalized words"""
+    return re.findall(r"\w+", normalizeText(text))
+
+def recordTokens(record:MusicRecord) -> tuple:
+    """return the distinct words of the title, author and file name of a music"""
+    return tuple(set(tokenize(f"{record.title} {record.author or ''} {record.musicPath.stem}")))
+
+class LibraryIndex():
+    """an in-memory index of the musics of all the folders, searched by word prefixes
+
+    the words are kept in a sorted array, so the words starting with a prefix are a contiguous range found by
+    bisection. the changes made since the array was built are kept apart and scanned linearly, until there
+    are enough of them to rebuild the array. the musics are numbered, since hashing ints is much faster
+    than hashing paths. a music reached through two folders, like a folder added twice or nested in another one,
+    is indexed once, under the first path it was found with."""
+    def __init__(self):
+        self.records = {}  # music path -> record
+        self.ids = {}  # music path -> number of the music
+        self.recordsById = {}  # number of the music -> record
+        self.tokens = {}  # number of the music -> current words of the music
+        self.keys = []  # sorted words
+        self.keyIds = []  # number of the music of each word
+        self.delta = set()  # musics whose current words aren't in the array yet
+        self.stale = set()  # musics whose words in the array are outdated or removed
+        self.resolvedPaths = {}  # resolved path -> path the music is indexed with
+        self.resolvedFolders = {}  # folder -> resolved folder, each folder is resolved only once
+        self.nextId = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def build(self, records:list):
+        """index some records from scratch"""
+        self.__init__()
+        for record in records:
+            if self.indexedPath(record.musicPath) is not None:
+                continue  # already found through another folder
+            musicId = self.newId(record)
+            self.tokens[musicId] = recordTokens(record)
+        self.setPairs([(token, musicId) for musicId, tokens in self.tokens.items() for token in tokens])
+
+    def resolvedPath(self, musicPath:Path) -> Path:
+        """return the path of a music with its folder resolved, the same for all the paths leading to it"""
+        folder = self.resolvedFolders.get(musicPath.parent)
+        if folder is None:
+            folder = musicPath.parent.resolve()
+            self.resolvedFolders[musicPath.parent] = folder
+        return folder / musicPath.name
+
+    def indexedPath(self, musicPath:Path) -> Path:
+        """return the path a music is indexed with, which may be another path to the same file, or None"""
+        if musicPath in self.records:
+            return musicPath
+        return self.resolvedPaths.get(self.resolvedPath(musicPath))
+
+    def newId(self, record:MusicRecord) -> int:
+        """number a new music"""
+        musicId = self.nextId
+        self.nextId += 1
+        self.resolvedPaths[self.resolvedPath(record.musicPath)] = record.musicPath
+        self.records[record.musicPath] = record
+        self.ids[record.musicPath] = musicId
+        self.recordsById[musicId] = record
+        return musicId
+
+    def setPairs(self, pairs:list):
+        """replace the sorted array with some (word, music number) pairs"""
+        pairs.sort(key=itemgetter(0))
+        self.keys = [token for token, _ in pairs]
+        self.keyIds = [musicId for _, musicId in pairs]
+
+    def compact(self):
+        """move the recent changes into the sorted array"""
+        stale = self.stale
+        pairs = [(token, musicId) for token, musicId in zip(self.keys, self.keyIds) if musicId not in stale]
+        pairs += [(token, musicId) for musicId in self.delta for token in self.tokens[musicId]]
+        self.setPairs(pairs)  # nearly sorted already, so this is mostly a merge
+        self.delta.clear()
+        self.stale.clear()
+        log.debug("compacted the library index, %d words", len(self.keys))
+
+    def addMusics(self, musics:list):
+        """index placeholder records for the musics that aren't known yet"""
+        for music in musics:
+            if self.indexedPath(music) is None:
+                self.setRecord(MusicRecord(music))
+
+    def setRecord(self, record:MusicRecord):
+        """index a record, replacing the previous one of the same music"""
+        indexedPath = self.indexedPath(record.musicPath)
+        if indexedPath is None:
+            musicId = self.newId(record)
+        else:
+            musicId = self.ids[indexedPath]
+            self.records[indexedPath] = record
+            self.recordsById[musicId] = record
+            self.stale.add(musicId)
+        self.tokens[musicId] = recordTokens(record)
+        self.delta.add(musicId)
+
+    def setMetadata(self, musicPath:Path, metadata:MusicMetadata):
+        """update the indexed infos of a music"""
+        indexedPath = self.indexedPath(musicPath)
+        record = self.records[indexedPath] if indexedPath is not None else MusicRecord(musicPath)
+        record.setMetadata(metadata)
+        self.setRecord(record)
+
+    def removeMusics(self, musics:list):
+        """remove some musics from the index"""
+        for music in musics:
+            music = self.indexedPath(music)
+            if music is None:
+                continue
+            del self.records[music]
+            self.resolvedPaths.pop(self.resolvedPath(music), None)
+            musicId = self.ids.pop(music)
+            del self.recordsById[musicId]
+            del self.tokens[musicId]
+            self.stale.add(musicId)
+            self.delta.discard(musicId)
+
+    def search(self, query:str) -> list:
+        """return the records of the musics having a word starting with each word of the query"""
+        queryTokens = set(tokenize(query))
+        if not queryTokens:
+            return []
+        if len(self.delta) > max(1000, len(self.records) // 20):
+            self.compact()  # keep the linear part of the search small
+        result = None
+        for queryToken in sorted(queryTokens, key=len, reverse=True):  # the longest words usually match the fewest musics
+            start = bisect_left(self.keys, queryToken)
+            end = bisect_left(self.keys, queryToken + chr(0x10ffff), start)
+            matches = set(self.keyIds[start:end])
+            if self.stale:
+                matches -= self.stale
+            for musicId in self.delta:
+                if any(token.startswith(queryToken) for token in self.tokens[musicId]):
+                    matches.add(musicId)
+            result = matches if result is None else result & matches
+            if not result:
+                return []
+        return [self.recordsById[musicId] for musicId in result]
+
+@metrics.timed("indexLibrary")
+def buildLibraryIndex(folders:list, recursive:bool=False, metadataCache=None, cancelled=lambda: False) -> LibraryIndex:
+    """list the musics of all the folders and index them with their cached metadata, without reading the music files"""
+    cached = metadataCache.getAll() if metadataCache else {}
+    records = []
+    def found(dirPath:Path, musics:dict):
+        for music, state in musics.items():
+            record = MusicRecord(music)
+            entry = cached.get(str(music))
+            if entry is not None and entry[0] == state:  # the file didn't change since it was cached
+                record.setMetadata(entry[1])
+            records.append(record)
+    for folder in folders:
+        if cancelled():
+            return None
+        walkMusics(Path(folder), found, recursive, cancelled)
+    index = LibraryIndex()
+    index.build(records)
+    log.info("indexed %d musics of %d folders", len(index), len(folders))
+    return index
@@ -0,0 +1,64 @@
+from constants import *
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+import logging
+import atexit
+import queue
+
+log = logging.getLogger(__name__)
+
+def levelFromArgs(argv:list) -> str:
+    """return the level given with --log-level on the command line, or None"""
+    for i, arg in enumerate(argv):
+        if arg.startswith("--log-level="):
+            return arg.split("=", 1)[1]
+        if arg == "--log-level" and i + 1 < len(argv):
+            return argv[i + 1]
+    return None
+
+class LogPipeline():
+    """the log records are only queued by the threads logging them, a background thread writes them to the rotated log files"""
+    def __init__(self):
+        self.listener = None
+        self.handler = None
+        self.levelFromCli = False  # the command line takes precedence over the config
+
+    def start(self, level:str=None, path:Path=logFile):
+        """send the logs of the whole app through the queue, the previous session's log is rotated instead of overwritten"""
+        fileHandler = RotatingFileHandler(path, maxBytes=logMaxSize, backupCount=logBackupCount, encoding="utf-8", delay=True)
+        if path.exists() and path.stat().st_size > 0:
+            fileHandler.doRollover()  # keep the log of the previous session
+        fileHandler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(threadName)s - %(levelname)s - %(message)s"))
+        records = queue.SimpleQueue()
+        self.handler = QueueHandler(records)
+        self.listener = QueueListener(records, fileHandler, respect_handler_level=False)
+        root = logging.getLogger()
+        root.addHandler(self.handler)
+        self.listener.start()
+        atexit.register(self.stop)  # write the last records even if the app isn't closed cleanly
+        self.setLevel(defaultLogLevel)
+        if level is not None:
+            self.setLevel(level, fromCli=True)
+
+    def setLevel(self, level:str, fromCli:bool=False):
+        """set the level of the logs, the records below it are dropped before being formatted"""
+        if level is None or (self.levelFromCli and not fromCli):
+            return
+        if level.upper() not in logLevels:
+            log.warning("unknown log level %r, expected one of %s", level, ", ".join(logLevels))
+            return
+        logging.getLogger().setLevel(level.upper())
+        self.levelFromCli = self.levelFromCli or fromCli
+        log.info("set the log level to %s", level.upper())
+
+    def stop(self):
+        """write the queued records and close the log file"""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        logging.getLogger().removeHandler(self.handler)
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = None
+
+logPipeline = LogPipeline()  # shared by the whole app
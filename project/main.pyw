@@ -1,17 +1,23 @@
+from startup import startupProfile  # first, so the imports are measured too
 from constants import *
 import interface
+from instrumentation import metrics
+from logpipeline import logPipeline, levelFromArgs
+from theme import applyTheme
 import PyQt5.QtWidgets as qtw
 from PyQt5 import QtCore, QtGui
-import logging as log
-import darkdetect
 import ctypes
 import sys
 import os
 
 appDataDir.mkdir(parents=True, exist_ok=True)  # create the app data directory if it doesn't exist
 (appDataDir/"logs").mkdir(parents=True, exist_ok=True)  # create the logs directory if it doesn't exist
+thumbnailsDir.mkdir(parents=True, exist_ok=True)  # create the thumbnails directory if it doesn't exist
 
-log.basicConfig(level=log.DEBUG, filename=appDataDir/"logs"/"latest.log", filemode="w", format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logPipeline.start(levelFromArgs(sys.argv))  # the config level is applied once it is loaded, unless given here
+startupProfile.enabled = "--startup-profile" in sys.argv
+metrics.enabled = "--instrument" in sys.argv
+startupProfile.mark("imported the modules")
 
 if os.name == "nt":  # if on Windows
     appId = "ilwan.bangerplayer"
@@ -21,7 +27,7 @@ if os.name == "nt":  # if on Windows
 App = qtw.QApplication(sys.argv)
 App.setStyle("Fusion")
 App.setApplicationName("BangerPlayer")
-if darkdetect.isDark():  # if using dark mode
+if colorMode == "dark":  # if using dark mode, probed once in constants
     # dark mode style found online
     palette = QtGui.QPalette()
     palette.setColor(QtGui.QPalette.Window, QtGui.QColor(53, 53, 53))
@@ -38,6 +44,8 @@ if darkdetect.isDark():  # if using dark mode
     palette.setColor(QtGui.QPalette.Highlight, QtGui.QColor(42, 130, 218))
     palette.setColor(QtGui.QPalette.HighlightedText, QtCore.Qt.black)
     App.setPalette(palette)
+applyTheme(App)
+startupProfile.mark("created the application")
 MainWindow = interface.Window()
 MainWindow.startInterface()
 sys.exit(App.exec_())
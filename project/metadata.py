@@ -0,0 +1,77 @@
+from constants import *
+from tags import readTags
+from engine import getVlcInstance
+from durations import probeDuration
+from instrumentation import metrics
+from pathlib import Path
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+class MusicMetadata():
+    """the metadata of a music file as displayed in the interface"""
+    __slots__ = ("title", "author", "time", "coverKey", "hasCover")
+
+    def __init__(self, title:str, author:str=None, time:int=0, coverKey:str=None, hasCover:bool=None):
+        self.title = title  # title of the music
+        self.author = author  # author of the music, None if unknown
+        self.time = time  # duration of the music in seconds
+        self.coverKey = coverKey  # hash of the cover image, None if there is no cover or it wasn't read yet
+        self.hasCover = coverKey is not None if hasCover is None else hasCover  # whether the file has a cover
+
+def readMetadata(musicPath:Path, stat:os.stat_result) -> MusicMetadata:
+    """read the metadata of a music file, stat is the state of the file before reading it"""
+    metadata = MusicMetadata(musicPath.stem)
+
+    # get the duration from the headers of the file, vlc only parses the files it can't be found in
+    duration = probeDuration(musicPath)
+    if duration is None:
+        media = getVlcInstance().media_new(str(musicPath))
+        media.parse()
+        duration = media.get_duration() / 1000
+        media.release()
+    metadata.time = int(duration)
+
+    # only the tags are read, the cover is read later to make its thumbnail when it is displayed
+    try:
+        tags = readTags(musicPath)
+    except ValueError as e:  # an unsupported format or broken tags, the file can still be played
+        log.debug("failed to read the tags of %s: %s", musicPath, e)
+        return metadata
+    if tags.title:
+        metadata.title = tags.title
+    if tags.author:
+        metadata.author = tags.author
+    metadata.hasCover = tags.hasCover  # its key is found once the cover is read
+    return metadata
+
+def readCover(musicPath:Path) -> bytes:
+    """read the full resolution cover image of a music file, or None if there is no cover"""
+    try:
+        return readTags(musicPath, withCover=True).cover
+    except Exception as e:
+        log.error("failed to read the cover of %s: %s", musicPath, e)
+        return None
+
+@metrics.timed("loadMetadata")
+def loadMetadata(musicPath:Path, cache=None) -> MusicMetadata:
+    """get the metadata of a music file, from the cache if it is still valid or else from the file itself"""
+    try:
+        stat = musicPath.stat()  # stat before reading so a concurrent change invalidates the entry
+    except OSError as e:
+        log.error("failed to stat %s: %s", musicPath, e)
+        return MusicMetadata(musicPath.stem)
+
+    if cache:
+        metadata = cache.get(musicPath, stat)
+        if metadata:
+            return metadata
+    try:
+        metadata = readMetadata(musicPath, stat)
+    except Exception as e:
+        log.error("failed to fetch metadata for %s: %s", musicPath, e)
+        return MusicMetadata(musicPath.stem)
+    if cache:
+        cache.put(musicPath, stat, metadata)
+    return metadata
@@ -0,0 +1,198 @@
+from constants import *
+from config import writeConfig
+from collections import deque
+from pathlib import Path
+import random as rd
+import logging
+import json
+
+log = logging.getLogger(__name__)
+
+class PlayQueue():
+    """the order the musics are played in, with the musics queued by the user and the played ones
+
+    the shuffled order is a permutation of the listed musics, the ones before the position were played. the musics
+    found later are inserted at a random place after the position, like the inside-out Fisher-Yates shuffle, so the
+    permutation stays uniform and going to the next music is only moving the position. the search results get their
+    own permutation, which isn't saved, and the one of the folder is restored when the search is cleared."""
+    def __init__(self):
+        self.source = None  # folder the permutation was made for
+        self.permutation = []  # shuffled musics
+        self.positions = {}  # music -> index in the permutation
+        self.position = -1  # index of the last played music in the permutation
+        self.current = None
+        self.upNext = deque()  # musics queued by the user, played before the others
+        self.history = deque(maxlen=playHistorySize)  # previously played musics, the last one at the end
+        self.folderOrder = None  # (source, permutation, position) of the folder, kept aside while a search is shown
+
+    def setSource(self, source:Path):
+        """start a new permutation when the musics come from another folder"""
+        self.endSearch()
+        source = str(source) if source is not None else None
+        if source == self.source:
+            return  # like the folder reselected at startup, its permutation is kept
+        self.source = source
+        self.clear()
+
+    def clear(self):
+        """forget the permutation, when the listed musics are replaced"""
+        self.permutation = []
+        self.positions = {}
+        self.position = -1
+
+    def setSearchResults(self, musics:list):
+        """shuffle the search results apart from the folder, the results already played stay played"""
+        if self.folderOrder is None:
+            self.folderOrder = (self.source, self.permutation, self.position)
+            played = []
+        else:  # the search changed, or its results were refreshed
+            results = set(musics)
+            played = [music for music in self.permutation[:self.position + 1] if music in results]
+        playedSet = set(played)
+        others = [music for music in musics if music not in playedSet]
+        rd.shuffle(others)
+        self.permutation = played + others
+        self.positions = {music: i for i, music in enumerate(self.permutation)}
+        self.position = len(played) - 1
+
+    def endSearch(self):
+        """go back to the permutation of the folder once the search is cleared"""
+        if self.folderOrder is None:
+            return
+        self.source, self.permutation, self.position = self.folderOrder
+        self.positions = {music: i for i, music in enumerate(self.permutation)}
+        self.folderOrder = None
+
+    def addMusics(self, musics:list):
+        """insert the new musics at random places in the part of the permutation that wasn't played"""
+        for music in musics:
+            if music in self.positions:
+                continue
+            self.permutation.append(music)
+            last = len(self.permutation) - 1
+            swap = rd.randint(self.position + 1, last)
+            other = self.permutation[swap]
+            self.permutation[last], self.permutation[swap] = other, music
+            self.positions[other] = last
+            self.positions[music] = swap
+
+    def keepMusics(self, musics):
+        """drop the musics of the permutation that aren't listed, like the deleted ones, in the same order"""
+        kept = [music for music in self.permutation if music in musics]
+        if len(kept) == len(self.permutation):
+            return
+        self.position = sum(1 for music in self.permutation[:self.position + 1] if music in musics) - 1
+        self.permutation = kept
+        self.positions = {music: i for i, music in enumerate(kept)}
+
+    def reshuffle(self, first:Path=None):
+        """shuffle the whole permutation again, the first music being given or different from the current one"""
+        rd.shuffle(self.permutation)  # Fisher-Yates
+        if first is not None and first in self.positions:
+            i = self.permutation.index(first)
+            self.permutation[0], self.permutation[i] = first, self.permutation[0]
+        elif len(self.permutation) > 1 and self.permutation[0] == self.current:
+            self.permutation[0], self.permutation[-1] = self.permutation[-1], self.permutation[0]
+        self.positions = {music: i for i, music in enumerate(self.permutation)}
+        self.position = 0 if first is not None and first in self.positions else -1
+
+    def setCurrent(self, music:Path):
+        """record that a music started, it counts as played in the permutation"""
+        if music == self.current:
+            return
+        if self.current is not None:
+            self.history.append(self.current)
+        self.current = music
+        if music in self.upNext:
+            self.upNext.remove(music)
+        i = self.positions.get(music)
+        if i is not None and i > self.position:  # move it right after the played ones, so the others still play
+            nextPosition = self.position + 1
+            other = self.permutation[nextPosition]
+            self.permutation[nextPosition], self.permutation[i] = music, other
+            self.positions[music], self.positions[other] = nextPosition, i
+            self.position = nextPosition
+
+    def queued(self, available) -> Path:
+        """return the first music queued by the user that can be played, or None"""
+        for music in self.upNext:
+            if available(music):
+                return music
+        return None
+
+    def shuffled(self, available, loop:bool) -> Path:
+        """return the next music of the permutation, which is shuffled again once played entirely when looping"""
+        for i in range(self.position + 1, len(self.permutation)):
+            if available(self.permutation[i]) and self.permutation[i] != self.current:
+                return self.permutation[i]
+        if not loop or len(self.permutation) < 2:
+            return None
+        self.reshuffle()  # the next round starts now, so the predicted music stays the next one
+        for music in self.permutation:
+            if available(music) and music != self.current:
+                return music
+        return None
+
+    def previous(self, available) -> Path:
+        """go back to the last played music that can be played, or None"""
+        while self.history:
+            music = self.history.pop()
+            if available(music) and music != self.current:
+                self.current = music  # not added to the history again
+                return music
+        return None
+
+    def playNext(self, musics:list):
+        """queue some musics before the other queued ones"""
+        for music in reversed(musics):
+            self.upNext.appendleft(music)
+
+    def addToQueue(self, musics:list):
+        """queue some musics after the other queued ones"""
+        self.upNext.extend(musics)
+
+    def restart(self):
+        """forget the played musics, so the next round plays all of them again"""
+        self.reshuffle(self.current)
+
+    def save(self, path:Path=queueFile):
+        """write the state of the queue, to continue it at the next launch"""
+        source, permutation, position = self.folderOrder or (self.source, self.permutation, self.position)  # not the search
+        state = {
+            "source": source,
+            "permutation": [str(music) for music in permutation],
+            "position": position,
+            "current": str(self.current) if self.current is not None else None,
+            "up_next": [str(music) for music in self.upNext],
+            "history": [str(music) for music in self.history]
+        }
+        try:
+            writeConfig(path, json.dumps(state))
+            log.debug("saved the play queue")
+        except OSError as e:
+            log.error("failed to save the play queue: %s", e)
+
+    def load(self, path:Path=queueFile):
+        """restore the state of the queue from the last session"""
+        if not path.exists():
+            return
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            permutation = [Path(music) for music in state["permutation"]]
+            position = int(state["position"])
+            upNext = [Path(music) for music in state["up_next"]]
+            history = [Path(music) for music in state["history"]]
+            current = Path(state["current"]) if state["current"] is not None else None
+            source = state["source"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.error("failed to load the play queue: %s", e)
+            return
+        self.source = source
+        self.permutation = permutation
+        self.positions = {music: i for i, music in enumerate(permutation)}
+        self.position = max(-1, min(position, len(permutation) - 1))
+        self.current = current
+        self.upNext = deque(upNext)
+        self.history = deque(history, maxlen=playHistorySize)
+        log.debug("loaded the play queue, %d musics shuffled and %d queued", len(permutation), len(upNext))
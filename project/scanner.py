@@ -0,0 +1,110 @@
+from constants import *
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+def isMusicFile(name:str) -> bool:
+    """check if a file name has a supported audio extension, whatever its case"""
+    return os.path.splitext(name)[1].lower() in supportedAudioFormats
+
+def countMusics(folderPath:Path, recursive:bool=False) -> int:
+    """count the music files of a folder in a single pass, without reading their state"""
+    if recursive:
+        counts = []
+        walkMusics(folderPath, lambda dirPath, musics: counts.append(len(musics)))
+        return sum(counts)
+    count = 0
+    try:
+        with os.scandir(folderPath) as entries:
+            for entry in entries:
+                try:
+                    if isMusicFile(entry.name) and entry.is_file():
+                        count += 1
+                except OSError:
+                    continue
+    except OSError as e:
+        log.error("failed to count the musics of the folder %s: %s", folderPath, e)
+    return count
+
+def listMusics(folderPath:Path) -> dict:
+    """list the music files of a folder in a single pass, mapped to their (modification time, size)"""
+    musics = {}
+    try:
+        with os.scandir(folderPath) as entries:
+            for entry in entries:
+                if not isMusicFile(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue  # removed or unreadable in the meantime
+                musics[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+    except OSError as e:
+        log.error("failed to list the folder %s: %s", folderPath, e)
+    return musics
+
+def scanDirectory(dirPath:Path) -> tuple:
+    """list the musics and the subfolders of a folder in a single pass, an unreadable folder is skipped"""
+    musics = {}
+    subfolders = []
+    try:
+        with os.scandir(dirPath) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():  # follows the symlinks, the loops are caught by walkMusics
+                        subfolders.append(Path(entry.path))
+                    elif isMusicFile(entry.name) and entry.is_file():
+                        stat = entry.stat()
+                        musics[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue  # removed or unreadable in the meantime
+    except OSError as e:
+        log.warning("skipped the unreadable folder %s: %s", dirPath, e)
+    return musics, subfolders
+
+def walkMusics(folderPath:Path, found, recursive:bool=True, cancelled=lambda: False, emptyFolders:bool=False):
+    """list the musics of a folder tree, listing the subfolders in parallel and calling found(folder, musics) for each folder with musics
+
+    with emptyFolders, found is also called for the folders without musics, like an artist folder holding the albums"""
+    if not recursive:
+        musics = listMusics(folderPath)
+        if musics or emptyFolders:
+            found(folderPath, musics)
+        return
+
+    visited = set()  # (device, inode) of the listed folders, so a symlink loop is only followed once
+    def shouldVisit(dirPath:Path) -> bool:
+        try:
+            stat = dirPath.stat()
+        except OSError as e:
+            log.warning("skipped the unreadable folder %s: %s", dirPath, e)
+            return False
+        key = (stat.st_dev, stat.st_ino)
+        if key in visited:
+            log.debug("skipped the already listed folder %s", dirPath)
+            return False
+        visited.add(key)
+        return True
+
+    if not shouldVisit(folderPath):
+        return
+    with ThreadPoolExecutor(scanThreads) as executor:
+        pending = {executor.submit(scanDirectory, folderPath): folderPath}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dirPath = pending.pop(future)
+                musics, subfolders = future.result()
+                if cancelled():
+                    continue  # let the running listings finish without starting new ones
+                if musics or emptyFolders:
+                    found(dirPath, musics)
+                for subfolder in subfolders:
+                    if shouldVisit(subfolder):
+                        pending[executor.submit(scanDirectory, subfolder)] = subfolder
+    log.debug("walked %d folders in %s", len(visited), folderPath)
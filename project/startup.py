@@ -0,0 +1,24 @@
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+class StartupProfile():
+    """measure how long each phase of the startup takes, logged when launched with --startup-profile"""
+    def __init__(self):
+        self.enabled = False
+        self.start = time.perf_counter()  # the module is imported first, so this is the launch time
+        self.last = self.start
+        self.phases = {}  # phase -> time in ms since the launch
+
+    def mark(self, phase:str):
+        """record the end of a startup phase, only its first occurrence counts"""
+        if phase in self.phases:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = (now - self.start) * 1000
+        if self.enabled:
+            log.info("startup: %s in %.1f ms, %.1f ms since launch", phase, (now - self.last) * 1000, self.phases[phase])
+        self.last = now
+
+startupProfile = StartupProfile()  # shared by the whole app
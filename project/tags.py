@@ -0,0 +1,841 @@
+from pathlib import Path
+from fileheaders import flacStart, mp4Atoms, syncsafe
+import logging
+import shutil
+import struct
+import base64
+import zlib
+import io
+
+log = logging.getLogger(__name__)
+
+# only the metadata region of the files is read, the covers are skipped unless asked for, and the writers copy
+# the audio data in chunks after writing the new metadata
+
+class Tags():
+    """the tags of a music file used by the app"""
+    __slots__ = ("title", "author", "hasCover", "cover", "coverIsFront")
+
+    def __init__(self):
+        self.title = None
+        self.author = None
+        self.hasCover = False
+        self.cover = None  # image data, only read when asked for
+        self.coverIsFront = False
+
+    def setPicture(self, data:bytes, front:bool):
+        """keep the first front cover, or the first picture if there is none"""
+        if self.cover is None or (front and not self.coverIsFront):
+            self.cover = data
+            self.coverIsFront = front
+
+class UnsupportedFormat(ValueError):
+    """the tags of this file can't be read or written"""
+
+def copyRange(src, dst, start:int, length:int=None):
+    """copy a part of a file, up to its end when the length isn't given"""
+    src.seek(start)
+    if length is None:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+        return
+    while length > 0:
+        chunk = src.read(min(length, 1024 * 1024))
+        if not chunk:
+            raise ValueError("the file is truncated")
+        dst.write(chunk)
+        length -= len(chunk)
+
+def readExactly(read, size:int) -> bytes:
+    data = read(size)
+    if len(data) < size:
+        raise ValueError("the file is truncated")
+    return data
+
+# ID3v2
+
+def toSyncsafe(value:int) -> bytes:
+    return bytes(((value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f))
+
+def decodeId3Text(data:bytes) -> str:
+    """decode a text frame, the values of a multi-valued frame are joined"""
+    if not data:
+        return ""
+    encoding = data[0]
+    text = data[1:]
+    if encoding == 0:
+        value = text.decode("latin-1")
+    elif encoding == 1:
+        value = text.decode("utf-16")
+    elif encoding == 2:
+        value = text.decode("utf-16-be")
+    else:
+        value = text.decode("utf-8", errors="replace")
+    return ", ".join(part for part in value.split("\x00") if part)
+
+def splitId3String(data:bytes, start:int, encoding:int) -> int:
+    """return the index after the null terminated string starting at start"""
+    if encoding in (1, 2):  # two null bytes aligned on a character
+        i = start
+        while i + 1 < len(data):
+            if data[i] == 0 and data[i + 1] == 0:
+                return i + 2
+            i += 2
+        raise ValueError("unterminated string")
+    i = data.index(b"\x00", start)
+    return i + 1
+
+def parseApic(data:bytes, major:int) -> tuple:
+    """return (picture type, image data) of an APIC or PIC frame"""
+    encoding = data[0]
+    if major == 2:
+        pictureType = data[4]
+        i = 5
+    else:
+        i = data.index(b"\x00", 1) + 1  # mime type
+        pictureType = data[i]
+        i += 1
+    i = splitId3String(data, i, encoding)  # description
+    return pictureType, data[i:]
+
+class Id3Tag():
+    """the frames of an ID3v2 tag, the ones the app doesn't use are kept as they are"""
+    def __init__(self, major:int=3):
+        self.major = major
+        self.frames = []  # (frame id, flags, data)
+        self.size = 0  # bytes taken by the tag in the file, with its header and padding
+
+def readId3(f, offset:int, tags:Tags, withCover:bool, keepFrames:bool=False) -> Id3Tag:
+    """read the ID3v2 tag at an offset into the tags, or return None if there is none"""
+    f.seek(offset)
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b"ID3" or header[3] not in (2, 3, 4):
+        return None
+    major, flags, size = header[3], header[5], syncsafe(header[6:10])
+    tag = Id3Tag(major)
+    tag.size = 10 + size + (10 if flags & 0x10 else 0)
+    if major == 2 and flags & 0x40:  # compressed, with a scheme that was never defined
+        if keepFrames:
+            raise UnsupportedFormat("the compressed ID3v2.2 tags can't be written")
+        return tag
+    read, skip = f.read, lambda n: f.seek(n, 1)
+    end = offset + 10 + size
+    position = lambda: f.tell()
+    if flags & 0x80 and major < 4:  # the whole tag is unsynchronised, it has to be read to be decoded
+        body = io.BytesIO(readExactly(f.read, size).replace(b"\xff\x00", b"\xff"))
+        read, skip, position, end = body.read, lambda n: body.seek(n, 1), body.tell, len(body.getvalue())
+    if flags & 0x40 and major >= 3:  # extended header
+        extendedSize = readExactly(read, 4)
+        skip(struct.unpack(">I", extendedSize)[0] if major == 3 else syncsafe(extendedSize) - 4)
+
+    headerSize = 6 if major == 2 else 10
+    while position() + headerSize <= end:
+        frameHeader = read(headerSize)
+        if len(frameHeader) < headerSize or frameHeader[0] == 0:
+            break  # padding
+        if major == 2:
+            frameId, frameSize, frameFlags = frameHeader[:3], int.from_bytes(frameHeader[3:6], "big"), b""
+        else:
+            frameId, frameFlags = frameHeader[:4], frameHeader[8:10]
+            frameSize = syncsafe(frameHeader[4:8]) if major == 4 else struct.unpack(">I", frameHeader[4:8])[0]
+        if position() + frameSize > end:
+            break  # broken frame
+        isPicture = frameId in (b"APIC", b"PIC")
+        wanted = frameId in (b"TIT2", b"TT2", b"TPE1", b"TP1") or (isPicture and (withCover or keepFrames))
+        if not wanted and not keepFrames:
+            if isPicture:
+                tags.hasCover = True
+            skip(frameSize)
+            continue
+        data = readExactly(read, frameSize)
+        if keepFrames:
+            tag.frames.append((frameId, frameFlags, data))
+        if major == 4 and frameFlags and frameFlags[1] & 0x0c:
+            continue  # compressed or encrypted
+        if major == 3 and frameFlags and frameFlags[1] & 0xc0:
+            continue
+        if major == 4 and frameFlags:
+            if frameFlags[1] & 0x01:  # data length indicator
+                data = data[4:]
+            if frameFlags[1] & 0x02:  # unsynchronised frame
+                data = data.replace(b"\xff\x00", b"\xff")
+        try:
+            if frameId in (b"TIT2", b"TT2") and tags.title is None:
+                tags.title = decodeId3Text(data) or None
+            elif frameId in (b"TPE1", b"TP1") and tags.author is None:
+                tags.author = decodeId3Text(data) or None
+            elif isPicture:
+                tags.hasCover = True
+                if withCover:
+                    pictureType, imageData = parseApic(data, major)
+                    tags.setPicture(imageData, pictureType == 3)
+        except (ValueError, IndexError) as e:
+            log.debug("skipped a broken %s frame: %s", frameId, e)
+    return tag
+
+def encodeId3Text(text:str, major:int) -> bytes:
+    """encode a text frame, in UTF-8 for ID3v2.4 and UTF-16 for the older versions which don't support it"""
+    if major == 4:
+        return b"\x03" + text.encode("utf-8")
+    return b"\x01" + text.encode("utf-16")
+
+def buildId3(tag:Id3Tag, changes:dict, minimumSize:int=0) -> bytes:
+    """return an ID3v2 tag with the changes applied to the frames of an existing tag, padded to a minimum size
+
+    the tag keeps its version, an ID3v2.2 tag is written back as ID3v2.2 so none of its frames is lost"""
+    major = tag.major
+    frames = list(tag.frames)
+    titleId, authorId, pictureId = (b"TT2", b"TP1", b"PIC") if major == 2 else (b"TIT2", b"TPE1", b"APIC")
+    def replace(frameId:bytes, frame:tuple):
+        nonlocal frames
+        frames = [f for f in frames if f[0] != frameId]
+        frames.append(frame)
+    if "title" in changes:
+        replace(titleId, (titleId, b"\x00\x00", encodeId3Text(changes["title"], major)))
+    if "author" in changes:
+        replace(authorId, (authorId, b"\x00\x00", encodeId3Text(changes["author"], major)))
+    if "cover" in changes:
+        imageData, mimetype = changes["cover"]
+        def isFrontCover(frame:tuple) -> bool:
+            try:
+                return frame[0] == pictureId and parseApic(frame[2], major)[0] == 3
+            except (ValueError, IndexError):
+                return False
+        frames = [frame for frame in frames if not isFrontCover(frame)]
+        if major == 2:  # a three letters image format instead of the mimetype
+            imageFormat = "JPG" if mimetype == "image/jpeg" else mimetype.partition("/")[2][:3].upper()
+            frames.append((b"PIC", b"", b"\x00" + imageFormat.encode("latin-1") + b"\x03\x00" + imageData))
+        else:
+            frames.append((b"APIC", b"\x00\x00", b"\x00" + mimetype.encode("latin-1") + b"\x00\x03\x00" + imageData))
+    body = b""
+    for frameId, frameFlags, data in frames:
+        if major == 2:
+            if len(data) >= 1 << 24:
+                raise ValueError("the cover is too big for an ID3v2.2 tag")
+            body += frameId + len(data).to_bytes(3, "big") + data
+            continue
+        size = toSyncsafe(len(data)) if major == 4 else struct.pack(">I", len(data))
+        body += frameId + size + (frameFlags or b"\x00\x00") + data
+    fits = 10 + len(body) <= minimumSize
+    body += bytes(minimumSize - 10 - len(body) if fits else 1024)  # the audio doesn't move when the tag fits
+    return b"ID3" + bytes((major, 0, 0)) + toSyncsafe(len(body)) + body
+
+# vorbis comments and FLAC pictures, shared by FLAC and Ogg
+
+def parsePicture(data:bytes) -> tuple:
+    """return (picture type, image data) of a FLAC picture block"""
+    pictureType, mimeLength = struct.unpack(">II", data[:8])
+    i = 8 + mimeLength
+    descriptionLength = struct.unpack(">I", data[i:i + 4])[0]
+    i += 4 + descriptionLength + 16
+    dataLength = struct.unpack(">I", data[i:i + 4])[0]
+    return pictureType, data[i + 4:i + 4 + dataLength]
+
+def buildPicture(imageData:bytes, mimetype:str) -> bytes:
+    """return a FLAC picture block for a front cover"""
+    mime = mimetype.encode("latin-1")
+    return struct.pack(">II", 3, len(mime)) + mime + struct.pack(">IIIIII", 0, 0, 0, 0, 0, len(imageData)) + imageData
+
+def readPicture(read, skip, size:int, tags:Tags, withCover:bool):
+    """read a FLAC picture block, its image is skipped unless asked for"""
+    tags.hasCover = True
+    if not withCover:
+        skip(size)
+        return
+    pictureType, imageData = parsePicture(readExactly(read, size))
+    tags.setPicture(imageData, pictureType == 3)
+
+def readVorbisComment(read, skip, tags:Tags, withCover:bool):
+    """read a vorbis comment, the values are read only for the keys the app uses"""
+    vendorLength = struct.unpack("<I", readExactly(read, 4))[0]
+    skip(vendorLength)
+    count = struct.unpack("<I", readExactly(read, 4))[0]
+    for _ in range(count):
+        length = struct.unpack("<I", readExactly(read, 4))[0]
+        start = readExactly(read, min(length, 32))
+        key, separator, value = start.partition(b"=")
+        if not separator:
+            skip(length - len(start))
+            continue
+        key = key.upper()
+        if key in (b"TITLE", b"ARTIST"):
+            text = (value + readExactly(read, length - len(start))).decode("utf-8", errors="replace")
+            if key == b"TITLE" and tags.title is None:
+                tags.title = text or None
+            elif key == b"ARTIST":
+                tags.author = f"{tags.author}, {text}" if tags.author else (text or None)
+        elif key in (b"METADATA_BLOCK_PICTURE", b"COVERART"):
+            tags.hasCover = True
+            if not withCover:
+                skip(length - len(start))
+                continue
+            encoded = value + readExactly(read, length - len(start))
+            try:
+                decoded = base64.b64decode(encoded)
+                if key == b"COVERART":  # the legacy field holds the image itself
+                    tags.setPicture(decoded, False)
+                else:
+                    pictureType, imageData = parsePicture(decoded)
+                    tags.setPicture(imageData, pictureType == 3)
+            except (ValueError, struct.error) as e:
+                log.debug("skipped a broken picture comment: %s", e)
+        else:
+            skip(length - len(start))
+
+def buildVorbisComment(data:bytes, changes:dict, withPictures:bool) -> bytes:
+    """return a vorbis comment with the changes applied, the pictures are kept in the comment for Ogg files only"""
+    if data:
+        vendorLength = struct.unpack("<I", data[:4])[0]
+        vendor = data[4:4 + vendorLength]
+        i = 4 + vendorLength
+        count = struct.unpack("<I", data[i:i + 4])[0]
+        i += 4
+        comments = []
+        for _ in range(count):
+            length = struct.unpack("<I", data[i:i + 4])[0]
+            comments.append(data[i + 4:i + 4 + length])
+            i += 4 + length
+    else:
+        vendor, comments = b"BangerPlayer", []
+    def keyOf(comment:bytes) -> bytes:
+        return comment.partition(b"=")[0].upper()
+    if "title" in changes:
+        comments = [comment for comment in comments if keyOf(comment) != b"TITLE"] + [b"TITLE=" + changes["title"].encode("utf-8")]
+    if "author" in changes:
+        comments = [comment for comment in comments if keyOf(comment) != b"ARTIST"] + [b"ARTIST=" + changes["author"].encode("utf-8")]
+    if "cover" in changes and withPictures:
+        def isFrontCover(comment:bytes) -> bool:
+            if keyOf(comment) == b"COVERART":
+                return True
+            if keyOf(comment) != b"METADATA_BLOCK_PICTURE":
+                return False
+            try:
+                return parsePicture(base64.b64decode(comment.partition(b"=")[2]))[0] == 3
+            except (ValueError, struct.error):
+                return True  # replaced since it can't be read anyway
+        comments = [comment for comment in comments if not isFrontCover(comment)]
+        comments.append(b"METADATA_BLOCK_PICTURE=" + base64.b64encode(buildPicture(*changes["cover"])))
+    result = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(comments))
+    for comment in comments:
+        result += struct.pack("<I", len(comment)) + comment
+    return result
+
+# FLAC
+
+def flacBlocks(f, start:int):
+    """yield the (type, data offset, size) of the metadata blocks"""
+    offset = start + 4
+    while True:
+        f.seek(offset)
+        header = readExactly(f.read, 4)
+        blockType, size = header[0] & 0x7f, int.from_bytes(header[1:4], "big")
+        yield blockType, offset + 4, size
+        offset += 4 + size
+        if header[0] & 0x80:
+            return
+
+def flacMarker(f) -> int:
+    start = flacStart(f)
+    if start is None:
+        raise UnsupportedFormat("not a FLAC file")
+    return start
+
+def readFlac(f, tags:Tags, withCover:bool):
+    for blockType, offset, size in flacBlocks(f, flacMarker(f)):
+        f.seek(offset)
+        if blockType == 4:
+            readVorbisComment(f.read, lambda n: f.seek(n, 1), tags, withCover)
+        elif blockType == 6:
+            readPicture(f.read, lambda n: f.seek(n, 1), size, tags, withCover)
+
+def writeFlac(src, dst, changes:dict):
+    start = flacMarker(src)
+    blocks = []  # (type, data)
+    audioOffset = None
+    for blockType, offset, size in flacBlocks(src, start):
+        audioOffset = offset + size
+        if blockType == 1:
+            continue  # the padding is added again at the end
+        src.seek(offset)
+        blocks.append((blockType, readExactly(src.read, size)))
+    if not any(blockType == 4 for blockType, _ in blocks):
+        blocks.append((4, b""))
+    blocks = [(blockType, buildVorbisComment(data, changes, False) if blockType == 4 else data) for blockType, data in blocks]
+    if "cover" in changes:
+        def isFrontCover(block:tuple) -> bool:
+            try:
+                return block[0] == 6 and parsePicture(block[1])[0] == 3
+            except (ValueError, struct.error):
+                return False
+        blocks = [block for block in blocks if not isFrontCover(block)]
+        blocks.append((6, buildPicture(*changes["cover"])))
+    blocks.append((1, bytes(1024)))
+    copyRange(src, dst, 0, start)
+    dst.write(b"fLaC")
+    for i, (blockType, data) in enumerate(blocks):
+        if len(data) >= 1 << 24:
+            raise ValueError("the cover is too big for a FLAC file")
+        dst.write(bytes((blockType | (0x80 if i == len(blocks) - 1 else 0),)) + len(data).to_bytes(3, "big") + data)
+    copyRange(src, dst, audioOffset)
+
+# Ogg
+
+bitReversal = bytes(int(f"{byte:08b}"[::-1], 2) for byte in range(256))
+
+def oggCrc(page:bytes) -> int:
+    """return the CRC of an ogg page, computed with zlib on the bit-reversed data since the ogg CRC isn't reflected"""
+    crc = zlib.crc32(page.translate(bitReversal), 0xffffffff) ^ 0xffffffff
+    return int(f"{crc:032b}"[::-1], 2)
+
+class OggPacketReader():
+    """read the packets of the first logical stream of an ogg file page by page, so the big ones can be skipped"""
+    def __init__(self, f):
+        self.f = f
+        self.serial = None
+        self.nextPageOffset = 0
+        self.pages = 0  # pages of the stream read so far
+        self.otherPages = 0  # pages of other streams skipped
+        self.firstPageEnd = None
+        self.lacing = []  # sizes of the segments left in the current page
+        self.segmentSize = None  # size of the current segment, None at the start of a packet
+        self.left = 0  # bytes left in the current segment
+        self.position = 0  # offset of the next byte in the file
+
+    def nextPage(self):
+        while True:
+            self.f.seek(self.nextPageOffset)
+            header = self.f.read(27)
+            if len(header) < 27 or header[:4] != b"OggS":
+                raise ValueError("the ogg stream ended in its headers")
+            lacing = readExactly(self.f.read, header[26])
+            dataOffset = self.nextPageOffset + 27 + header[26]
+            self.nextPageOffset = dataOffset + sum(lacing)
+            if self.serial is None:
+                self.serial = header[14:18]
+                self.firstPageEnd = self.nextPageOffset
+            if header[14:18] != self.serial:
+                self.otherPages += 1
+                continue
+            self.pages += 1
+            self.lacing = list(lacing)
+            self.position = dataOffset
+            return
+
+    def available(self) -> bool:
+        """move to the next segment if needed, return False at the end of the packet"""
+        while self.left == 0:
+            if self.segmentSize is not None and self.segmentSize < 255:
+                return False
+            if not self.lacing:
+                self.nextPage()
+            self.segmentSize = self.lacing.pop(0)
+            self.left = self.segmentSize
+        return True
+
+    def read(self, size:int) -> bytes:
+        chunks = []
+        while size > 0 and self.available():
+            length = min(size, self.left)
+            self.f.seek(self.position)
+            chunks.append(readExactly(self.f.read, length))
+            self.position += length
+            self.left -= length
+            size -= length
+        return b"".join(chunks)
+
+    def skip(self, size:int):
+        while size > 0 and self.available():
+            length = min(size, self.left)
+            self.position += length
+            self.left -= length
+            size -= length
+
+    def readPacket(self) -> bytes:
+        """read the rest of the current packet and move to the next one"""
+        chunks = []
+        while self.available():
+            chunks.append(self.read(self.left))
+        self.segmentSize = None
+        return b"".join(chunks)
+
+    def nextPacket(self):
+        while self.available():
+            self.skip(self.left)
+        self.segmentSize = None
+
+def oggCodec(identification:bytes) -> str:
+    if identification.startswith(b"\x01vorbis"):
+        return "vorbis"
+    if identification.startswith(b"OpusHead"):
+        return "opus"
+    if identification.startswith(b"\x7fFLAC"):
+        return "flac"
+    raise UnsupportedFormat("unknown ogg codec")
+
+def readOgg(f, tags:Tags, withCover:bool):
+    reader = OggPacketReader(f)
+    codec = oggCodec(reader.read(8))
+    reader.nextPacket()
+    if codec == "vorbis":
+        if reader.read(7) != b"\x03vorbis":
+            return
+    elif codec == "opus":
+        if reader.read(8) != b"OpusTags":
+            return
+    elif reader.read(4)[0] & 0x7f != 4:  # FLAC metadata block header, the comment comes first
+        return
+    readVorbisComment(reader.read, reader.skip, tags, withCover)
+
+def oggPages(packets:list, serial:bytes, firstSequence:int) -> tuple:
+    """paginate some header packets and return (pages, page count), each page ends with a packet or holds 255 segments"""
+    pages = bytearray()
+    sequence = firstSequence
+    for packet in packets:
+        lacing = [255] * (len(packet) // 255) + [len(packet) % 255]
+        offset = 0
+        continued = False
+        while lacing:
+            pageLacing, lacing = lacing[:255], lacing[255:]
+            size = sum(pageLacing)
+            ends = not lacing  # a packet ends in this page
+            header = (b"OggS\x00" + bytes((0x01 if continued else 0,)) + struct.pack("<q", 0 if ends else -1)
+                      + serial + struct.pack("<II", sequence, 0) + bytes((len(pageLacing),)) + bytes(pageLacing))
+            page = bytearray(header + packet[offset:offset + size])
+            page[22:26] = struct.pack("<I", oggCrc(bytes(page)))
+            pages += page
+            offset += size
+            sequence += 1
+            continued = True
+    return bytes(pages), sequence - firstSequence
+
+def writeOgg(src, dst, changes:dict):
+    reader = OggPacketReader(src)
+    identification = reader.readPacket()
+    codec = oggCodec(identification)
+    if codec == "flac":
+        raise UnsupportedFormat("the tags of Ogg FLAC files can't be written")
+    identificationPages = reader.pages
+    comment = reader.readPacket()
+    packets = [comment]
+    if codec == "vorbis":
+        packets.append(reader.readPacket())  # the setup header
+    if reader.lacing:
+        raise UnsupportedFormat("the audio starts in the last header page")
+    if reader.otherPages:
+        raise UnsupportedFormat("the tags of multiplexed ogg files can't be written")
+    headerPages = reader.pages - identificationPages
+    audioOffset = reader.nextPageOffset
+    prefix = b"\x03vorbis" if codec == "vorbis" else b"OpusTags"
+    if not comment.startswith(prefix):
+        raise UnsupportedFormat("the ogg comment header is missing")
+    body = comment[len(prefix):]
+    vendorLength = struct.unpack("<I", body[:4])[0]
+    count = struct.unpack("<I", body[4 + vendorLength:8 + vendorLength])[0]
+    end = 8 + vendorLength
+    for _ in range(count):
+        end += 4 + struct.unpack("<I", body[end:end + 4])[0]
+    packets[0] = prefix + buildVorbisComment(body[:end], changes, True) + (b"\x01" if codec == "vorbis" else body[end:])
+
+    # the identification page is kept, the pages after the new headers are renumbered if their count changed
+    newPages, newPageCount = oggPages(packets, reader.serial, identificationPages)
+    shift = newPageCount - headerPages
+    copyRange(src, dst, 0, reader.firstPageEnd)
+    dst.write(newPages)
+    if shift == 0:
+        copyRange(src, dst, audioOffset)
+        return
+    offset = audioOffset
+    while True:
+        src.seek(offset)
+        header = src.read(27)
+        if len(header) < 27:
+            break
+        if header[:4] != b"OggS":
+            raise ValueError("broken ogg page")
+        lacing = readExactly(src.read, header[26])
+        page = bytearray(header + lacing + readExactly(src.read, sum(lacing)))
+        if header[14:18] == reader.serial:
+            page[18:22] = struct.pack("<I", struct.unpack("<I", header[18:22])[0] + shift)
+            page[22:26] = b"\x00\x00\x00\x00"
+            page[22:26] = struct.pack("<I", oggCrc(bytes(page)))
+        dst.write(page)
+        offset += len(page)
+
+# MP4
+
+mp4Containers = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"udta", b"edts", b"dinf", b"ilst", b"meta"}
+
+def metaChildrenOffset(f, dataOffset:int) -> int:
+    """the meta atom has a version and flags before its children, except in some QuickTime files"""
+    f.seek(dataOffset + 4)
+    return dataOffset if f.read(4) == b"hdlr" else dataOffset + 4
+
+def findAtom(f, start:int, end:int, path:list) -> tuple:
+    """return the (data offset, data end) of the atom at a path of types, or None"""
+    for atomType, dataOffset, dataEnd in mp4Atoms(f, start, end):
+        if atomType != path[0]:
+            continue
+        if atomType == b"meta":
+            dataOffset = metaChildrenOffset(f, dataOffset)
+        if len(path) == 1:
+            return dataOffset, dataEnd
+        return findAtom(f, dataOffset, dataEnd, path[1:])
+    return None
+
+def readMp4(f, tags:Tags, withCover:bool):
+    fileSize = f.seek(0, 2)
+    ilst = findAtom(f, 0, fileSize, [b"moov", b"udta", b"meta", b"ilst"])
+    if ilst is None:
+        return
+    for itemType, itemOffset, itemEnd in list(mp4Atoms(f, *ilst)):
+        if itemType not in (b"\xa9nam", b"\xa9ART", b"covr"):
+            continue
+        for dataType, dataOffset, dataEnd in list(mp4Atoms(f, itemOffset, itemEnd)):
+            if dataType != b"data" or dataEnd - dataOffset < 8:
+                continue
+            if itemType == b"covr":
+                tags.hasCover = True
+                if withCover:
+                    f.seek(dataOffset + 8)
+                    tags.setPicture(readExactly(f.read, dataEnd - dataOffset - 8), tags.cover is None)
+                break
+            f.seek(dataOffset + 8)
+            text = readExactly(f.read, dataEnd - dataOffset - 8).decode("utf-8", errors="replace") or None
+            if itemType == b"\xa9nam":
+                tags.title = tags.title or text
+            else:
+                tags.author = tags.author or text
+            break
+
+class Mp4Atom():
+    """an atom of the moov tree, the containers are parsed and the others kept as bytes"""
+    def __init__(self, atomType:bytes, data:bytes=b"", children:list=None, prefix:bytes=b""):
+        self.type = atomType
+        self.data = data
+        self.children = children
+        self.prefix = prefix  # version and flags of the meta atom
+
+    def serialize(self) -> bytes:
+        body = self.prefix + (b"".join(child.serialize() for child in self.children) if self.children is not None else self.data)
+        if len(body) + 8 > 0xffffffff:
+            return struct.pack(">I", 1) + self.type + struct.pack(">Q", len(body) + 16) + body
+        return struct.pack(">I", len(body) + 8) + self.type + body
+
+    def child(self, atomType:bytes) -> "Mp4Atom":
+        for child in self.children or ():
+            if child.type == atomType:
+                return child
+        return None
+
+def parseMp4Tree(data:bytes) -> list:
+    """parse the atoms of a container, the ones which wouldn't be written back identically are kept as bytes"""
+    stream = io.BytesIO(data)
+    atoms = []
+    for atomType, dataOffset, dataEnd in list(mp4Atoms(stream, 0, len(data))):
+        body = data[dataOffset:dataEnd]
+        if atomType in mp4Containers:
+            prefix = b""
+            childrenOffset = dataOffset
+            if atomType == b"meta":
+                childrenOffset = metaChildrenOffset(stream, dataOffset)
+                prefix = data[dataOffset:childrenOffset]
+            if atomType == b"ilst":  # its items are kept as they are
+                items = list(mp4Atoms(stream, childrenOffset, dataEnd))
+                children = [Mp4Atom(itemType, data[itemOffset:itemEnd]) for itemType, itemOffset, itemEnd in items]
+            else:
+                children = parseMp4Tree(data[childrenOffset:dataEnd])
+            atom = Mp4Atom(atomType, children=children, prefix=prefix)
+            if atom.serialize()[8:] == body:
+                atoms.append(atom)
+                continue
+        atoms.append(Mp4Atom(atomType, body))
+    return atoms
+
+def mp4DataItem(itemType:bytes, dataType:int, payload:bytes) -> Mp4Atom:
+    data = Mp4Atom(b"data", struct.pack(">II", dataType, 0) + payload)
+    return Mp4Atom(itemType, data.serialize())
+
+def shiftChunkOffsets(atom:Mp4Atom, shift:int):
+    """move the offsets of the audio chunks, when the moov atom before them changed size"""
+    if atom.children is not None:
+        for child in atom.children:
+            shiftChunkOffsets(child, shift)
+    elif atom.type in (b"stco", b"co64"):
+        count = struct.unpack(">I", atom.data[4:8])[0]
+        entry = "I" if atom.type == b"stco" else "Q"
+        offsets = struct.unpack(f">{count}{entry}", atom.data[8:8 + count * struct.calcsize(entry)])
+        atom.data = atom.data[:8] + struct.pack(f">{count}{entry}", *(offset + shift for offset in offsets))
+
+def writeMp4(src, dst, changes:dict):
+    fileSize = src.seek(0, 2)
+    atoms = list(mp4Atoms(src, 0, fileSize))
+    moov = next(((offset, end) for atomType, offset, end in atoms if atomType == b"moov"), None)
+    if moov is None:
+        raise UnsupportedFormat("not an MP4 file")
+    src.seek(moov[0] - 8)
+    moovStart = moov[0] - (8 if src.read(8)[4:] == b"moov" else 16)  # with a 64 bits size
+    src.seek(moov[0])
+    root = Mp4Atom(b"moov", children=parseMp4Tree(readExactly(src.read, moov[1] - moov[0])))
+
+    # find or create moov/udta/meta/ilst
+    parent = root
+    for atomType in (b"udta", b"meta", b"ilst"):
+        atom = parent.child(atomType)
+        if atom is None:
+            atom = Mp4Atom(atomType, children=[])
+            if atomType == b"meta":
+                atom.prefix = bytes(4)
+                atom.children.append(Mp4Atom(b"hdlr", bytes(8) + b"mdirappl" + bytes(9)))
+            parent.children.append(atom)
+        elif atom.children is None:
+            raise UnsupportedFormat(f"broken {atomType.decode()} atom")
+        parent = atom
+    ilst = parent
+    def replace(itemType:bytes, item:Mp4Atom):
+        ilst.children = [child for child in ilst.children if child.type != itemType] + [item]
+    if "title" in changes:
+        replace(b"\xa9nam", mp4DataItem(b"\xa9nam", 1, changes["title"].encode("utf-8")))
+    if "author" in changes:
+        replace(b"\xa9ART", mp4DataItem(b"\xa9ART", 1, changes["author"].encode("utf-8")))
+    if "cover" in changes:
+        imageData, mimetype = changes["cover"]
+        replace(b"covr", mp4DataItem(b"covr", 14 if mimetype == "image/png" else 13, imageData))
+
+    # the chunk offsets only move for the audio data after the moov atom
+    newMoov = root.serialize()
+    if any(atomType == b"mdat" and offset > moov[0] for atomType, offset, end in atoms):
+        shiftChunkOffsets(root, len(newMoov) - (moov[1] - moovStart))
+        newMoov = root.serialize()
+    copyRange(src, dst, 0, moovStart)
+    dst.write(newMoov)
+    copyRange(src, dst, moov[1])
+
+# WAV
+
+def wavChunks(f, fileSize:int):
+    """yield the (id, data offset, size) of the RIFF chunks"""
+    f.seek(0)
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise UnsupportedFormat("not a WAV file")
+    offset = 12
+    while offset + 8 <= fileSize:
+        f.seek(offset)
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return
+        chunkId, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        yield chunkId, offset + 8, min(size, fileSize - offset - 8)
+        offset += 8 + size + (size & 1)
+
+def infoEntries(data:bytes) -> list:
+    """return the (id, value) of the entries of a LIST INFO chunk"""
+    entries = []
+    i = 4
+    while i + 8 <= len(data):
+        entryId, size = data[i:i + 4], struct.unpack("<I", data[i + 4:i + 8])[0]
+        entries.append((entryId, data[i + 8:i + 8 + size]))
+        i += 8 + size + (size & 1)
+    return entries
+
+def readWav(f, tags:Tags, withCover:bool):
+    fileSize = f.seek(0, 2)
+    info = Tags()
+    for chunkId, offset, size in list(wavChunks(f, fileSize)):
+        if chunkId in (b"id3 ", b"ID3 "):
+            readId3(f, offset, tags, withCover)
+        elif chunkId == b"LIST":
+            f.seek(offset)
+            if f.read(4) != b"INFO":
+                continue
+            f.seek(offset)
+            for entryId, value in infoEntries(readExactly(f.read, size)):
+                text = value.rstrip(b"\x00").decode("utf-8", errors="replace") or None
+                if entryId == b"INAM":
+                    info.title = text
+                elif entryId == b"IART":
+                    info.author = text
+    tags.title = tags.title or info.title  # the ID3 tag is more complete
+    tags.author = tags.author or info.author
+
+def writeWav(src, dst, changes:dict):
+    fileSize = src.seek(0, 2)
+    chunks = list(wavChunks(src, fileSize))
+    infoData = b"INFO"
+    id3Data = None
+    kept = []
+    for chunkId, offset, size in chunks:
+        src.seek(offset)
+        if chunkId == b"LIST" and src.read(4) == b"INFO":
+            src.seek(offset)
+            entries = infoEntries(readExactly(src.read, size))
+            for entryId, value in entries:
+                if (entryId == b"INAM" and "title" in changes) or (entryId == b"IART" and "author" in changes):
+                    continue
+                infoData += entryId + struct.pack("<I", len(value)) + value + (b"\x00" if len(value) & 1 else b"")
+        elif chunkId in (b"id3 ", b"ID3 "):
+            tag = readId3(src, offset, Tags(), False, keepFrames=True)
+            if tag is not None:
+                id3Data = buildId3(tag, changes)
+        else:
+            kept.append((chunkId, offset, size))
+    for entryId, key in ((b"INAM", "title"), (b"IART", "author")):
+        if key in changes:
+            value = changes[key].encode("utf-8") + b"\x00"
+            infoData += entryId + struct.pack("<I", len(value)) + value + (b"\x00" if len(value) & 1 else b"")
+    if id3Data is None and "cover" in changes:  # only an ID3 chunk can hold a cover
+        id3Data = buildId3(Id3Tag(), changes)
+    extra = [(b"LIST", infoData)] if len(infoData) > 4 else []
+    if id3Data is not None:
+        extra.append((b"id3 ", id3Data))
+    total = 4 + sum(8 + size + (size & 1) for _, _, size in kept) + sum(8 + len(data) + (len(data) & 1) for _, data in extra)
+    if total > 0xffffffff:
+        raise ValueError("the file is too big for a WAV file")
+    dst.write(b"RIFF" + struct.pack("<I", total) + b"WAVE")
+    for chunkId, offset, size in kept:
+        dst.write(chunkId + struct.pack("<I", size))
+        copyRange(src, dst, offset, size)
+        if size & 1:
+            dst.write(b"\x00")
+    for chunkId, data in extra:
+        dst.write(chunkId + struct.pack("<I", len(data)) + data + (b"\x00" if len(data) & 1 else b""))
+
+# MP3
+
+def readMp3(f, tags:Tags, withCover:bool):
+    readId3(f, 0, tags, withCover)
+
+def writeMp3(src, dst, changes:dict):
+    tag = readId3(src, 0, Tags(), False, keepFrames=True)
+    if tag is None:
+        tag, audioOffset = Id3Tag(), 0
+    else:
+        audioOffset = tag.size
+    dst.write(buildId3(tag, changes, tag.size))
+    copyRange(src, dst, audioOffset)
+
+tagReaders = {".mp3": readMp3, ".flac": readFlac, ".ogg": readOgg, ".m4a": readMp4, ".wav": readWav}
+tagWriters = {".mp3": writeMp3, ".flac": writeFlac, ".ogg": writeOgg, ".m4a": writeMp4, ".wav": writeWav}
+
+def readTags(musicPath:Path, withCover:bool=False) -> Tags:
+    """read the title, author and whether there is a cover, the cover itself is only read when asked for"""
+    reader = tagReaders.get(musicPath.suffix.lower())
+    if reader is None:
+        raise UnsupportedFormat(f"unsupported file format {musicPath.suffix}")
+    tags = Tags()
+    with open(musicPath, "rb") as f:
+        try:
+            reader(f, tags, withCover)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"broken tags: {e}") from e
+    return tags
+
+def writeTags(musicPath:Path, destination:Path, changes:dict):
+    """write a copy of a music file with some tags changed, the title, author or cover (image data, mimetype)"""
+    writer = tagWriters.get(musicPath.suffix.lower())
+    if writer is None:
+        raise UnsupportedFormat(f"unsupported file format {musicPath.suffix}")
+    with open(musicPath, "rb") as src, open(destination, "wb") as dst:
+        try:
+            writer(src, dst, changes)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"broken tags: {e}") from e
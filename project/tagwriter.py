@@ -0,0 +1,117 @@
+from constants import *
+from covers import storeThumbnail
+from instrumentation import metrics
+import tags
+from PyQt5 import QtCore
+from pathlib import Path
+import threading
+import logging
+import shutil
+import os
+
+log = logging.getLogger(__name__)
+
+def replaceContent(tempPath:Path, musicPath:Path):
+    """copy the content of a file over an open file that can't be replaced, then delete the copy"""
+    with open(tempPath, "rb") as src, open(musicPath, "r+b") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+        dst.truncate()
+    tempPath.unlink()
+
+@metrics.timed("writeTags")
+def writeTags(musicPath:Path, changes:dict):
+    """write a copy of a music file with the tag changes, then atomically replace the original with it"""
+    tempPath = musicPath.with_name(f".{musicPath.name}.{os.getpid()}.tmp")  # same folder so the rename is atomic
+    try:
+        tags.writeTags(musicPath, tempPath, changes)
+        shutil.copymode(musicPath, tempPath)
+        try:
+            os.replace(tempPath, musicPath)
+        except PermissionError:
+            # on Windows a file opened without FILE_SHARE_DELETE, like the music played by vlc, can't be replaced
+            # but can still be written, so the content is copied over it, which isn't atomic anymore
+            log.debug("can't replace the open file %s, overwriting its content", musicPath)
+            replaceContent(tempPath, musicPath)
+    except BaseException:
+        tempPath.unlink(missing_ok=True)
+        raise
+
+class TagWriteSignals(QtCore.QObject):
+    """signals used by the tag write jobs to report to the GUI thread"""
+    written = QtCore.pyqtSignal(Path, dict, object)  # music path, written values (with the new cover key), new stat
+    failed = QtCore.pyqtSignal(Path, str)  # music path, error message
+    jobDone = QtCore.pyqtSignal()
+
+class TagWriteJob(QtCore.QRunnable):
+    """a job writing all the pending tag changes of one music"""
+    def __init__(self, queue, musicPath:Path):
+        super().__init__()
+        self.queue = queue
+        self.musicPath = musicPath
+
+    def run(self):
+        changes = self.queue.takeChanges(self.musicPath)
+        try:
+            writeTags(self.musicPath, changes)
+            stat = self.musicPath.stat()
+            values = {key: value for key, value in changes.items() if key != "cover"}
+            if "cover" in changes:
+                values["coverKey"] = storeThumbnail(changes["cover"][0])  # stored once for all the musics given this cover
+            self.queue.signals.written.emit(self.musicPath, values, stat)
+        except Exception as e:
+            log.error("failed to write the tags of %s: %s", self.musicPath, e)
+            self.queue.signals.failed.emit(self.musicPath, str(e))
+        self.queue.signals.jobDone.emit()
+
+class TagWriteQueue(QtCore.QObject):
+    """write the tag changes in the background, one file at a time, merging the changes made to the same file"""
+    progress = QtCore.pyqtSignal(int, int)  # number of files done, total number of files
+    finished = QtCore.pyqtSignal(int, list)  # number of files written, list of (music path, error) that failed
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.lock = threading.Lock()
+        self.pendingChanges = {}  # music path -> changes not written yet
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)  # the writes are I/O bound, doing them in parallel would only thrash the disk
+        self.signals = TagWriteSignals()
+        self.signals.jobDone.connect(self.jobDone)
+        self.signals.failed.connect(lambda musicPath, error: self.errors.append((musicPath, error)))
+        self.total = 0  # number of files queued since the queue was idle
+        self.done = 0
+        self.errors = []
+
+    def enqueue(self, musics:list, changes:dict):
+        """queue tag changes for some musics, changes may contain "title", "author" and "cover" as (data, mimetype)"""
+        for music in musics:
+            with self.lock:
+                alreadyQueued = music in self.pendingChanges
+                self.pendingChanges.setdefault(music, {}).update(changes)
+            if not alreadyQueued:  # else the queued job will write the merged changes
+                self.total += 1
+                self.pool.start(TagWriteJob(self, music))
+        self.progress.emit(self.done, self.total)
+        log.info("queued tag changes %s for %d musics", list(changes), len(musics))
+
+    def takeChanges(self, musicPath:Path) -> dict:
+        """remove and return the pending changes of a music, called by the jobs"""
+        with self.lock:
+            return self.pendingChanges.pop(musicPath, {})
+
+    def jobDone(self):
+        self.done += 1
+        self.progress.emit(self.done, self.total)
+        if self.done == self.total:
+            log.info("wrote the tags of %d musics, %d failed", self.total - len(self.errors), len(self.errors))
+            self.finished.emit(self.total - len(self.errors), self.errors)
+            self.total = 0
+            self.done = 0
+            self.errors = []
+
+    def isBusy(self) -> bool:
+        """check if some changes aren't written yet"""
+        return self.total > self.done
+
+    def waitForDone(self):
+        """block until every queued change is written"""
+        self.pool.waitForDone()
@@ -0,0 +1,36 @@
+from constants import *
+import PyQt5.QtWidgets as qtw
+import logging
+
+log = logging.getLogger(__name__)
+
+# the styles depending on the state of the widgets are selected by dynamic properties, so the stylesheet is parsed
+# once for the whole application and a state change only restyles the widget it happened to
+styleSheet = f"""
+FolderWidget {{
+    border: 2px solid transparent;
+    border-radius: 10px;
+    background-color: transparent;
+}}
+FolderWidget[hovered="true"] {{
+    background-color: rgba(0, 0, 0, 64);
+}}
+FolderWidget[selected="true"] {{
+    border-color: {'white' if colorMode == 'dark' else 'black'};
+}}
+"""
+
+def applyTheme(app:qtw.QApplication):
+    """install the application stylesheet, before the widgets are created so they are polished only once"""
+    app.setStyleSheet(styleSheet)
+    log.debug("applied the %s theme", colorMode)
+
+def setStyleState(widget:qtw.QWidget, name:str, value:bool):
+    """change a dynamic property used by the stylesheet and restyle only this widget"""
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    style = widget.style()
+    style.unpolish(widget)
+    style.polish(widget)
+    widget.update()
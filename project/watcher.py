@@ -0,0 +1,153 @@
+from constants import *
+from workers import FolderListSignals, FolderListWorker
+from PyQt5 import QtCore
+from pathlib import Path
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+class LibraryWatcher(QtCore.QObject):
+    """watch the music folders and report the files added, removed or modified outside of the app
+
+    the folders only change when a file is added, removed or renamed in them, so the musics of the shown folder are
+    watched too, to see the ones rewritten in place. in recursive mode the new subfolders of the shown folder are
+    watched as soon as they appear, their musics being reported as added."""
+    folderChanged = QtCore.pyqtSignal(Path, list, list, list, int)  # folder, added, removed, modified, number of musics
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.snapshots = {}  # known state of the folders, folder -> {music path: (modification time, size)}
+        self.folders = set()  # the music folders of the config
+        self.currentFolder = None  # folder shown in the musics list, whose musics are watched
+        self.recursive = False  # whether the subfolders of the current folder are shown too
+        self.subfolders = set()  # nested folders of the current folder, watched in recursive mode
+        self.pendingFolders = set()  # folders that changed since the last diff
+        self.listingFolders = set()  # folders being listed in the background
+        self.pool = QtCore.QThreadPool(self)  # lists the changed folders, so a slow folder doesn't block the interface
+        self.pool.setMaxThreadCount(1)
+        self.listSignals = FolderListSignals()
+        self.listSignals.listed.connect(self.folderListed)
+        self.debounceTimer = QtCore.QTimer(self)  # groups the bursts of changes, like a copy of many files
+        self.debounceTimer.setSingleShot(True)
+        self.debounceTimer.setInterval(500)
+        self.watcher.directoryChanged.connect(self.pathChanged)
+        self.watcher.fileChanged.connect(lambda path: self.pathChanged(str(Path(path).parent)))
+        self.debounceTimer.timeout.connect(self.applyChanges)
+
+    def setFolders(self, folders:list):
+        """watch exactly the given music folders, along with the subfolders"""
+        self.folders = {Path(folder) for folder in folders}
+        self.updateWatchedPaths()
+
+    def setCurrentFolder(self, folder:Path, recursive:bool=False):
+        """watch the musics of the shown folder instead of the previous one, its subfolders are set once listed"""
+        self.currentFolder = folder
+        self.recursive = recursive
+        self.subfolders = set()
+        if self.watcher.files():
+            self.watcher.removePaths(self.watcher.files())
+        self.updateWatchedPaths()
+
+    def setSubfolders(self, subfolders:list):
+        """watch exactly the given nested folders along with the music folders, the previous ones are forgotten"""
+        self.subfolders = set(subfolders)
+        self.updateWatchedPaths()
+
+    def updateWatchedPaths(self):
+        """sync the watched paths with the music folders and the subfolders"""
+        folders = {str(folder) for folder in self.folders | self.subfolders}
+        watched = set(self.watcher.directories())
+        if watched - folders:
+            self.watcher.removePaths(list(watched - folders))
+        for folder in watched - folders:
+            self.snapshots.pop(Path(folder), None)
+        newFolders = [folder for folder in folders - watched if Path(folder).is_dir()]
+        if newFolders:
+            failed = self.watcher.addPaths(newFolders)
+            for folder in failed:
+                log.warning("can't watch the folder %s", folder)
+        log.debug("watching %d folders", len(self.watcher.directories()))
+
+    def isShown(self, folderPath:Path) -> bool:
+        """check if the musics of a folder are in the musics list"""
+        if self.currentFolder is None:
+            return False
+        return folderPath == self.currentFolder or (self.recursive and self.currentFolder in folderPath.parents)
+
+    def watchMusics(self, folderPath:Path, musics:dict):
+        """watch the musics of a shown folder, the replaced files aren't watched anymore so they are added again"""
+        if not self.isShown(folderPath):
+            return
+        watched = set(self.watcher.files())
+        newFiles = [str(music) for music in musics if str(music) not in watched]
+        if newFiles:
+            failed = self.watcher.addPaths(newFiles)
+            if failed:
+                log.warning("can't watch %d musics of the folder %s, their changes in place won't be seen", len(failed), folderPath)
+
+    def setSnapshot(self, folderPath:Path, musics:dict):
+        """set the known state of a folder, usually after listing it"""
+        self.snapshots[folderPath] = dict(musics)
+        self.watchMusics(folderPath, musics)
+
+    def updateSnapshot(self, musicPath:Path, stat:os.stat_result):
+        """update the known state of a music after the app itself modified it"""
+        snapshot = self.snapshots.get(musicPath.parent)
+        if snapshot is not None:
+            snapshot[musicPath] = (stat.st_mtime_ns, stat.st_size)
+
+    def pathChanged(self, path:str):
+        self.pendingFolders.add(Path(path))
+        self.debounceTimer.start()
+
+    def applyChanges(self):
+        """list the changed folders in the background, a folder already being listed is listed again afterwards"""
+        for folderPath in list(self.pendingFolders):
+            if folderPath in self.listingFolders:
+                continue  # still pending, relisted once the current listing is done
+            self.pendingFolders.discard(folderPath)
+            self.listingFolders.add(folderPath)
+            self.pool.start(FolderListWorker(folderPath, self.listSignals))
+
+    def folderListed(self, folderPath:Path, musics:dict, subfolders:list):
+        """diff a listed folder against its known state"""
+        self.listingFolders.discard(folderPath)
+        if folderPath in self.pendingFolders:
+            self.debounceTimer.start()  # it changed again during the listing
+        if str(folderPath) not in self.watcher.directories():
+            return  # not watched anymore
+        if self.recursive and self.isShown(folderPath):
+            self.addSubfolders(subfolders)
+        previous = self.snapshots.get(folderPath)
+        self.snapshots[folderPath] = musics
+        self.watchMusics(folderPath, musics)
+        if previous is None:  # nothing to compare with, only the number of musics is useful
+            self.folderChanged.emit(folderPath, [], [], [], len(musics))
+            return
+        added = [music for music in musics if music not in previous]
+        removed = [music for music in previous if music not in musics]
+        modified = [music for music in musics if music in previous and musics[music] != previous[music]]
+        if added or removed or modified:
+            log.info("folder %s changed: %d added, %d removed, %d modified", folderPath, len(added), len(removed), len(modified))
+            self.folderChanged.emit(folderPath, added, removed, modified, len(musics))
+
+    def addSubfolders(self, subfolders:list):
+        """watch the new subfolders of the shown folder and list them, all their musics being new"""
+        newFolders = [folder for folder in subfolders if folder not in self.subfolders and not folder.is_symlink()]  # a link may loop
+        if not newFolders:
+            return
+        for folder in newFolders:
+            self.subfolders.add(folder)
+            self.snapshots[folder] = {}
+            self.pendingFolders.add(folder)  # its own subfolders are found when it is listed
+        self.updateWatchedPaths()
+        self.debounceTimer.start()
+        log.info("watching %d new subfolders", len(newFolders))
+
+    def waitForDone(self):
+        """drop the pending listings and wait for the running one"""
+        self.debounceTimer.stop()
+        self.pool.clear()
+        self.pool.waitForDone()
@@ -1,11 +1,14 @@
 from constants import *
+from metadata import MusicMetadata
+from covers import CoverStore
+from instrumentation import metrics
+from icons import icons
+from theme import setStyleState
 import PyQt5.QtWidgets as qtw
-from PyQt5 import QtCore, QtGui, QtSvg
+from PyQt5 import QtCore, QtGui
+from operator import attrgetter
 from pathlib import Path
 import logging
-import eyed3
-import glob
-import vlc
 
 log = logging.getLogger(__name__)
 
@@ -18,15 +21,16 @@ class Separator(qtw.QFrame):
         elif orientation == QtCore.Qt.Vertical:
             self.setFrameShape(qtw.QFrame.VLine)
         else:
-            log.error(f"invalid orientation for the separator widget: {orientation} of type {type(orientation)}")
+            log.error("invalid orientation for the separator widget: %s of type %s", orientation, type(orientation))
         self.setFrameShadow(qtw.QFrame.Sunken)
 
 class SquareVectorLabel(qtw.QLabel):
-    """a widget that displays a square SVG image"""
-    def __init__(self, svgPath:Path, parent=None):
+    """a widget that displays a square SVG image of the theme, or a pixmap instead"""
+    def __init__(self, svgAsset:str, parent=None):
         super().__init__(parent)
-        self.svg_renderer = QtSvg.QSvgRenderer(str(svgPath))
+        self.svgAsset = svgAsset  # name of the image in the theme folder, rendered once per size by the icon registry
         self.svgRender = True
+        self.scaledPixmap = None  # (size, pixmap) of the pixmap scaled for the last paint, scaled again only on resize
         self.setAlignment(QtCore.Qt.AlignCenter)
         self.setSizePolicy(qtw.QSizePolicy.Expanding, qtw.QSizePolicy.Expanding)
         # We handle painting ourselves, so disable scaledContents.
@@ -34,7 +38,6 @@ class SquareVectorLabel(qtw.QLabel):
 
     def paintEvent(self, event):
         painter = QtGui.QPainter(self)
-        painter.setRenderHint(QtGui.QPainter.Antialiasing)
         rect = self.rect()
         side = min(rect.width(), rect.height())
         square_rect = QtCore.QRect(
@@ -45,17 +48,15 @@ class SquareVectorLabel(qtw.QLabel):
         )
         
         if self.svgRender:
-            painter.save()
-            painter.setClipRect(square_rect)
-            painter.translate(square_rect.topLeft())
-            self.svg_renderer.render(painter, QtCore.QRectF(0, 0, side, side))
-            painter.restore()
+            painter.drawPixmap(square_rect, icons.pixmap(self.svgAsset, square_rect.size(), self.devicePixelRatioF()))
         else:
             pixmap = self.pixmap()
             if pixmap:
-                scaled_pixmap = pixmap.scaled(
-                    square_rect.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation
-                )
+                if self.scaledPixmap is None or self.scaledPixmap[0] != square_rect.size():
+                    self.scaledPixmap = (square_rect.size(), pixmap.scaled(
+                        square_rect.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation
+                    ))
+                scaled_pixmap = self.scaledPixmap[1]
                 pixmap_rect = QtCore.QRect(
                     square_rect.x() + (square_rect.width() - scaled_pixmap.width()) // 2,
                     square_rect.y() + (square_rect.height() - scaled_pixmap.height()) // 2,
@@ -69,11 +70,13 @@ class SquareVectorLabel(qtw.QLabel):
         """if we set a pixmap, switch to the default behavior and deactivate the SVG renderer"""
         super().setPixmap(pixmap)
         self.svgRender = False
+        self.scaledPixmap = None
     
-    def setVector(self, svgPath:Path):
+    def setVector(self, svgAsset:str):
         """set the SVG image to display, reactivate the SVG renderer and update the widget"""
-        self.svg_renderer.load(str(svgPath))
+        self.svgAsset = svgAsset
         self.svgRender = True
+        self.scaledPixmap = None
         self.update()
 
 class MusicProgressBar(qtw.QProgressBar):
@@ -93,7 +96,7 @@ class MusicProgressBar(qtw.QProgressBar):
             value = self.minimum() + (self.maximum() - self.minimum()) * event.x() / self.width()
             self.clickedValue.emit(value)
             self.setValue(round(value))
-            log.debug(f"clicked on the progress bar at {round(value, 2)}")
+            log.debug("clicked on the progress bar at %.2f", value)
         super().mousePressEvent(event)
     
     def enterEvent(self, event):
@@ -115,7 +118,6 @@ class FolderWidget(qtw.QFrame):
         super().__init__(parent)
         # some variables
         self.isSelected = False  # track if the folder is selected
-        self.dictStyle = {}  # dictionary of styles for the folder widget
 
         # main layout
         self.folderPath = folderPath
@@ -126,7 +128,7 @@ class FolderWidget(qtw.QFrame):
         self.setLayout(self.mainLayout)
 
         # folder icon
-        self.iconLabel = SquareVectorLabel(themeAssetsDir / "icons" / "folder.svg")
+        self.iconLabel = SquareVectorLabel("icons/folder.svg")
         self.iconLabel.setFixedSize(100, 100)
         self.mainLayout.addWidget(self.iconLabel)
         
@@ -141,47 +143,34 @@ class FolderWidget(qtw.QFrame):
         self.folderNameLabel.setFont(Fonts.titleFont)
         self.labelsLayout.addWidget(self.folderNameLabel)
 
-        # number of music files
-        self.nbElements = 0
-        for dir in glob.glob(str(folderPath/"*")):
-            if Path(dir).is_file() and Path(dir).suffix in supportedAudioFormats:
-                self.nbElements += 1
-        self.nbElementsLabel = qtw.QLabel(f"{self.nbElements} Musics")
+        # number of music files, counted in the background
+        self.nbElements = None
+        self.nbElementsLabel = qtw.QLabel("… Musics")
         self.nbElementsLabel.setFont(Fonts.subtitleFont)
         self.labelsLayout.addWidget(self.nbElementsLabel)
 
         # remove folder button
         self.removeButton = qtw.QPushButton()
-        self.removeButton.setIcon(QtGui.QIcon(str(themeAssetsDir / "icons" / "remove.svg")))
+        self.removeButton.setIcon(icons.icon("icons/remove.svg"))
         self.removeButton.setFixedSize(30, 30)
         self.removeButton.setCursor(QtCore.Qt.PointingHandCursor)
         self.removeButton.clicked.connect(lambda: self.wasRemoved.emit(self.folderPath))
         self.mainLayout.addWidget(self.removeButton)
 
-        # mouse tracking
-        self.interiorWidgets = (self.iconLabel, self.labelsWidget, self.folderNameLabel, self.nbElementsLabel, self.removeButton)
-        self.updateStyle("border-radius", "10px")
-        self.updateStyle("border", "2px solid rgba(0, 0, 0, 0)")
+        # mouse tracking, the hover and selection styles are in the application stylesheet
+        self.setProperty("hovered", False)
+        self.setProperty("selected", False)
         self.setMouseTracking(True)
         self.enterEvent = self.onEnter
         self.leaveEvent = self.onLeave
 
         self.mousePressEvent = self.onMousePress
-    
-    def updateStyle(self, key, value):
-        """update one specific style element of the folder widget"""
-        self.dictStyle[key] = value
-        styleString = ""
-        for key, value in self.dictStyle.items():
-            styleString += f"{key}: {value};"
-        self.setStyleSheet(styleString)
-        # remove the style for the inner widgets
-        for widget in self.interiorWidgets:
-            emptyStyleString = ""
-            for key in self.dictStyle.keys():
-                emptyStyleString += f"{key}: none;"
-            widget.setStyleSheet(emptyStyleString)
 
+    def setMusicCount(self, count:int):
+        """update the displayed number of musics, None while it is being counted"""
+        self.nbElements = count
+        self.nbElementsLabel.setText(f"{'…' if count is None else count} Musics")
+    
     def onMousePress(self, event):
         if not self.isSelected:
             self.setSelected(True)
@@ -197,159 +186,337 @@ class FolderWidget(qtw.QFrame):
     
     def setHovered(self, hovered:bool):
         """gray out the frame on hover"""
-        if hovered:
-            self.updateStyle("background-color", "rgba(0, 0, 0, 64)")
-        else:
-            self.updateStyle("background-color", "rgba(0, 0, 0, 0)")
+        setStyleState(self, "hovered", hovered)
 
     def setSelected(self, selected:bool):
         """outline the frame if selected"""
+        setStyleState(self, "selected", selected)
+        self.isSelected = selected
         if selected:
-            self.setFrameShape(qtw.QFrame.Box)
-            self.updateStyle("border", f"2px solid {'white' if colorMode == 'dark' else 'black'}")
-            self.isSelected = True
             self.wasSelected.emit(self.folderPath)
-        else:
-            self.setFrameShape(qtw.QFrame.NoFrame)
-            self.updateStyle("border", "2px solid rgba(0, 0, 0, 0)")
-            self.isSelected = False
 
-class MusicWidget(qtw.QFrame):
-    """a widget that displays a music and its infos in the panel"""
-    wasSelected = QtCore.pyqtSignal(Path) # signal emitted when the music is selected
-
-    def __init__(self, musicPath:Path, parent=None):
+class DebugOverlay(qtw.QLabel):
+    """a panel drawn over the window with the live timings of the hot paths"""
+    def __init__(self, parent:qtw.QWidget):
         super().__init__(parent)
-        # some variables
-        self.isSelected = False  # track if the music is selected
-        self.dictStyle = {}  # dictionary of styles for the music widget
+        self.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 200); color: white; padding: 8px; border-radius: 5px;")
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+        self.refreshTimer = QtCore.QTimer(self)
+        self.refreshTimer.setInterval(500)
+        self.refreshTimer.timeout.connect(self.refresh)
+        self.hide()
+
+    def toggle(self):
+        """show or hide the overlay, it is only refreshed while shown"""
+        if self.isVisible():
+            self.refreshTimer.stop()
+            self.hide()
+        else:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.refreshTimer.start()
+
+    def refresh(self):
+        """show the latest timings in the top right corner"""
+        lines = [f"{'operation (ms)':<20}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}"]
+        for name, summary in metrics.snapshot().items():
+            lines.append(f"{name:<20}{summary['count']:>7}{summary['p50']:>9.1f}{summary['p95']:>9.1f}{summary['max']:>9.1f}")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.move(self.parentWidget().width() - self.width() - 10, 10)
+
+class MusicRecord():
+    """a compact row of the musics list, holding the infos of one music"""
+    __slots__ = ("musicPath", "title", "author", "time", "coverKey", "hasCover", "metadataLoaded", "titleKey", "authorKey")
+
+    def __init__(self, musicPath:Path):
+        self.musicPath = musicPath
         self.title = musicPath.stem  # title of the music
         self.author = None  # author of the music
+        self.titleKey = self.title.lower().strip()  # normalized title used to sort
+        self.authorKey = None  # normalized author used to sort, None if there is no author
         self.time = 0  # duration of the music in seconds
-        self.coverImage = None  # cover image binary data of the music
-
-        # main layout
-        self.musicPath = musicPath
-        self.mainLayout = qtw.QHBoxLayout()
-        self.mainLayout.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
-        self.setSizePolicy(qtw.QSizePolicy.Expanding, qtw.QSizePolicy.Fixed)
-        self.setCursor(QtCore.Qt.PointingHandCursor)
-        self.setLayout(self.mainLayout)
-
-        # music cover
-        self.coverLabel = SquareVectorLabel(themeAssetsDir / "icons" / "cover.svg")
-        self.coverLabel.setFixedSize(100, 100)
-        self.mainLayout.addWidget(self.coverLabel)
-        
-        # music name and author
-        self.labelsWidget = qtw.QWidget()
-        self.labelsLayout = qtw.QVBoxLayout()
-        self.labelsWidget.setLayout(self.labelsLayout)
-        self.mainLayout.addWidget(self.labelsWidget)
-
-        # music name
-        self.musicNameLabel = qtw.QLabel(self.title)
-        self.musicNameLabel.setFont(Fonts.titleFont)
-        self.labelsLayout.addWidget(self.musicNameLabel)
-
-        # music author
-        self.authorLabel = qtw.QLabel("[Author]")
-        self.authorLabel.setFont(Fonts.subtitleFont)
-        self.labelsLayout.addWidget(self.authorLabel)
-
-        self.mainLayout.addStretch()
-
-        # music length
-        self.lengthLabel = qtw.QLabel("[0:00]")
-        self.lengthLabel.setFont(Fonts.titleFont)
-        self.mainLayout.addWidget(self.lengthLabel)
-
-        self.fetchMetadata()  # fetch the metadata of the music
-
-        # mouse tracking
-        self.interiorWidgets = (self.coverLabel, self.labelsWidget, self.musicNameLabel, self.authorLabel, self.lengthLabel)
-        self.updateStyle("border-radius", "10px")
-        self.updateStyle("border", "2px solid rgba(0, 0, 0, 0)")
-        self.setMouseTracking(True)
-        self.enterEvent = self.onEnter
-        self.leaveEvent = self.onLeave
-
-        self.mousePressEvent = self.onMousePress
-    
-    def fetchMetadata(self):
-        """fetch the metadata of the music and update the widgets accordingly"""
-        try:
-            # get duration with vlc
-            media = vlc.Media(str(self.musicPath))
-            media.parse()
-            self.time = int(media.get_duration() / 1000)
-            self.lengthLabel.setText(f"{self.time//60}:{self.time%60:02}")
-
-            # get metadata with eyed3
-            audioFile = eyed3.load(str(self.musicPath))
-            if audioFile.tag is None:
-                audioFile.initTag()
-            if audioFile.tag.title:
-                self.title = audioFile.tag.title
-                self.musicNameLabel.setText(self.title)
-            if audioFile.tag.artist:
-                self.author = audioFile.tag.artist
-                self.authorLabel.setText(self.author)
+        self.coverKey = None  # hash of the cover, None if the music has no cover or it wasn't read yet
+        self.hasCover = False
+        self.metadataLoaded = False  # whether the metadata was received, placeholders are shown until then
+
+    def setMetadata(self, metadata:MusicMetadata):
+        """replace the placeholders with the fetched metadata of the music"""
+        self.metadataLoaded = True
+        self.title = metadata.title
+        self.author = metadata.author
+        self.time = metadata.time
+        self.coverKey = metadata.coverKey
+        self.hasCover = metadata.hasCover
+        self.titleKey = self.title.lower().strip()
+        self.authorKey = self.author.lower().strip() if self.author else None
+
+def sortMusicRecords(records:list, sortMode:str):
+    """sort some music records in place with their precomputed keys"""
+    reverse = True if sortMode[0] == "-" else False
+    records.sort(key=attrgetter("titleKey"), reverse=(reverse if sortMode[1:] == "title" else False))  # always do a first sort by title
+    if sortMode[1:] == "author":
+        noAuthor = chr(0) if reverse else chr(0x10ffff)  # the musics without author always go at the bottom
+        records.sort(key=lambda x: noAuthor if x.authorKey is None else x.authorKey, reverse=reverse)
+    elif sortMode[1:] == "time":
+        records.sort(key=attrgetter("time"), reverse=reverse)
+
+class MusicListModel(QtCore.QAbstractListModel):
+    """a model holding the musics of the selected folder, in display order"""
+    recordRole = QtCore.Qt.UserRole  # role returning the MusicRecord of a row
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []  # music records in display order
+        self.rowByPath = {}  # row of each music path
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def data(self, index:QtCore.QModelIndex, role:int=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        if role == self.recordRole:
+            return record
+        if role == QtCore.Qt.DisplayRole:
+            return record.title
+        if role == QtCore.Qt.ToolTipRole:
+            return str(record.musicPath)
+        return None
+
+    def setMusics(self, musics:list):
+        """replace the content of the model with placeholder records for the given music paths"""
+        self.beginResetModel()
+        self.records = [MusicRecord(music) for music in musics]
+        self.rowByPath = {record.musicPath: row for row, record in enumerate(self.records)}
+        self.endResetModel()
+
+    def setRecords(self, records:list):
+        """replace the content of the model with existing records, like search results"""
+        self.beginResetModel()
+        self.records = list(records)
+        self.rowByPath = {record.musicPath: row for row, record in enumerate(self.records)}
+        self.endResetModel()
+
+    def addMusics(self, musics:list):
+        """append placeholder records for new music paths, the model should be sorted afterwards"""
+        musics = [music for music in musics if music not in self.rowByPath]
+        if not musics:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), len(self.records), len(self.records) + len(musics) - 1)
+        for music in musics:
+            self.rowByPath[music] = len(self.records)
+            self.records.append(MusicRecord(music))
+        self.endInsertRows()
+
+    def removeMusics(self, musics:list):
+        """remove the records of the given music paths"""
+        rows = sorted({self.rowByPath[music] for music in musics if music in self.rowByPath})
+        if not rows:
+            return
+        if len(rows) > len(self.records) // 4:  # many scattered rows, rebuilding the list is cheaper than the removals
+            removed = set(rows)
+            self.beginResetModel()
+            self.records = [record for row, record in enumerate(self.records) if row not in removed]
+            self.rowByPath = {record.musicPath: row for row, record in enumerate(self.records)}
+            self.endResetModel()
+            return
+        ranges = []  # contiguous (first, last) rows, removed from the bottom so the rows above keep their number
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
             else:
-                self.authorLabel.setVisible(False)
-            if audioFile.tag.images:
-                # display the cover image
-                self.coverImage = audioFile.tag.images[0]
-                coverPixmap = QtGui.QPixmap()
-                coverPixmap.loadFromData(self.coverImage.image_data)
-                scaledPixmap = coverPixmap.scaled(self.coverLabel.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
-                self.coverLabel.setPixmap(scaledPixmap)
-                
-        except Exception as e:
-            log.error(f"failed to fetch metadata for {self.musicPath}: {e}")
-    
-    def updateStyle(self, key, value):
-        """update one specific style element of the folder widget"""
-        self.dictStyle[key] = value
-        styleString = ""
-        for key, value in self.dictStyle.items():
-            styleString += f"{key}: {value};"
-        self.setStyleSheet(styleString)
-        # remove the style for the inner widgets
-        for widget in self.interiorWidgets:
-            emptyStyleString = ""
-            for key in self.dictStyle.keys():
-                emptyStyleString += f"{key}: none;"
-            widget.setStyleSheet(emptyStyleString)
-
-    def onMousePress(self, event):
-        if not self.isSelected:
-            self.setSelected(True)
-        event.accept()
+                ranges.append([row, row])
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self.records[first:last + 1]
+            self.endRemoveRows()
+        self.rowByPath = {record.musicPath: row for row, record in enumerate(self.records)}
+
+    def record(self, musicPath:Path) -> MusicRecord:
+        """return the record of a music, or None if it isn't in the model"""
+        row = self.rowByPath.get(musicPath)
+        return None if row is None else self.records[row]
+
+    def setMetadata(self, musicPath:Path, metadata:MusicMetadata):
+        """update the record of a music with its metadata and repaint its row"""
+        row = self.rowByPath.get(musicPath)
+        if row is None:
+            return
+        self.records[row].setMetadata(metadata)
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def sortRecords(self, sortMode:str):
+        """sort the records in place with their precomputed keys, keeping the selection on the same musics"""
+        self.layoutAboutToBeChanged.emit()
+        persistentIndexes = self.persistentIndexList()
+        persistentPaths = [self.records[index.row()].musicPath for index in persistentIndexes]
+
+        sortMusicRecords(self.records, sortMode)
+        self.rowByPath = {record.musicPath: row for row, record in enumerate(self.records)}
+
+        self.changePersistentIndexList(persistentIndexes, [self.index(self.rowByPath[path]) for path in persistentPaths])
+        self.layoutChanged.emit()
+
+class MusicDelegate(qtw.QStyledItemDelegate):
+    """a delegate that paints a music row with its cover, title, author and length"""
+    padding = 10  # space between the row border and its content
+    spacing = 10  # space between the cover and the texts
+
+    def __init__(self, coverStore:CoverStore, parent=None):
+        super().__init__(parent)
+        self.coverStore = coverStore  # the thumbnails are decoded lazily, only for the painted rows
+        self.coverSize = coverThumbnailSize
+        self.titleMetrics = QtGui.QFontMetrics(Fonts.titleFont)
+        self.subtitleMetrics = QtGui.QFontMetrics(Fonts.subtitleFont)
 
-    def onEnter(self, event):
-        self.setHovered(True)
-        event.accept()
+    def sizeHint(self, option:qtw.QStyleOptionViewItem, index:QtCore.QModelIndex) -> QtCore.QSize:
+        return QtCore.QSize(option.rect.width(), self.coverSize + 2*self.padding)
 
-    def onLeave(self, event):
-        self.setHovered(False)
-        event.accept()
-    
-    def setHovered(self, hovered:bool):
-        """gray out the frame on hover"""
-        if hovered:
-            self.updateStyle("background-color", "rgba(0, 0, 0, 64)")
+    def paint(self, painter:QtGui.QPainter, option:qtw.QStyleOptionViewItem, index:QtCore.QModelIndex):
+        record = index.data(MusicListModel.recordRole)
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        frameRect = QtCore.QRectF(option.rect).adjusted(1, 1, -1, -1)
+
+        # gray out the row on hover and outline it if selected
+        if option.state & qtw.QStyle.State_MouseOver:
+            painter.setPen(QtCore.Qt.NoPen)
+            painter.setBrush(QtGui.QColor(0, 0, 0, 64))
+            painter.drawRoundedRect(frameRect, 10, 10)
+        if option.state & qtw.QStyle.State_Selected:
+            painter.setPen(QtGui.QPen(QtGui.QColor("white" if colorMode == "dark" else "black"), 2))
+            painter.setBrush(QtCore.Qt.NoBrush)
+            painter.drawRoundedRect(frameRect, 10, 10)
+
+        # cover
+        coverRect = QtCore.QRect(option.rect.left() + self.padding, option.rect.top() + self.padding, self.coverSize, self.coverSize)
+        cover = self.coverStore.pixmap(record.coverKey, record.musicPath) if record.hasCover else None
+        if cover is None:
+            cover = icons.pixmap("icons/cover.svg", coverRect.size(), painter.device().devicePixelRatioF())  # no cover, or its thumbnail is still being decoded
+        pixmapSize = cover.size().scaled(coverRect.size(), QtCore.Qt.KeepAspectRatio)
+        pixmapRect = QtCore.QRect(QtCore.QPoint(0, 0), pixmapSize)
+        pixmapRect.moveCenter(coverRect.center())
+        painter.drawPixmap(pixmapRect, cover)
+
+        # length on the right
+        painter.setPen(option.palette.color(QtGui.QPalette.Text))
+        lengthText = f"{record.time//60}:{record.time%60:02}" if record.metadataLoaded else "-:--"
+        lengthWidth = self.titleMetrics.horizontalAdvance(lengthText)
+        lengthRect = QtCore.QRect(option.rect.right() - self.padding - lengthWidth, option.rect.top(), lengthWidth, option.rect.height())
+        painter.setFont(Fonts.titleFont)
+        painter.drawText(lengthRect, QtCore.Qt.AlignVCenter | QtCore.Qt.AlignRight, lengthText)
+
+        # title and author in the middle
+        textLeft = coverRect.right() + self.spacing
+        textWidth = max(0, lengthRect.left() - self.spacing - textLeft)
+        author = record.author if record.metadataLoaded else "..."
+        titleHeight = self.titleMetrics.height()
+        textHeight = titleHeight + (self.subtitleMetrics.height() if author else 0)
+        textTop = option.rect.top() + (option.rect.height() - textHeight) // 2
+        painter.drawText(QtCore.QRect(textLeft, textTop, textWidth, titleHeight), QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                         self.titleMetrics.elidedText(record.title, QtCore.Qt.ElideRight, textWidth))
+        if author:
+            painter.setFont(Fonts.subtitleFont)
+            painter.drawText(QtCore.QRect(textLeft, textTop + titleHeight, textWidth, self.subtitleMetrics.height()), QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                             self.subtitleMetrics.elidedText(author, QtCore.Qt.ElideRight, textWidth))
+        painter.restore()
+
+class MusicListView(qtw.QListView):
+    """a virtualized list of musics that only paints the visible rows"""
+    wasSelected = QtCore.pyqtSignal(Path) # signal emitted when a music is selected
+    playNextRequested = QtCore.pyqtSignal(list)  # musics to play after the current one, from the context menu
+    addToQueueRequested = QtCore.pyqtSignal(list)  # musics to play after the queued ones, from the context menu
+
+    def __init__(self, coverStore:CoverStore, parent=None):
+        super().__init__(parent)
+        self.setItemDelegate(MusicDelegate(coverStore, self))
+        coverStore.thumbnailReady.connect(self.viewport().update)
+        self.setUniformItemSizes(True)  # all rows have the same height, so the layout doesn't need to measure them
+        self.setSpacing(2)
+        self.setFrameShape(qtw.QFrame.NoFrame)
+        self.setSelectionMode(qtw.QAbstractItemView.NoSelection)  # the selection only changes through selectMusic and the modifier clicks
+        self.setEditTriggers(qtw.QAbstractItemView.NoEditTriggers)
+        self.setFocusPolicy(QtCore.Qt.NoFocus)  # let the window handle the keyboard shortcuts
+        self.setVerticalScrollMode(qtw.QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(QtCore.Qt.WA_Hover)
+        self.viewport().setCursor(QtCore.Qt.PointingHandCursor)
+
+    def setModel(self, model:MusicListModel):
+        super().setModel(model)
+        self.resetSelection = ([], None)  # selected paths and current path, kept while the model is reset
+        model.modelAboutToBeReset.connect(self.saveSelection)
+        model.modelReset.connect(self.restoreSelection)
+
+    def saveSelection(self):
+        """remember the selected musics before the model is reset"""
+        selection = self.selectionModel()
+        current = selection.currentIndex()
+        self.resetSelection = (self.selectedMusics(), self.model().records[current.row()].musicPath if current.isValid() else None)
+
+    def restoreSelection(self):
+        """select again the musics still in the model after a reset, without emitting the selection signal"""
+        musics, current = self.resetSelection
+        self.resetSelection = ([], None)
+        model = self.model()
+        selection = self.selectionModel()
+        if current in model.rowByPath:
+            selection.setCurrentIndex(model.index(model.rowByPath[current]), QtCore.QItemSelectionModel.NoUpdate)
+        for music in musics:
+            row = model.rowByPath.get(music)
+            if row is not None:
+                selection.select(model.index(row), QtCore.QItemSelectionModel.Select)
+
+    def mousePressEvent(self, event:QtGui.QMouseEvent):
+        """select the clicked music, ctrl+click and shift+click add musics to the selection for batch edits"""
+        index = self.indexAt(event.pos())
+        if event.button() == QtCore.Qt.LeftButton and index.isValid():
+            selection = self.selectionModel()
+            if event.modifiers() & QtCore.Qt.ControlModifier:
+                selection.select(index, QtCore.QItemSelectionModel.Toggle)
+            elif event.modifiers() & QtCore.Qt.ShiftModifier and selection.currentIndex().isValid():
+                selection.select(QtCore.QItemSelection(selection.currentIndex(), index), QtCore.QItemSelectionModel.Select)
+            elif not selection.isSelected(index) or len(selection.selectedIndexes()) > 1:
+                self.selectMusic(index.data(MusicListModel.recordRole).musicPath)
+            event.accept()
         else:
-            self.updateStyle("background-color", "rgba(0, 0, 0, 0)")
-
-    def setSelected(self, selected:bool):
-        """outline the frame if selected"""
-        if selected:
-            self.setFrameShape(qtw.QFrame.Box)
-            self.updateStyle("border", f"2px solid {'white' if colorMode == 'dark' else 'black'}")
-            self.isSelected = True
-            self.wasSelected.emit(self.musicPath)
+            super().mousePressEvent(event)
+
+    def contextMenuEvent(self, event:QtGui.QContextMenuEvent):
+        """queue the clicked music, or the selected ones if it is part of the selection"""
+        index = self.indexAt(event.pos())
+        if not index.isValid():
+            return
+        if self.selectionModel().isSelected(index):
+            musics = self.selectedMusics()
         else:
-            self.setFrameShape(qtw.QFrame.NoFrame)
-            self.updateStyle("border", "2px solid rgba(0, 0, 0, 0)")
-            self.isSelected = False
+            musics = [index.data(MusicListModel.recordRole).musicPath]
+        menu = qtw.QMenu(self)
+        playNextAction = menu.addAction("Play Next")
+        addToQueueAction = menu.addAction("Add to Queue")
+        action = menu.exec_(event.globalPos())
+        if action == playNextAction:
+            self.playNextRequested.emit(musics)
+        elif action == addToQueueAction:
+            self.addToQueueRequested.emit(musics)
+
+    def selectMusic(self, musicPath:Path):
+        """select a music, scroll to it and emit the selection signal"""
+        row = self.model().rowByPath.get(musicPath)
+        if row is None:
+            return
+        index = self.model().index(row)
+        self.selectionModel().setCurrentIndex(index, QtCore.QItemSelectionModel.ClearAndSelect)
+        self.scrollTo(index)
+        self.wasSelected.emit(musicPath)
+
+    def selectedMusics(self) -> list:
+        """return the paths of the selected musics, in the list order"""
+        rows = sorted(index.row() for index in self.selectionModel().selectedIndexes())
+        return [self.model().records[row].musicPath for row in rows]
@@ -0,0 +1,131 @@
+from constants import *
+from metadata import loadMetadata
+from scanner import countMusics, scanDirectory, walkMusics
+from library import buildLibraryIndex
+from instrumentation import metrics
+from PyQt5 import QtCore
+from pathlib import Path
+import logging
+
+log = logging.getLogger(__name__)
+
+class MetadataScan():
+    """a batch of metadata extraction jobs for one folder, which can be cancelled as a whole"""
+    def __init__(self, folderPath:Path, total:int):
+        self.folderPath = folderPath
+        self.total = total  # number of musics to scan
+        self.done = 0  # number of musics already scanned
+        self.cancelled = False  # set to True when the results are not needed anymore
+        self.knownStates = {}  # (modification time, size) of the musics shown from the cache before the listing
+        self.listed = set()  # musics found by the listing
+
+    def cancel(self):
+        """stop the remaining jobs of this scan"""
+        self.cancelled = True
+
+class FolderScanSignals(QtCore.QObject):
+    """signals used by the folder scan worker to stream the listed musics to the GUI thread"""
+    found = QtCore.pyqtSignal(object, Path, dict)  # scan, folder path, {music path: (modification time, size)}, maybe empty
+    finished = QtCore.pyqtSignal(object, list)  # scan, every folder listed
+
+class FolderScanWorker(QtCore.QRunnable):
+    """a job that lists the musics of a folder, and of its subfolders in recursive mode, in a worker thread"""
+    def __init__(self, scan:MetadataScan, signals:FolderScanSignals, recursive:bool=False):
+        super().__init__()
+        self.scan = scan
+        self.signals = signals
+        self.recursive = recursive
+
+    def run(self):
+        folders = []
+        def found(dirPath:Path, musics:dict):
+            folders.append(dirPath)
+            self.signals.found.emit(self.scan, dirPath, musics)
+        with metrics.measure("listFolder"):
+            walkMusics(self.scan.folderPath, found, self.recursive, lambda: self.scan.cancelled, emptyFolders=True)  # all of them are watched
+        if not self.scan.cancelled:
+            self.signals.finished.emit(self.scan, folders)
+
+class FolderListSignals(QtCore.QObject):
+    """signals used by the folder list workers to send the listed musics to the GUI thread"""
+    listed = QtCore.pyqtSignal(Path, dict, list)  # folder path, {music path: (modification time, size)}, subfolders
+
+class FolderListWorker(QtCore.QRunnable):
+    """a job that lists the musics and the subfolders of a single folder in a worker thread"""
+    def __init__(self, folderPath:Path, signals:FolderListSignals):
+        super().__init__()
+        self.folderPath = folderPath
+        self.signals = signals
+
+    def run(self):
+        with metrics.measure("listFolder"):
+            musics, subfolders = scanDirectory(self.folderPath)
+        self.signals.listed.emit(self.folderPath, musics, subfolders)
+
+class MetadataSignals(QtCore.QObject):
+    """signals used by the metadata workers to send their results to the GUI thread"""
+    loaded = QtCore.pyqtSignal(object, Path, object)  # scan, music path, metadata
+
+class MetadataWorker(QtCore.QRunnable):
+    """a job that fetches the metadata of one music in a worker thread"""
+    def __init__(self, scan:MetadataScan, musicPath:Path, signals:MetadataSignals, metadataCache=None):
+        super().__init__()
+        self.scan = scan
+        self.musicPath = musicPath
+        self.signals = signals
+        self.metadataCache = metadataCache
+
+    def run(self):
+        if self.scan.cancelled:
+            return
+        metadata = loadMetadata(self.musicPath, self.metadataCache)
+        if not self.scan.cancelled:
+            self.signals.loaded.emit(self.scan, self.musicPath, metadata)
+
+class FolderCountSignals(QtCore.QObject):
+    """signals used by the folder count workers to send their results to the GUI thread"""
+    counted = QtCore.pyqtSignal(Path, int)  # folder path, number of musics
+
+class FolderCountWorker(QtCore.QRunnable):
+    """a job that counts the musics of a folder in a worker thread, reusing the cached count if the folder didn't change"""
+    def __init__(self, folderPath:Path, signals:FolderCountSignals, metadataCache=None, recursive:bool=False):
+        super().__init__()
+        self.folderPath = folderPath
+        self.signals = signals
+        self.metadataCache = metadataCache
+        self.recursive = recursive
+
+    def run(self):
+        try:
+            stat = self.folderPath.stat()  # adding, removing or renaming a file changes the folder modification time
+        except OSError as e:
+            log.error("failed to access the folder %s: %s", self.folderPath, e)
+            self.signals.counted.emit(self.folderPath, 0)
+            return
+        if self.recursive:  # the folder modification time doesn't change with the nested folders, so it can't be cached
+            self.signals.counted.emit(self.folderPath, countMusics(self.folderPath, recursive=True))
+            return
+        count = self.metadataCache.getFolderCount(self.folderPath, stat) if self.metadataCache else None
+        if count is None:
+            count = countMusics(self.folderPath)
+            if self.metadataCache:
+                self.metadataCache.putFolderCount(self.folderPath, stat, count)
+        self.signals.counted.emit(self.folderPath, count)
+
+class LibraryIndexSignals(QtCore.QObject):
+    """signals used by the library index worker to send the built index to the GUI thread"""
+    built = QtCore.pyqtSignal(int, object)  # build number, index
+
+class LibraryIndexWorker(QtCore.QRunnable):
+    """a job that lists all the folders and indexes their musics in a worker thread"""
+    def __init__(self, build:int, folders:list, signals:LibraryIndexSignals, metadataCache=None, recursive:bool=False):
+        super().__init__()
+        self.build = build
+        self.folders = folders
+        self.signals = signals
+        self.metadataCache = metadataCache
+        self.recursive = recursive
+
+    def run(self):
+        index = buildLibraryIndex(self.folders, self.recursive, self.metadataCache)
+        self.signals.built.emit(self.build, index)
@@ -0,0 +1,29 @@
+from config import ConfigStore, defaultConfig
+import logging
+import json
+
+def test_load_corrupt_config_without_backup(tmp_path, caplog):
+    path = tmp_path / "config.json"
+    path.write_text('{"folders": ["C:/Music"], "loop": ')  # cut in the middle of a write
+    store = ConfigStore(path, tmp_path / "config.json.bak")
+    with caplog.at_level(logging.WARNING):
+        store.load()
+    assert store.data == defaultConfig()
+    assert (tmp_path / "config.json.corrupt").read_text() == '{"folders": ["C:/Music"], "loop": '
+    assert not path.exists()  # moved aside before any save
+    assert any(record.levelno == logging.WARNING and "config.json.corrupt" in record.getMessage() for record in caplog.records)
+    store.flush()
+    assert json.loads(path.read_text()) == defaultConfig()
+    assert (tmp_path / "config.json.corrupt").read_text() == '{"folders": ["C:/Music"], "loop": '
+
+def test_load_corrupt_config_with_backup(tmp_path):
+    path = tmp_path / "config.json"
+    backupPath = tmp_path / "config.json.bak"
+    path.write_text("not json")
+    backupPath.write_text(json.dumps(dict(defaultConfig(), sort="-time")))
+    store = ConfigStore(path, backupPath)
+    store.load()
+    assert store["sort"] == "-time"
+    assert (tmp_path / "config.json.corrupt").read_text() == "not json"
+    store.flush()
+    assert json.loads(path.read_text())["sort"] == "-time"
@@ -0,0 +1,290 @@
+from durations import probeDuration
+import tags
+import pytest
+import struct
+import random
+import io
+
+# round trips of each tag writer on small files built here, the fields that aren't edited must be left unchanged
+
+random.seed(0)
+mpegFrame = b"\xff\xfb\x90\x64" + bytes(413)  # a silent MPEG-1 layer III frame, 128 kbps at 44.1 kHz
+audioData = bytes(random.getrandbits(8) for _ in range(3000))
+coverData = b"\x89PNG\r\n\x1a\n" + bytes(random.getrandbits(8) for _ in range(70000))  # spans several ogg pages once encoded
+
+def writeCopy(tmp_path, name:str, data:bytes, changes:dict):
+    """write a music file, edit its tags into a copy and return the bytes of the copy"""
+    src, dst = tmp_path / name, tmp_path / f"edited{name}"
+    src.write_bytes(data)
+    tags.writeTags(src, dst, changes)
+    assert probeDuration(dst) == probeDuration(src)
+    return dst.read_bytes()
+
+# ID3v2
+
+def toSyncsafe(value:int) -> bytes:
+    return bytes(((value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f))
+
+def id3Tag(major:int, frames:list, padding:int=64) -> bytes:
+    body = b""
+    for frameId, frameFlags, data in frames:
+        if major == 2:
+            body += frameId + len(data).to_bytes(3, "big") + data
+        else:
+            body += frameId + (toSyncsafe(len(data)) if major == 4 else struct.pack(">I", len(data))) + frameFlags + data
+    body += bytes(padding)
+    return b"ID3" + bytes((major, 0, 0)) + toSyncsafe(len(body)) + body
+
+def id3Frames(data:bytes) -> tuple:
+    """return the major version and the (id, flags, data) of the frames of the tag at the start of a file"""
+    tag = tags.readId3(io.BytesIO(data), 0, tags.Tags(), False, keepFrames=True)
+    return tag.major, tag.frames
+
+def test_id3v22_round_trip(tmp_path):
+    frames = [(b"TT2", b"", b"\x00Old title"), (b"TP1", b"", b"\x00Artist"), (b"TAL", b"", b"\x00Album"),
+              (b"COM", b"", b"\x00eng\x00A comment"), (b"PIC", b"", b"\x00JPG\x03\x00jpeg data"), (b"XYZ", b"", b"unknown")]
+    edited = writeCopy(tmp_path, "music.mp3", id3Tag(2, frames) + mpegFrame * 10, {"author": "New artist"})
+    major, editedFrames = id3Frames(edited)
+    assert major == 2
+    assert [frame for frame in editedFrames if frame[0] != b"TP1"] == [frame for frame in frames if frame[0] != b"TP1"]
+    written = tags.readTags(tmp_path / "editedmusic.mp3")
+    assert (written.title, written.author) == ("Old title", "New artist")
+    assert edited.endswith(mpegFrame * 10)
+
+def test_id3v22_cover(tmp_path):
+    frames = [(b"TT2", b"", b"\x00Old title"), (b"PIC", b"", b"\x00JPG\x03\x00jpeg data"), (b"PIC", b"", b"\x00PNG\x04\x00back")]
+    edited = writeCopy(tmp_path, "music.mp3", id3Tag(2, frames) + mpegFrame * 10, {"cover": (b"new cover", "image/png")})
+    major, editedFrames = id3Frames(edited)
+    assert major == 2
+    assert editedFrames == [frames[0], frames[2], (b"PIC", b"", b"\x00PNG\x03\x00new cover")]
+    assert tags.readTags(tmp_path / "editedmusic.mp3", withCover=True).cover == b"new cover"
+
+def test_id3v23_round_trip(tmp_path):
+    frames = [(b"TIT2", b"\x00\x00", b"\x00Old title"), (b"TPE1", b"\x00\x00", b"\x00Artist"), (b"TALB", b"\x00\x00", b"\x00Album"),
+              (b"PRIV", b"\x40\x00", b"owner\x00private data"), (b"APIC", b"\x00\x00", b"\x00image/jpeg\x00\x03\x00jpeg data")]
+    original = id3Tag(3, frames, padding=512) + mpegFrame * 10
+    edited = writeCopy(tmp_path, "music.mp3", original, {"title": "New title"})
+    major, editedFrames = id3Frames(edited)
+    assert major == 3
+    assert [frame for frame in editedFrames if frame[0] != b"TIT2"] == [frame for frame in frames if frame[0] != b"TIT2"]
+    assert tags.readTags(tmp_path / "editedmusic.mp3").title == "New title"
+    assert len(edited) == len(original)  # the new tag fits in the padding, the audio doesn't move
+    assert edited.endswith(mpegFrame * 10)
+
+def test_id3v24_round_trip(tmp_path):
+    frames = [(b"TIT2", b"\x00\x00", b"\x03Old title"), (b"TPE1", b"\x00\x00", b"\x03Artist"),
+              (b"TXXX", b"\x00\x00", b"\x03KEY\x00value"), (b"APIC", b"\x00\x00", b"\x03image/png\x00\x04\x00back cover")]
+    edited = writeCopy(tmp_path, "music.mp3", id3Tag(4, frames, padding=0) + mpegFrame * 10, {"title": "Nouveau titre", "cover": (b"new cover", "image/jpeg")})
+    major, editedFrames = id3Frames(edited)
+    assert major == 4
+    assert [frame for frame in editedFrames if frame[0] != b"TIT2"][:3] == frames[1:]
+    written = tags.readTags(tmp_path / "editedmusic.mp3", withCover=True)
+    assert (written.title, written.author, written.cover) == ("Nouveau titre", "Artist", b"new cover")
+    assert edited.endswith(mpegFrame * 10)
+
+# FLAC
+
+streamInfo = struct.pack(">HH", 4096, 4096) + bytes(6) + ((44100 << 44) | (1 << 41) | (15 << 36) | 441000).to_bytes(8, "big") + bytes(16)
+
+def vorbisComment(comments:list, vendor:bytes=b"test vendor") -> bytes:
+    data = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(comments))
+    for comment in comments:
+        data += struct.pack("<I", len(comment)) + comment
+    return data
+
+def parseVorbisComment(data:bytes) -> tuple:
+    """return the vendor and the comments of a vorbis comment"""
+    vendorLength = struct.unpack("<I", data[:4])[0]
+    i = 8 + vendorLength
+    comments = []
+    for _ in range(struct.unpack("<I", data[4 + vendorLength:i])[0]):
+        length = struct.unpack("<I", data[i:i + 4])[0]
+        comments.append(data[i + 4:i + 4 + length])
+        i += 4 + length
+    return data[4:4 + vendorLength], comments
+
+def flacPicture(pictureType:int, imageData:bytes) -> bytes:
+    return struct.pack(">II", pictureType, 9) + b"image/png" + struct.pack(">IIIIII", 0, 0, 0, 0, 0, len(imageData)) + imageData
+
+def flacFile(blocks:list) -> bytes:
+    data = b"fLaC"
+    for i, (blockType, block) in enumerate(blocks):
+        data += bytes((blockType | (0x80 if i == len(blocks) - 1 else 0),)) + len(block).to_bytes(3, "big") + block
+    return data + audioData
+
+def flacBlocks(data:bytes) -> tuple:
+    """return the (type, data) of the metadata blocks and the audio data"""
+    blocks = []
+    i = 4
+    while True:
+        last, blockType, size = data[i] & 0x80, data[i] & 0x7f, int.from_bytes(data[i + 1:i + 4], "big")
+        blocks.append((blockType, data[i + 4:i + 4 + size]))
+        i += 4 + size
+        if last:
+            return blocks, data[i:]
+
+@pytest.mark.parametrize("padding", [True, False])
+def test_flac_round_trip(tmp_path, padding):
+    comments = [b"TITLE=Old title", b"ARTIST=Artist", b"ALBUM=Album", b"TRACKNUMBER=3"]
+    blocks = [(0, streamInfo), (4, vorbisComment(comments)), (2, b"APPLdata"), (6, flacPicture(3, b"front cover"))]
+    if padding:
+        blocks.append((1, bytes(4096)))
+    editedBlocks, editedAudio = flacBlocks(writeCopy(tmp_path, "music.flac", flacFile(blocks), {"author": "New artist"}))
+    assert editedAudio == audioData
+    assert [block for block in editedBlocks if block[0] not in (1, 4)] == [block for block in blocks if block[0] not in (1, 4)]
+    assert [blockType for blockType, _ in editedBlocks].count(1) == 1
+    vendor, editedComments = parseVorbisComment(next(block for blockType, block in editedBlocks if blockType == 4))
+    assert vendor == b"test vendor"
+    assert editedComments == [b"TITLE=Old title", b"ALBUM=Album", b"TRACKNUMBER=3", b"ARTIST=New artist"]
+
+# Ogg
+
+def crc(data:bytes) -> int:
+    """the ogg CRC, computed independently of the tag module"""
+    value = 0
+    for byte in data:
+        value ^= byte << 24
+        for _ in range(8):
+            value = (value << 1) ^ 0x04c11db7 if value & 0x80000000 else value << 1
+        value &= 0xffffffff
+    return value
+
+def oggPage(headerType:int, granule:int, sequence:int, packets:list) -> bytes:
+    """a page holding whole packets"""
+    lacing = b"".join(bytes([255] * (len(packet) // 255) + [len(packet) % 255]) for packet in packets)
+    page = bytearray(b"OggS\x00" + bytes((headerType,)) + struct.pack("<q", granule) + b"\x01\x02\x03\x04"
+                     + struct.pack("<II", sequence, 0) + bytes((len(lacing),)) + lacing + b"".join(packets))
+    page[22:26] = struct.pack("<I", crc(bytes(page)))
+    return bytes(page)
+
+def oggPages(data:bytes) -> list:
+    """return the (header, lacing, payload) of the pages"""
+    pages = []
+    i = 0
+    while i < len(data):
+        assert data[i:i + 4] == b"OggS"
+        segments = data[i + 26]
+        lacing = data[i + 27:i + 27 + segments]
+        end = i + 27 + segments + sum(lacing)
+        pages.append((data[i:i + 27], lacing, data[i + 27 + segments:end]))
+        i = end
+    return pages
+
+def oggPackets(pages:list) -> list:
+    packets = [b""]
+    for _, lacing, payload in pages:
+        i = 0
+        for size in lacing:
+            packets[-1] += payload[i:i + size]
+            i += size
+            if size < 255:
+                packets.append(b"")
+    return packets[:-1]
+
+def test_ogg_round_trip(tmp_path):
+    identification = b"\x01vorbis" + struct.pack("<IBIiii", 0, 2, 44100, 0, 128000, 0) + b"\xb8\x01"
+    comment = b"\x03vorbis" + vorbisComment([b"TITLE=Old title", b"ARTIST=Artist", b"ALBUM=Album"]) + b"\x01"
+    setup = b"\x05vorbis" + bytes(range(256)) * 2
+    audioPackets = [audioData[i:i + 1000] for i in range(0, 3000, 1000)]
+    original = oggPage(0x02, 0, 0, [identification]) + oggPage(0, 0, 1, [comment, setup])
+    for i, packet in enumerate(audioPackets):
+        original += oggPage(0x04 if i == len(audioPackets) - 1 else 0, 44100 * (i + 1), 2 + i, [packet])
+
+    edited = writeCopy(tmp_path, "music.ogg", original, {"cover": (coverData, "image/png")})
+    pages, originalPages = oggPages(edited), oggPages(original)
+    assert len(pages) > len(originalPages)  # the cover doesn't fit in the comment page, the audio pages are renumbered
+    for sequence, (header, lacing, payload) in enumerate(pages):
+        assert struct.unpack("<I", header[18:22])[0] == sequence
+        page = bytearray(header + lacing + payload)
+        page[22:26] = bytes(4)
+        assert struct.unpack("<I", header[22:26])[0] == crc(bytes(page))
+    assert b"".join(pages[0]) == b"".join(originalPages[0])
+    for (header, lacing, payload), (originalHeader, originalLacing, originalPayload) in zip(pages[-3:], originalPages[-3:]):
+        assert (header[:18], lacing, payload) == (originalHeader[:18], originalLacing, originalPayload)  # same granule position and flags
+
+    packets = oggPackets(pages)
+    assert packets[0] == identification
+    assert packets[2:] == [setup] + audioPackets
+    assert packets[1].startswith(b"\x03vorbis") and packets[1].endswith(b"\x01")
+    vendor, comments = parseVorbisComment(packets[1][7:-1])
+    assert vendor == b"test vendor"
+    assert comments[:3] == [b"TITLE=Old title", b"ARTIST=Artist", b"ALBUM=Album"]
+    assert tags.readTags(tmp_path / "editedmusic.ogg", withCover=True).cover == coverData
+
+# MP4
+
+def atom(atomType:bytes, body:bytes) -> bytes:
+    return struct.pack(">I", len(body) + 8) + atomType + body
+
+def textItem(itemType:bytes, text:bytes) -> bytes:
+    return atom(itemType, atom(b"data", struct.pack(">II", 1, 0) + text))
+
+def findAtoms(data:bytes, atomType:bytes, start:int=0, end:int=None) -> list:
+    """return the (data offset, data end) of the atoms of a type in the tree"""
+    found = []
+    i, end = start, len(data) if end is None else end
+    while i + 8 <= end:
+        size, childType = struct.unpack(">I", data[i:i + 4])[0], data[i + 4:i + 8]
+        if childType == atomType:
+            found.append((i + 8, i + size))
+        if childType in (b"moov", b"trak", b"mdia", b"minf", b"stbl", b"udta", b"ilst"):
+            found += findAtoms(data, atomType, i + 8, i + size)
+        elif childType == b"meta":
+            found += findAtoms(data, atomType, i + 12, i + size)
+        i += size
+    return found
+
+@pytest.mark.parametrize("offsetsType", [b"stco", b"co64"])
+def test_mp4_round_trip(tmp_path, offsetsType):
+    chunks = [audioData[i:i + 1000] for i in range(0, 3000, 1000)]
+    entry = ">I" if offsetsType == b"stco" else ">Q"
+    mvhd = atom(b"mvhd", bytes(12) + struct.pack(">II", 1000, 5000) + bytes(80))
+    ftyp = atom(b"ftyp", b"M4A \x00\x00\x00\x00M4A mp42isom")
+    ilst = atom(b"ilst", textItem(b"\xa9nam", b"Old title") + textItem(b"\xa9ART", b"Artist") + textItem(b"\xa9alb", b"Album"))
+    udta = atom(b"udta", atom(b"meta", bytes(4) + atom(b"hdlr", bytes(8) + b"mdirappl" + bytes(9)) + ilst))
+    def moov(offsets:list) -> bytes:
+        offsetsAtom = atom(offsetsType, bytes(4) + struct.pack(">I", len(offsets)) + b"".join(struct.pack(entry, offset) for offset in offsets))
+        trak = atom(b"trak", atom(b"mdia", atom(b"minf", atom(b"stbl", atom(b"stsz", bytes(12)) + offsetsAtom))))
+        return atom(b"moov", mvhd + trak + udta)
+    audioStart = len(ftyp) + len(moov([0] * 3)) + 8
+    original = ftyp + moov([audioStart + i * 1000 for i in range(3)]) + atom(b"mdat", b"".join(chunks))
+
+    edited = writeCopy(tmp_path, "music.m4a", original, {"title": "A much longer title than before"})
+    assert len(edited) > len(original)
+    offsetsStart, offsetsEnd = findAtoms(edited, offsetsType)[0]
+    offsets = struct.unpack(f">3{entry[1]}", edited[offsetsStart + 8:offsetsEnd])
+    assert [edited[offset:offset + 1000] for offset in offsets] == chunks
+    for atomType in (b"ftyp", b"mvhd", b"stsz", b"\xa9ART", b"\xa9alb", b"hdlr"):
+        (start, end), (originalStart, originalEnd) = findAtoms(edited, atomType)[0], findAtoms(original, atomType)[0]
+        assert edited[start:end] == original[originalStart:originalEnd]
+    written = tags.readTags(tmp_path / "editedmusic.m4a")
+    assert (written.title, written.author) == ("A much longer title than before", "Artist")
+
+# WAV
+
+def riffChunk(chunkId:bytes, data:bytes) -> bytes:
+    return chunkId + struct.pack("<I", len(data)) + data + (b"\x00" if len(data) & 1 else b"")
+
+def riffChunks(data:bytes) -> dict:
+    """return the data of the chunks and of the entries of the LIST INFO chunk by id"""
+    chunks = {}
+    i = 12
+    while i + 8 <= len(data):
+        chunkId, size = data[i:i + 4], struct.unpack("<I", data[i + 4:i + 8])[0]
+        chunks[chunkId] = data[i + 8:i + 8 + size]
+        i += 8 + size + (size & 1)
+    if b"LIST" in chunks:
+        chunks.update(riffChunks(b"RIFF\x00\x00\x00\x00" + chunks.pop(b"LIST")))
+    return chunks
+
+def test_wav_round_trip(tmp_path):
+    fmt = struct.pack("<HHIIHH", 1, 1, 1000, 2000, 2, 16)
+    info = b"INFO" + riffChunk(b"INAM", b"Old title\x00") + riffChunk(b"IART", b"Artist\x00") + riffChunk(b"ICMT", b"A comment\x00")
+    body = b"WAVE" + riffChunk(b"fmt ", fmt) + riffChunk(b"LIST", info) + riffChunk(b"data", audioData) + riffChunk(b"cue ", b"odd")
+    edited = writeCopy(tmp_path, "music.wav", b"RIFF" + struct.pack("<I", len(body)) + body, {"title": "New title"})
+    assert struct.unpack("<I", edited[4:8])[0] == len(edited) - 8
+    chunks = riffChunks(edited)
+    assert (chunks[b"fmt "], chunks[b"data"], chunks[b"cue "]) == (fmt, audioData, b"odd")
+    assert (chunks[b"IART"], chunks[b"ICMT"]) == (b"Artist\x00", b"A comment\x00")
+    written = tags.readTags(tmp_path / "editedmusic.wav")
+    assert (written.title, written.author) == ("New title", "Artist")
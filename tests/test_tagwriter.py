@@ -0,0 +1,32 @@
+from tagwriter import writeTags
+import tags
+import pytest
+import os
+
+mpegFrame = b"\xff\xfb\x90\x64" + bytes(413)  # a silent MPEG-1 layer III frame, 128 kbps at 44.1 kHz
+
+@pytest.fixture
+def musicPath(tmp_path):
+    path = tmp_path / "music.mp3"
+    path.write_bytes(mpegFrame * 20)
+    return path
+
+def test_write_tags_of_open_file(musicPath):
+    with open(musicPath, "rb") as player:  # like vlc playing the music being edited
+        writeTags(musicPath, {"title": "New title", "author": "New author"})
+        player.read()
+    written = tags.readTags(musicPath)
+    assert (written.title, written.author) == ("New title", "New author")
+    assert musicPath.read_bytes().endswith(mpegFrame * 20)
+    assert [path.name for path in musicPath.parent.iterdir()] == ["music.mp3"]
+
+def test_write_tags_of_file_that_cant_be_replaced(musicPath, monkeypatch):
+    def replace(src, dst):
+        raise PermissionError(32, "The process cannot access the file because it is being used by another process")
+    monkeypatch.setattr(os, "replace", replace)  # what Windows does while vlc has the file open
+    with open(musicPath, "rb") as player:
+        writeTags(musicPath, {"title": "New title"})
+        player.read()
+    assert tags.readTags(musicPath).title == "New title"
+    assert musicPath.read_bytes().endswith(mpegFrame * 20)
+    assert [path.name for path in musicPath.parent.iterdir()] == ["music.mp3"]